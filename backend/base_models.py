@@ -1,5 +1,16 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
+
+
+class Status(models.IntegerChoices):
+    '''
+    Состояние объекта: опубликованные объекты видны в API, скрытые модератором
+    и удалённые — нет. Удалённые объекты физически удаляются командой purge_deleted
+    '''
+    PUBLISHED = 0, 'Опубликован'
+    HIDDEN = 1, 'Скрыт модератором'
+    DELETED = 2, 'Удалён'
 
 
 class BaseModel(models.Model):
@@ -9,8 +20,27 @@ class BaseModel(models.Model):
         on_delete=models.SET_NULL,
         verbose_name='Создал'
     )
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PUBLISHED, editable=False,
+                                              verbose_name='Состояние')
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Дата удаления')
 
     default_manager = models.Manager()
 
     class Meta:
         abstract = True
+
+    def soft_delete(self, using=None) -> None:
+        '''
+        Помечает объект удалённым одним UPDATE без каскадного удаления
+        связанных объектов
+        '''
+        self.set_status(Status.DELETED, using)
+
+    def set_status(self, status: int, using=None) -> None:
+        '''
+        Меняет состояние объекта. Сохраняет только состояние и дату удаления,
+        сигналы post_save обновляют кэш и поисковый индекс
+        '''
+        self.status = status
+        self.deleted_at = timezone.now() if status == Status.DELETED else None
+        self.save(using=using, update_fields=['status', 'deleted_at'])
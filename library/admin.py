@@ -1,9 +1,94 @@
 from django.contrib import admin
 
-from library.models import Library, Author, Book, Genre, Comment
+from backend.base_models import Status
+from library.models import Library, Author, Book, Genre, Comment, Job
+from library.services.job_services import enqueue
 
-admin.site.register(Library)
-admin.site.register(Author)
-admin.site.register(Book)
 admin.site.register(Genre)
-admin.site.register(Comment)
+
+
+class BackgroundDeleteAdmin(admin.ModelAdmin):
+    '''
+    Удаление объекта с каскадным удалением его книг выполняется фоновой
+    задачей delete_task пакетами, а не в запросе к административному сайту
+    '''
+    delete_task = None
+
+    def delete_model(self, request, obj):
+        enqueue(self.delete_task, {f'{self.opts.model_name}_id': obj.pk},
+                idempotency_key=f'{self.delete_task}:{obj.pk}')
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
+
+
+@admin.register(Library)
+class LibraryAdmin(BackgroundDeleteAdmin):
+    delete_task = 'delete_library'
+
+
+@admin.register(Author)
+class AuthorAdmin(BackgroundDeleteAdmin):
+    delete_task = 'delete_author'
+
+
+class ModerationAdmin(admin.ModelAdmin):
+    '''
+    Модерация: скрытие, публикация и удаление выбранных объектов. Состояние
+    меняется через set_status, чтобы сигналы обновили кэш и поисковый индекс.
+    Удаление на странице объекта тоже только помечает его удалённым, а
+    физически объекты удаляет команда purge_deleted
+    '''
+    list_filter = ('status',)
+    readonly_fields = ('status', 'deleted_at')
+    actions = ('hide', 'publish', 'soft_delete')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_model(self, request, obj):
+        self.set_status([obj], Status.DELETED)
+
+    def delete_queryset(self, request, queryset):
+        self.set_status(queryset, Status.DELETED)
+
+    def set_status(self, queryset, status: int) -> None:
+        for obj in queryset:
+            obj.set_status(status)
+
+    @admin.action(description='Скрыть выбранные объекты')
+    def hide(self, request, queryset):
+        self.set_status(queryset, Status.HIDDEN)
+
+    @admin.action(description='Опубликовать выбранные объекты')
+    def publish(self, request, queryset):
+        self.set_status(queryset, Status.PUBLISHED)
+
+    @admin.action(description='Удалить выбранные объекты (с возможностью восстановления)')
+    def soft_delete(self, request, queryset):
+        self.set_status(queryset, Status.DELETED)
+
+
+@admin.register(Book)
+class BookAdmin(ModerationAdmin):
+    list_display = ('title', 'year', 'status')
+
+
+@admin.register(Comment)
+class CommentAdmin(ModerationAdmin):
+    list_select_related = ('owner', 'book')
+    list_display = ('__str__', 'created_at', 'status')
+
+    def set_status(self, queryset, status: int) -> None:
+        super().set_status(queryset, status)
+        enqueue('reconcile_books', {'book_ids': sorted({comment.book_id for comment in queryset})})
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at',)
@@ -5,3 +5,6 @@ class LibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library'
     verbose_name = 'библиотека'
+
+    def ready(self):
+        from library import signals, tasks  # noqa: F401
@@ -0,0 +1,175 @@
+import copy
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication
+
+from library.services.utils import TTLCache
+
+
+class TokenCache():
+    '''
+    Кэш соответствия токена пользователю: локальный для процесса LRU-кэш со
+    временем жизни записей и, при заданном TOKEN_CACHE_ALIAS, общий кэш
+    Django. Отзыв (удаление токена, изменение или деактивация пользователя)
+    запоминает время отзыва для пользователя, и записи этого пользователя,
+    сохранённые раньше, перестают использоваться — во всех процессах, если
+    настроен общий кэш. Записи других пользователей не затрагиваются.
+    Без общего кэша (process_local) отзыв в другом процессе сюда не доходит,
+    поэтому найденный в кэше токен ещё проверяется по базе данных
+    '''
+    KEY_PREFIX = 'auth:token:'
+    REVOKED_KEY_PREFIX = 'auth:token:revoked:'
+
+    def __init__(self, max_size: int, ttl: float, shared_alias: Optional[str] = None):
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+        self.local = TTLCache(max_size, ttl)
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'revocations': 0}
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    @property
+    def process_local(self) -> bool:
+        '''
+        Кэш не разделяется между процессами: общий кэш не задан или хранит
+        данные в памяти процесса
+        '''
+        return self.shared is None or isinstance(self.shared, (LocMemCache, DummyCache))
+
+    def revoked_at(self, user_id: int) -> float:
+        '''
+        Время последнего отзыва токенов пользователя. Отсутствующая в общем
+        кэше отметка (в том числе вытесненная) создаётся с текущим временем,
+        поэтому вытеснение не возвращает в оборот записи, сохранённые до отзыва
+        '''
+        revoked_at = self._revoked.get(user_id, 0)
+        if self.shared:
+            key = f'{self.REVOKED_KEY_PREFIX}{user_id}'
+            shared_revoked_at = self.shared.get(key)
+            if shared_revoked_at is None:
+                self.shared.add(key, time.time(), None)
+                shared_revoked_at = self.shared.get(key, time.time())
+            revoked_at = max(revoked_at, shared_revoked_at)
+        return revoked_at
+
+    def get(self, key: str) -> Optional[tuple]:
+        entry, source = self.local.get(key), 'hits'
+        if entry is None and self.shared:
+            entry, source = self.shared.get(self.KEY_PREFIX + key), 'shared_hits'
+        if entry is not None and entry[0] > self.revoked_at(entry[1][0].pk):
+            if source == 'shared_hits':
+                self.local.set(key, entry)
+            self._count(source)
+            return entry[1]
+        self._count('misses')
+        return None
+
+    def set(self, key: str, value: tuple, checked_at: float) -> None:
+        '''
+        Сохраняет результат проверки токена, начатой в момент checked_at, если
+        с тех пор токены пользователя не отзывались (иначе в кэш мог бы попасть
+        отозванный токен)
+        '''
+        if checked_at <= self.revoked_at(value[0].pk):
+            return
+        self.local.set(key, (checked_at, value))
+        if self.shared:
+            self.shared.set(self.KEY_PREFIX + key, (checked_at, value), self.ttl)
+
+    def revoke(self, user_id: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._revoked[user_id] = now
+            self._stats['revocations'] += 1
+            # Отметки старше времени жизни записей больше ничего не отменяют
+            if len(self._revoked) > self.local.max_size:
+                self._revoked = {pk: revoked_at for pk, revoked_at in self._revoked.items()
+                                 if revoked_at > now - self.ttl}
+        if self.shared:
+            self.shared.set(f'{self.REVOKED_KEY_PREFIX}{user_id}', now, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = len(self.local)
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL,
+    shared_alias=settings.TOKEN_CACHE_ALIAS
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    Аутентификация по токену, кэширующая результат поиска токена и
+    пользователя, чтобы не выполнять запрос к базе данных на каждый запрос.
+    С локальным для процесса кэшем вместо загрузки токена и пользователя
+    выполняется только проверка, что токен не удалён и пользователь активен
+    '''
+    def authenticate_credentials(self, key):
+        checked_at = time.time()
+        cached = token_cache.get(key)
+        if cached is not None and token_cache.process_local and not self._is_valid(key):
+            token_cache.revoke(cached[0].pk)
+            cached = None
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached, checked_at)
+        user, token = cached
+        return copy.copy(user), token
+
+    def _is_valid(self, key: str) -> bool:
+        return self.get_model().objects.filter(key=key, user__is_active=True).exists()
+
+
+class StreamTokenAuthentication(BaseAuthentication):
+    '''
+    Аутентификация потока событий по ?token= — подписанному токену потока
+    stream, который действует EVENTS_STREAM_TOKEN_TTL секунд (make_token).
+    Адрес запроса попадает в журналы доступа, поэтому постоянный токен в нём
+    не принимается
+    '''
+    salt = 'library.stream-token'
+    query_param = 'token'
+
+    def __init__(self, stream: str):
+        self.stream = stream
+
+    def make_token(self, user) -> str:
+        return signing.dumps({'user': user.pk, 'stream': self.stream}, salt=self.salt)
+
+    def authenticate(self, request):
+        token = request.query_params.get(self.query_param)
+        if not token:
+            return None
+        try:
+            payload = signing.loads(token, salt=self.salt, max_age=settings.EVENTS_STREAM_TOKEN_TTL)
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed('Недействительный или истёкший токен потока.')
+        user = get_user_model().objects.filter(pk=payload['user'], is_active=True).first()
+        if payload['stream'] != self.stream or user is None:
+            raise exceptions.AuthenticationFailed('Недействительный или истёкший токен потока.')
+        return user, None
+
+    def authenticate_header(self, request) -> str:
+        return 'Token'
@@ -0,0 +1,12 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    '''
+    Бэкенд SQLite, в котором режим начала транзакции (DEFERRED, IMMEDIATE
+    или EXCLUSIVE) задаётся атрибутом соединения begin_mode
+    '''
+    begin_mode = ''
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.begin_mode}'.strip())
@@ -0,0 +1,80 @@
+'''
+Маршрутизация запросов к базе данных: запись и чтение по умолчанию — в
+основную базу, чтение внутри replica_reads() — в одну из реплик. После
+изменения данных клиентом его чтения на время REPLICA_STICKY_SECONDS
+направляются в основную базу, чтобы он видел свои изменения независимо от
+задержки репликации
+'''
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from library.services.cache_services import get_cache
+
+STICKY_KEY_PREFIX = 'db:primary:'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def get_replicas() -> list:
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def is_sticky(user_id) -> bool:
+    return user_id is not None and bool(get_replicas()) and get_cache().get(f'{STICKY_KEY_PREFIX}{user_id}', False)
+
+
+def stick_to_primary(user_id) -> None:
+    '''
+    Направляет чтения клиента в основную базу на время задержки репликации
+    '''
+    if user_id is not None and get_replicas():
+        get_cache().set(f'{STICKY_KEY_PREFIX}{user_id}', True, settings.REPLICA_STICKY_SECONDS)
+
+
+def current_read_alias() -> str:
+    '''
+    База данных, из которой сейчас выполняются чтения
+    '''
+    return _read_alias.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def replica_reads(user_id=None):
+    '''
+    Направляет чтения в блоке в одну реплику, выбранную случайно на весь
+    блок, чтобы запросы одного ответа видели одно и то же состояние данных
+    '''
+    replicas = get_replicas()
+    alias = random.choice(replicas) if replicas and not is_sticky(user_id) else None
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class PrimaryReplicaRouter():
+    '''
+    Роутер основной базы и реплик из settings.DATABASE_REPLICAS
+    '''
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        if db in get_replicas():
+            return False
+        return None
@@ -0,0 +1,121 @@
+'''
+Быстрое представление списков: строки .values() преобразуются в словари
+напрямую по заранее построенному плану полей сериализатора, без создания
+объектов моделей и обхода полей сериализатора для каждой строки
+'''
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from rest_framework import serializers
+
+# Поля, представление которых совпадает со значением из .values()
+PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+                serializers.PrimaryKeyRelatedField)
+
+
+def _is_plain_related(field) -> bool:
+    '''
+    Подкласс PrimaryKeyRelatedField, представляющий объект так же — его id
+    '''
+    return (isinstance(field, serializers.PrimaryKeyRelatedField)
+            and type(field).to_representation is serializers.PrimaryKeyRelatedField.to_representation)
+
+
+class FastPathUnsupported(Exception):
+    '''
+    Сериализатор содержит поля, которые нельзя построить из .values()
+    '''
+
+
+class ValuesPlan():
+    '''
+    План представления: для каждого поля сериализатора — ключ в ответе,
+    выражение для .values() и функция преобразования значения (None, если
+    значение не требует преобразования). Развёрнутые поля (?expand=)
+    строятся вложенным планом по полям связанной модели через JOIN
+    '''
+    def __init__(self, serializer_class, expand: Iterable[str] = (), prefix: str = ''):
+        model = serializer_class.Meta.model
+        fields = serializer_class(context={}).fields
+        self.columns = []
+        for name, field in fields.items():
+            if not field.write_only:
+                self.columns.append(self._build_column(serializer_class, model, name, field.source, field,
+                                                       name in expand, prefix))
+        # Развёрнутые поля, которых нет среди полей сериализатора, добавляются в конец в порядке ?expand=
+        for name in expand:
+            if name not in fields:
+                self.columns.append(self._build_column(serializer_class, model, name, name, None, True, prefix))
+
+    @staticmethod
+    def _build_column(serializer_class, model, name: str, source: str, field, expanded: bool, prefix: str) -> tuple:
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            raise FastPathUnsupported(f'{serializer_class.__name__}.{name}')
+        lookup = prefix + source
+        if expanded:
+            if not (model_field.many_to_one or model_field.one_to_one):
+                raise FastPathUnsupported(f'{serializer_class.__name__}.{name}')
+            return name, lookup, None, ValuesPlan(serializer_class.expandable_fields[name], prefix=f'{lookup}__')
+        if model_field.many_to_many or model_field.one_to_many:
+            raise FastPathUnsupported(f'{serializer_class.__name__}.{name}')
+        if model_field.is_relation and not isinstance(field, serializers.PrimaryKeyRelatedField):
+            raise FastPathUnsupported(f'{serializer_class.__name__}.{name}')
+        if type(field) in PLAIN_FIELDS or _is_plain_related(field):
+            return name, lookup, None, None
+        return name, lookup, field.to_representation, None
+
+    @property
+    def lookups(self) -> list:
+        lookups = []
+        for _, lookup, _, nested in self.columns:
+            lookups.append(lookup)
+            if nested is not None:
+                lookups += nested.lookups
+        return lookups
+
+    def to_representation(self, row: dict) -> dict:
+        ret = {}
+        for name, lookup, to_representation, nested in self.columns:
+            value = row[lookup]
+            if value is None:
+                ret[name] = None
+            elif nested is not None:
+                ret[name] = nested.to_representation(row)
+            elif to_representation is not None:
+                ret[name] = to_representation(value)
+            else:
+                ret[name] = value
+        return ret
+
+    def to_representation_many(self, rows: Iterable[dict]) -> list:
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def _get_plan(serializer_class, expand: Tuple[str, ...]) -> Optional[ValuesPlan]:
+    try:
+        return ValuesPlan(serializer_class, expand)
+    except FastPathUnsupported:
+        return None
+
+
+def get_values_plan(serializer_class, expand: Iterable[str] = ()) -> Optional[ValuesPlan]:
+    '''
+    Возвращает план для сериализатора и списка развёрнутых полей или None,
+    если сериализатор нельзя представить через .values()
+    '''
+    return _get_plan(serializer_class, tuple(expand))
+
+
+def values_queryset(queryset: QuerySet, plan: ValuesPlan, ordering: Iterable[str] = ()) -> QuerySet:
+    '''
+    Выбирает поля плана и поля сортировки, по которым курсорная пагинация
+    строит курсор следующей страницы
+    '''
+    ordering_lookups = [field.lstrip('-') for field in ordering]
+    return queryset.values(*dict.fromkeys([*plan.lookups, *ordering_lookups]))
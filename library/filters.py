@@ -0,0 +1,73 @@
+from django.db.models import QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from library.pagination import with_pk_tiebreaker
+
+# Наибольший символ Unicode: title >= prefix AND title < prefix + TITLE_PREFIX_UPPER_BOUND
+# задаёт диапазон строк с данным префиксом и использует индекс по title
+TITLE_PREFIX_UPPER_BOUND = '\U0010ffff'
+
+
+class BookFilterBackend(BaseFilterBackend):
+    '''
+    Фильтрация книг по параметрам запроса:
+    author, genre, library, owner — id (можно несколько через запятую);
+    year_from, year_to — диапазон годов выпуска;
+    title — поиск по префиксу названия (диапазон по индексу title);
+    search — поиск подстроки в названии (в SQLite регистр не учитывается
+    только для латиницы)
+    '''
+    exact_params = {
+        'author': 'author_id',
+        'genre': 'genre_id',
+        'library': 'library_id',
+        'owner': 'owner_id',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        return self.filter_params(queryset, request.query_params)
+
+    def filter_params(self, queryset: QuerySet, params) -> QuerySet:
+        filters = {}
+        for param, field_name in self.exact_params.items():
+            if params.get(param):
+                ids = self._parse_ints(param, params[param])
+                if len(ids) == 1:
+                    filters[field_name] = ids[0]
+                else:
+                    filters[f'{field_name}__in'] = ids
+        if params.get('year_from'):
+            filters['year__gte'] = self._parse_int('year_from', params['year_from'])
+        if params.get('year_to'):
+            filters['year__lte'] = self._parse_int('year_to', params['year_to'])
+        if params.get('title'):
+            filters['title__gte'] = params['title']
+            filters['title__lt'] = params['title'] + TITLE_PREFIX_UPPER_BOUND
+        if params.get('search'):
+            filters['title__icontains'] = params['search']
+        return queryset.filter(**filters)
+
+    @staticmethod
+    def _parse_int(param: str, value: str) -> int:
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({param: 'Ожидается целое число'})
+
+    @staticmethod
+    def _parse_ints(param: str, value: str) -> list:
+        try:
+            return [int(item) for item in value.split(',')]
+        except ValueError:
+            raise ValidationError({param: 'Ожидается целое число или список чисел через запятую'})
+
+
+class StableOrderingFilter(OrderingFilter):
+    '''
+    Сортировка ?ordering= с первичным ключом в конце: строки с равными
+    значениями неуникальных полей (title, year) упорядочены однозначно, а
+    KeysetPagination строит по ней составную позицию курсора
+    '''
+    def get_ordering(self, request, queryset, view):
+        return with_pk_tiebreaker(super().get_ordering(request, queryset, view))
@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('The command measures throughput, latency percentiles, query counts and peak memory of every API '
+            'route, seeding the database if needed. Results are written as JSON and can be compared with a '
+            'baseline run to flag regressions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000,
+                            help='Minimal number of books; missing books are seeded through DatabaseStuffer')
+        parser.add_argument('--comments-per-book', type=int, default=5,
+                            help='Number of comments per seeded book')
+        parser.add_argument('--rounds', type=int, default=50, help='Measured requests per route and method')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests before measuring')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the response cache between requests instead of clearing it')
+        parser.add_argument('--only', nargs='*', help='Measure only cases whose name contains one of the values')
+        parser.add_argument('--output', help='File the JSON report is written to (stdout by default)')
+        parser.add_argument('--baseline', help='JSON report of a previous run to compare with')
+        parser.add_argument('--threshold', type=float, default=10,
+                            help='Allowed growth of the compared latency metric, in percent')
+        parser.add_argument('--metric', default='p50', choices=['mean', 'p50', 'p95', 'p99'],
+                            help='Latency metric compared with the baseline')
+
+    def handle(self, *args, **options):
+        from library.services.benchmark_services import APIBenchmark, find_regressions, make_report, seed_books
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        books_count = seed_books(options['books'], options['comments_per_book'])
+        benchmark = APIBenchmark(rounds=options['rounds'], warmup=options['warmup'],
+                                 warm_cache=options['warm_cache'], only=options['only'])
+        results = benchmark.run()
+        for result in results:
+            self.stderr.write(
+                f'{result.name:45} {result.status} {result.throughput:8.1f} req/s  p50 {result.p50:8.2f} ms  '
+                f'p99 {result.p99:8.2f} ms  {result.queries:3} queries  {result.peak_memory_kb:9.1f} KB'
+            )
+        for name in benchmark.skipped:
+            self.stderr.write(f'{name:45} skipped: no request payload')
+
+        report = make_report(results, books=books_count, rounds=options['rounds'], warm_cache=options['warm_cache'])
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, ensure_ascii=False, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+        if baseline is not None:
+            regressions = find_regressions(report, baseline, options['threshold'], options['metric'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stderr.write(self.style.SUCCESS('No regressions compared with the baseline'))
@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+# Набор фильтров, по которым проверяется использование индексов
+FILTER_CASES = {
+    'author': {'author': '1'},
+    'author + year range': {'author': '1', 'year_from': '1800', 'year_to': '1900'},
+    'genre': {'genre': '1'},
+    'genre + year range': {'genre': '1', 'year_from': '1800', 'year_to': '1900'},
+    'library + year range': {'library': '1', 'year_from': '1800', 'year_to': '1900'},
+    'owner': {'owner': '1'},
+    'year range': {'year_from': '1800', 'year_to': '1810'},
+    'title prefix': {'title': 'The'},
+    'title substring': {'search': 'love'},
+}
+
+
+class Command(BaseCommand):
+    help = 'The command prints query plans and timings of the books API filters, seeding the database if needed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000000,
+                            help='Minimal number of books; missing books are seeded through DatabaseStuffer')
+        parser.add_argument('--page-size', type=int, default=100,
+                            help='Number of rows fetched per query, as the API pagination does')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='How many times each query is executed')
+
+    def handle(self, *args, **options):
+        from library.filters import BookFilterBackend
+        from library.models import Book
+        from library.services.benchmark_services import seed_books
+
+        books_count = seed_books(options['books'])
+        self.stdout.write(f'Books in the database: {books_count}\n')
+
+        backend = BookFilterBackend()
+        for name, params in FILTER_CASES.items():
+            queryset = backend.filter_params(Book.default_manager.all(), params).order_by('id')
+            page = queryset[:options['page_size']]
+            plan = page.explain()
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(page.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            uses_index = 'USING INDEX' in plan or 'USING COVERING INDEX' in plan
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name} {params}'))
+            self.stdout.write(plan)
+            self.stdout.write(f'index used: {uses_index}, median {statistics.median(timings):.2f} ms\n')
@@ -0,0 +1,92 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ['/api/v1/books/', '/api/v1/genres/', '/api/v1/authors/']
+
+
+class Command(BaseCommand):
+    help = ('The command measures requests per second and latency percentiles of a running server '
+            'with many concurrent keep-alive connections. Run it against a WSGI server and against '
+            'an ASGI server (async views are under /api/v1/async/) to compare them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='Server address, e.g. http://127.0.0.1:8000')
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS, help='Request paths')
+        parser.add_argument('--token', help='Authentication token')
+        parser.add_argument('--concurrency', type=int, default=1000, help='Number of concurrent connections')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per connection and path')
+        parser.add_argument('--async-prefix', action='store_true',
+                            help='Rewrite /api/v1/ paths to /api/v1/async/ for the async views')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Only http:// addresses are supported')
+        headers = f'Host: {url.netloc}\r\nConnection: keep-alive\r\n'
+        if options['token']:
+            headers += f'Authorization: Token {options["token"]}\r\n'
+        for path in options['paths']:
+            if options['async_prefix']:
+                path = path.replace('/api/v1/', '/api/v1/async/', 1)
+            request = f'GET {path} HTTP/1.1\r\n{headers}\r\n'.encode()
+            timings, errors, elapsed = asyncio.run(self._run(
+                url.hostname, url.port or 80, request, options['concurrency'], options['requests']
+            ))
+            if not timings:
+                self.stdout.write(f'{path}: all {errors} requests failed')
+                continue
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f'{path}: {len(timings) / elapsed:.0f} req/s, p50 {statistics.median(timings):.2f} ms, '
+                f'p99 {p99:.2f} ms, errors {errors}'
+            )
+
+    async def _run(self, host: str, port: int, request: bytes, concurrency: int, count: int) -> tuple:
+        timings, errors = [], [0]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self._connection(host, port, request, count, timings, errors) for _ in range(concurrency)
+        ))
+        return timings, errors[0], time.perf_counter() - started
+
+    @staticmethod
+    async def _connection(host: str, port: int, request: bytes, count: int, timings: list, errors: list):
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            errors[0] += count
+            return
+        try:
+            for sent in range(count):
+                started = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+                length, close = 0, False
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    name = name.strip().lower()
+                    if name == 'content-length':
+                        length = int(value)
+                    elif name == 'connection' and value.strip().lower() == 'close':
+                        close = True
+                await reader.readexactly(length)
+                if status_line.split(b' ', 2)[1:2] == [b'200']:
+                    timings.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors[0] += 1
+                if close:
+                    errors[0] += count - sent - 1
+                    break
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors[0] += 1
+        finally:
+            writer.close()
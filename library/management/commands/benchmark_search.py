@@ -0,0 +1,29 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_QUERIES = ['книга', 'содержательный комментарий', 'приключения', 'war', 'the']
+
+
+class Command(BaseCommand):
+    help = 'The command measures latency percentiles of full-text search queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES, help='Search queries')
+        parser.add_argument('--repeat', type=int, default=100, help='How many times each query is executed')
+        parser.add_argument('--page-size', type=int, default=20, help='Number of results per page')
+
+    def handle(self, *args, **options):
+        from library.services.search_services import SearchIndex
+
+        search_index = SearchIndex()
+        for query in options['queries']:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                search_index.search(query, limit=options['page_size'])
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(f'{query!r}: p50 {statistics.median(timings):.2f} ms, p99 {p99:.2f} ms')
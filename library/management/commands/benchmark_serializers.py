@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('The command compares list serialization through the DRF serializers and JSONRenderer with the fast '
+            'path built from .values() rows, checking that both produce the same bytes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Number of rows serialized at once')
+        parser.add_argument('--repeat', type=int, default=20, help='How many times each case is measured')
+
+    def handle(self, *args, **options):
+        from rest_framework.renderers import JSONRenderer
+
+        from library.fast_serializers import get_values_plan, values_queryset
+        from library.models import Author, Book, Comment, Genre
+        from library.renderers import FastJSONRenderer, orjson
+        from library.services.benchmark_services import seed_books
+        from library.versions.v_1_0.mixins import plan_related
+        from library.versions.v_1_0.serializers import (
+            AuthorSerializer, BookSerializer, CommentSerializer, GenreSerializer
+        )
+
+        seed_books(options['rows'], comments_per_book=1)
+        self.stdout.write(f'JSON encoder of the fast path: {"orjson" if orjson else "json"}')
+        cases = [
+            ('books', Book.default_manager.all(), BookSerializer, []),
+            ('books ?expand=author,owner', Book.default_manager.all(), BookSerializer, ['author', 'owner']),
+            ('comments', Comment.active.all(), CommentSerializer, []),
+            ('comments ?expand=book,owner', Comment.active.all(), CommentSerializer, ['book', 'owner']),
+            ('genres', Genre.objects.all(), GenreSerializer, []),
+            ('authors', Author.objects.all(), AuthorSerializer, []),
+        ]
+        renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        for name, queryset, serializer_class, expand in cases:
+            queryset = plan_related(queryset.order_by('id'), expand)[:options['rows']]
+            plan = get_values_plan(serializer_class, expand)
+
+            def regular():
+                data = serializer_class(list(queryset.all()), many=True, context={'expand': expand}).data
+                return renderer.render(data)
+
+            def fast():
+                return fast_renderer.render(plan.to_representation_many(values_queryset(queryset.all(), plan)))
+
+            if regular() != fast():
+                raise CommandError(f'{name}: the fast path output differs from the serializer output')
+            regular_ms = self._measure(regular, options['repeat'])
+            fast_ms = self._measure(fast, options['repeat'])
+            self.stdout.write(f'{name:30} serializer {regular_ms:8.2f} ms  fast path {fast_ms:8.2f} ms  '
+                              f'x{regular_ms / fast_ms:.1f}')
+
+    @staticmethod
+    def _measure(func, repeat: int) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,75 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError, transaction
+
+
+class Command(BaseCommand):
+    help = ('The command measures how the throughput of comment creation scales with the number of concurrent '
+            'writers. Each writer repeats the transaction of a comment POST in its own connection; created '
+            'comments are deleted afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,2,4,8,16', help='Comma-separated numbers of concurrent writers')
+        parser.add_argument('--writes', type=int, default=200, help='Number of comments created by each writer')
+        parser.add_argument('--deferred', action='store_true',
+                            help='Start transactions with BEGIN DEFERRED instead of BEGIN IMMEDIATE')
+
+    def handle(self, *args, **options):
+        from library.models import Book, Comment
+        from library.services.counter_services import register_comment_created, register_comments_deleted
+        from library.services.sqlite_services import immediate_atomic
+
+        book = Book.default_manager.exclude(owner=None).first()
+        if book is None:
+            raise CommandError('No books with owners found, fill the database with ./manage.py db_filling')
+        atomic = transaction.atomic if options['deferred'] else immediate_atomic
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        mode = 'deferred' if options['deferred'] else 'immediate'
+        self.stdout.write(f'journal_mode={journal_mode}, {mode} transactions')
+
+        for workers in [int(value) for value in options['workers'].split(',')]:
+            timings, errors, created = [], [], []
+
+            def write():
+                try:
+                    for _ in range(options['writes']):
+                        started = time.perf_counter()
+                        try:
+                            with atomic():
+                                comment = Comment.active.create(owner_id=book.owner_id, book_id=book.pk,
+                                                                text='benchmark')
+                                register_comment_created(comment)
+                        except OperationalError as e:
+                            errors.append(str(e))
+                            continue
+                        timings.append((time.perf_counter() - started) * 1000)
+                        created.append(comment.pk)
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=write) for _ in range(workers)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            Comment.active.filter(pk__in=created).delete()
+            register_comments_deleted(book.pk, len(created))
+            if timings:
+                timings.sort()
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                self.stdout.write(
+                    f'{workers} workers: {len(timings) / elapsed:.0f} writes/s, '
+                    f'p50 {statistics.median(timings):.2f} ms, p99 {p99:.2f} ms, errors {len(errors)}'
+                )
+            else:
+                self.stdout.write(f'{workers} workers: all writes failed')
+            if errors:
+                self.stdout.write(f'  first error: {errors[0]}')
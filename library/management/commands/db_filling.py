@@ -4,6 +4,18 @@ from django.core.management.base import BaseCommand
 class Command(BaseCommand):
     help = 'The command allows you to fill the database with test data'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows inserted by a single bulk query')
+        parser.add_argument('--scale', type=int, default=1,
+                            help='How many times the books catalog is replicated (comments grow with it)')
+        parser.add_argument('--comments-per-book', type=int, default=5,
+                            help='Number of comments created for every book')
+
     def handle(self, *args, **options):
         from library.services.command_services import DatabaseStuffer
-        DatabaseStuffer().fill()
+        DatabaseStuffer(
+            batch_size=options['batch_size'],
+            scale=options['scale'],
+            comments_per_book=options['comments_per_book']
+        ).fill()
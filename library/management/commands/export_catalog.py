@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'The command streams all books with their comments to a NDJSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file path, "-" writes to stdout')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson', help='Export format')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of books read from the database at once')
+
+    def handle(self, *args, **options):
+        from library.services.export_services import export_catalog
+
+        chunks = export_catalog(options['format'], batch_size=options['batch_size'], gzip=options['gzip'])
+        if options['path'] == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        with open(options['path'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Catalog exported to {options["path"]}'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'The command streams books from a JSON array or JSON Lines catalog file into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the catalog file')
+        parser.add_argument('--format', choices=['auto', 'json', 'jsonl'], default='auto',
+                            help='Catalog file format, detected by the first character by default')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of records written in a single transaction')
+        parser.add_argument('--cache-size', type=int, default=10000,
+                            help='Maximum number of authors kept in the lookup cache')
+        parser.add_argument('--library-id', type=int, default=None,
+                            help='Library the imported books belong to')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Checkpoint file used to resume an interrupted import')
+
+    def handle(self, *args, **options):
+        from library.services.import_services import CatalogFormatError, CatalogImporter, Checkpoint, iter_json_records
+
+        def report(progress):
+            self.stdout.write(
+                f'Processed {progress.records} records: {progress.books} books, '
+                f'{progress.authors} new authors, {progress.skipped} skipped'
+            )
+
+        checkpoint = Checkpoint(options['checkpoint'], options['path']) if options['checkpoint'] else None
+        importer = CatalogImporter(
+            batch_size=options['batch_size'],
+            cache_size=options['cache_size'],
+            library_id=options['library_id'],
+            on_progress=report
+        )
+        try:
+            with open(options['path']) as catalog_file:
+                progress = importer.run(iter_json_records(catalog_file, fmt=options['format']), checkpoint)
+        except (OSError, CatalogFormatError) as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(f'Import finished: {progress.books} books imported'))
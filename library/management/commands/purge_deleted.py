@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'The command physically deletes soft-deleted books and comments in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=float, default=30,
+                            help='Purge objects deleted more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows deleted in a single transaction (at most 900)')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches to let other writers through')
+
+    def handle(self, *args, **options):
+        from library.services.purge_services import purge_deleted
+
+        purged = purge_deleted(timedelta(days=options['older_than_days']), batch_size=options['batch_size'],
+                               pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged["books"]} books and {purged["comments"]} comments'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'The command rebuilds the full-text search index of books, authors and comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of documents indexed at once')
+
+    def handle(self, *args, **options):
+        from library.services.search_services import SearchIndex
+
+        search_index = SearchIndex()
+        if not search_index.is_available():
+            self.stderr.write('Full-text search is supported only by the SQLite backend')
+            return
+        total = search_index.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} documents'))
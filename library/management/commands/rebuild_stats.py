@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'The command recalculates summary tables of books per genre and comments per day'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows aggregated in a single query')
+
+    def handle(self, *args, **options):
+        from library.services.stats_services import rebuild_stats
+
+        rebuilt = rebuild_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats of {rebuilt["genres"]} genres and {rebuilt["days"]} days'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'The command recalculates denormalized comment counters of books in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of books checked in a single transaction')
+
+    def handle(self, *args, **options):
+        from library.services.counter_services import reconcile_book_counters
+
+        fixed = reconcile_book_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Fixed counters of {fixed} books'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'The command runs a worker that executes background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of jobs executed in parallel')
+        parser.add_argument('--pool', choices=('thread', 'process'), default='thread',
+                            help='Execute jobs in a pool of threads or forked processes')
+        parser.add_argument('--poll-interval', type=float, default=1,
+                            help='Seconds to wait before polling an empty queue again')
+        parser.add_argument('--timeout', type=float, default=600,
+                            help='Seconds after which a running job is considered abandoned and requeued')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when there are no jobs ready to run')
+
+    def handle(self, *args, **options):
+        from library.models import JobStatus
+        from library.services.job_services import Worker
+
+        worker = Worker(concurrency=options['concurrency'], pool=options['pool'],
+                        poll_interval=options['poll_interval'], timeout=options['timeout'])
+        pool = 'threads' if worker.pool == 'thread' else 'processes'
+        self.stdout.write(f'Worker {worker.name} started with {worker.concurrency} {pool}')
+        try:
+            totals = worker.run(once=options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker stopped')
+            return
+        summary = ', '.join(f'{JobStatus(status).name.lower()}: {count}' for status, count in sorted(totals.items()))
+        self.stdout.write(self.style.SUCCESS(f'Processed jobs. {summary or "Queue is empty"}'))
@@ -1,8 +1,38 @@
 from django.db import models
 from django.db.models import QuerySet
+from django.utils import timezone
 
+from backend.base_models import Status
 
-class CommentManager(models.Manager):
+
+class StatusQuerySet(QuerySet):
+
+    def soft_delete(self) -> int:
+        '''
+        Помечает объекты удалёнными одним UPDATE. Сигналы не отправляются
+        '''
+        return self.update(status=Status.DELETED, deleted_at=timezone.now())
+
+    def set_status(self, status: int) -> int:
+        return self.update(status=status, deleted_at=timezone.now() if status == Status.DELETED else None)
+
+
+class PublishedManager(models.Manager.from_queryset(StatusQuerySet)):
+    '''
+    Только опубликованные объекты: запросы через этот менеджер используют
+    частичные индексы, в которые не входят скрытые и удалённые строки
+    '''
+    def get_queryset(self) -> QuerySet:
+        return super().get_queryset().filter(status=Status.PUBLISHED)
+
+
+class CommentManager(PublishedManager):
+    '''
+    Опубликованные комментарии опубликованных книг: комментарии скрытой или
+    удалённой книги не видны вместе с ней
+    '''
+    def get_queryset(self) -> QuerySet:
+        return super().get_queryset().filter(book__status=Status.PUBLISHED)
 
     def get_book_comments(self, book_id: int) -> QuerySet:
-        return self.filter(book__id=book_id)
+        return self.filter(book__id=book_id).order_by('created_at', 'id')
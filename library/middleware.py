@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import random
+from time import perf_counter
+from typing import Optional
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from library.services.metrics_services import (
+    current_request, finish_request, registry, RequestMetrics, start_request
+)
+
+logger = logging.getLogger(__name__)
+
+
+def record_request(method: str, path: str, status_code: int, metrics: RequestMetrics, duration: float,
+                   size: Optional[int] = None) -> None:
+    '''
+    Записывает метрики обработанного запроса; size — размер ответа, если он известен
+    '''
+    view = metrics.view or 'unmatched'
+    labels = (('view', view), ('method', method))
+    registry.inc('http_requests_total', (*labels, ('status', str(status_code))))
+    registry.observe('http_request_duration_seconds', labels, duration)
+    registry.observe('http_request_db_duration_seconds', labels, metrics.db_time)
+    registry.observe('http_request_queries', labels, metrics.queries)
+    if size is not None:
+        registry.observe('http_response_size_bytes', labels, size)
+    if metrics.queries > settings.METRICS_QUERY_BUDGET:
+        registry.inc('http_request_query_budget_exceeded_total', labels)
+        logger.warning('%s %s (%s) issued %d database queries, the budget is %d',
+                       method, path, view, metrics.queries, settings.METRICS_QUERY_BUDGET)
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    '''
+    Собирает метрики доли запросов (METRICS_SAMPLE_RATE): время обработки,
+    время и число запросов к базе данных, размер ответа и обращения к кэшу
+    ответов. Для запросов сверх METRICS_QUERY_BUDGET пишет предупреждение в лог.
+    Поддерживает асинхронный режим, чтобы асинхронные представления под ASGI
+    не выполнялись в потоке
+    '''
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        metrics, token = start_request()
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request(token)
+        self.record(request, response, metrics, perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+        metrics, token = start_request()
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request(token)
+        self.record(request, response, metrics, perf_counter() - started)
+        return response
+
+    def record(self, request, response, metrics: RequestMetrics, duration: float) -> None:
+        record_request(request.method, request.path, response.status_code, metrics, duration,
+                       None if response.streaming else len(response.content))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_request()
+        if metrics is not None:
+            metrics.view = request.resolver_match.view_name
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.1 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_book_library'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['book', 'created_at'], name='comments_book_id_6fc7ec_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0.1 on 2026-10-18 16:34
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    Comment = apps.get_model('library', 'Comment')
+    comments = Comment._default_manager.filter(book=OuterRef('pk')).order_by().values('book')
+    Book._default_manager.using(schema_editor.connection.alias).update(
+        comments_count=Coalesce(Subquery(comments.annotate(count=Count('id')).values('count')[:1]), 0),
+        last_comment_at=Subquery(comments.annotate(last=Max('created_at')).values('last')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата последнего комментария'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
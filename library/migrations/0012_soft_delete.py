@@ -0,0 +1,112 @@
+# Generated by Django 4.0.1 on 2026-10-18 16:54
+
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_book_comment_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='book',
+            options={'default_manager_name': 'default_manager', 'verbose_name': 'Книга', 'verbose_name_plural': 'Книги'},
+        ),
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'default_manager_name': 'default_manager', 'verbose_name': 'Комментарий', 'verbose_name_plural': 'Комментарии к книгам'},
+        ),
+        migrations.AlterModelManagers(
+            name='comment',
+            managers=[
+                ('default_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='books_title_7a737c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='books_year_e323a9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='books_genre_i_e39a29_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='books_author__da1b7c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='books_library_6259e5_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='books_owner_i_b40475_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comments_book_id_6fc7ec_idx',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата удаления'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Опубликован'), (1, 'Скрыт модератором'), (2, 'Удалён')], default=0, editable=False, verbose_name='Состояние'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата удаления'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Опубликован'), (1, 'Скрыт модератором'), (2, 'Удалён')], default=0, editable=False, verbose_name='Состояние'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['title'], name='books_title_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['year'], name='books_year_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['genre', 'year'], name='books_genre_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['author', 'year'], name='books_author_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['library', 'year'], name='books_library_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['owner', 'year'], name='books_owner_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 2)), fields=['deleted_at'], name='books_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['book', 'created_at'], name='comments_book_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('status', 2)), fields=['deleted_at'], name='comments_deleted_idx'),
+        ),
+    ]
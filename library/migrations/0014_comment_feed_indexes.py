@@ -0,0 +1,25 @@
+# Generated by Django 4.0.1 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_job_queue'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comments_book_published_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['book', 'created_at', 'id'], name='comments_book_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['created_at', 'id'], name='comments_published_idx'),
+        ),
+    ]
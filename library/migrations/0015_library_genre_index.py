@@ -0,0 +1,17 @@
+# Generated by Django 4.0.1 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_comment_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['library', 'genre'], name='books_lib_genre_published_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.1 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_library_genre_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCommentStats',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False, verbose_name='День')),
+                ('comments', models.IntegerField(default=0, verbose_name='Количество комментариев')),
+            ],
+            options={
+                'verbose_name': 'Сводка комментариев за день',
+                'verbose_name_plural': 'Сводки комментариев по дням',
+                'db_table': 'stats_comments_daily',
+            },
+        ),
+        migrations.CreateModel(
+            name='GenreStats',
+            fields=[
+                ('genre_key', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Жанр (0 — без жанра)')),
+                ('books', models.IntegerField(default=0, verbose_name='Количество книг')),
+            ],
+            options={
+                'verbose_name': 'Сводка по жанру',
+                'verbose_name_plural': 'Сводки по жанрам',
+                'db_table': 'stats_genres',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('status', 0)), fields=['comments_count', 'id'], name='books_top_published_idx'),
+        ),
+    ]
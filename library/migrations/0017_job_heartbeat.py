@@ -0,0 +1,33 @@
+# Generated by Django 4.0.1 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+def start_heartbeats(apps, schema_editor):
+    # Выполняемые задачи получают сигнал от начала попытки, иначе они никогда не вернутся в очередь
+    Job = apps.get_model('library', 'Job')
+    Job.objects.filter(status=1).update(heartbeat_at=models.F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0016_summary_stats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='job',
+            name='jobs_running_idx',
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний сигнал обработчика'),
+        ),
+        migrations.RunPython(start_heartbeats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['heartbeat_at'], name='jobs_running_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.1 on 2026-10-18 17:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comments_book_id_049069_idx',
+        ),
+    ]
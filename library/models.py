@@ -1,8 +1,12 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
-from backend.base_models import BaseModel
-from library.managers import CommentManager
+from backend.base_models import BaseModel, Status
+from library.managers import CommentManager, PublishedManager
+
+# Условие частичных индексов: в них входят только опубликованные строки
+PUBLISHED = models.Q(status=Status.PUBLISHED)
 
 
 class Library(models.Model):
@@ -85,6 +89,11 @@ class Book(BaseModel):
         null=True,
         verbose_name='Жанр'
     )
+    comments_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев')
+    last_comment_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                           verbose_name='Дата последнего комментария')
+
+    active = PublishedManager()
 
     def __str__(self):
         return self.title
@@ -93,8 +102,17 @@ class Book(BaseModel):
         verbose_name = 'Книга'
         verbose_name_plural = 'Книги'
         db_table = 'books'
+        default_manager_name = 'default_manager'
         indexes = [
-            models.Index(fields=['title'])
+            models.Index(fields=['title'], name='books_title_published_idx', condition=PUBLISHED),
+            models.Index(fields=['year'], name='books_year_published_idx', condition=PUBLISHED),
+            models.Index(fields=['genre', 'year'], name='books_genre_published_idx', condition=PUBLISHED),
+            models.Index(fields=['author', 'year'], name='books_author_published_idx', condition=PUBLISHED),
+            models.Index(fields=['library', 'year'], name='books_library_published_idx', condition=PUBLISHED),
+            models.Index(fields=['library', 'genre'], name='books_lib_genre_published_idx', condition=PUBLISHED),
+            models.Index(fields=['owner', 'year'], name='books_owner_published_idx', condition=PUBLISHED),
+            models.Index(fields=['comments_count', 'id'], name='books_top_published_idx', condition=PUBLISHED),
+            models.Index(fields=['deleted_at'], name='books_deleted_idx', condition=models.Q(status=Status.DELETED))
         ]
 
 
@@ -114,12 +132,88 @@ class Comment(BaseModel):
     active = CommentManager()
 
     def __str__(self):
-        return f'Комментарий {self.owner.username} к книге {self.book.title}'
+        owner = self.owner.username if self.owner_id else 'удалённого пользователя'
+        return f'Комментарий {owner} к книге {self.book.title}'
 
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии к книгам'
         db_table = 'comments'
+        default_manager_name = 'default_manager'
+        indexes = [
+            models.Index(fields=['book', 'created_at', 'id'], name='comments_book_published_idx', condition=PUBLISHED),
+            models.Index(fields=['created_at', 'id'], name='comments_published_idx', condition=PUBLISHED),
+            models.Index(fields=['deleted_at'], name='comments_deleted_idx',
+                         condition=models.Q(status=Status.DELETED))
+        ]
+
+
+class GenreStats(models.Model):
+    '''
+    Сводка: число опубликованных книг жанра. Обновляется сигналами и
+    пакетными операциями, полностью пересчитывается командой rebuild_stats
+    '''
+    # Без внешнего ключа: строка книг без жанра хранится с genre_key = 0
+    genre_key = models.PositiveIntegerField(primary_key=True, verbose_name='Жанр (0 — без жанра)')
+    books = models.IntegerField(default=0, verbose_name='Количество книг')
+
+    class Meta:
+        verbose_name = 'Сводка по жанру'
+        verbose_name_plural = 'Сводки по жанрам'
+        db_table = 'stats_genres'
+
+
+class DailyCommentStats(models.Model):
+    '''
+    Сводка: число опубликованных комментариев, добавленных за день
+    '''
+    day = models.DateField(primary_key=True, verbose_name='День')
+    comments = models.IntegerField(default=0, verbose_name='Количество комментариев')
+
+    class Meta:
+        verbose_name = 'Сводка комментариев за день'
+        verbose_name_plural = 'Сводки комментариев по дням'
+        db_table = 'stats_comments_daily'
+
+
+class JobStatus(models.IntegerChoices):
+    QUEUED = 0, 'В очереди'
+    RUNNING = 1, 'Выполняется'
+    DONE = 2, 'Выполнена'
+    FAILED = 3, 'Ошибка'
+
+
+class Job(models.Model):
+    '''
+    Фоновая задача в очереди: имя зарегистрированной задачи и её аргументы.
+    Задача с ключом идемпотентности не ставится повторно, пока прежняя не завершилась
+    '''
+    name = models.CharField(max_length=128, verbose_name='Задача')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Аргументы')
+    status = models.PositiveSmallIntegerField(choices=JobStatus.choices, default=JobStatus.QUEUED,
+                                              verbose_name='Состояние')
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, unique=True,
+                                       verbose_name='Ключ идемпотентности')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Число попыток')
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name='Максимальное число попыток')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='Время запуска')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало последней попытки')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='Последний сигнал обработчика')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата завершения')
+    worker = models.CharField(max_length=128, blank=True, verbose_name='Обработчик')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        db_table = 'jobs'
         indexes = [
-            models.Index(fields=['book'])
+            models.Index(fields=['run_at', 'id'], name='jobs_queued_idx',
+                         condition=models.Q(status=JobStatus.QUEUED)),
+            models.Index(fields=['heartbeat_at'], name='jobs_running_idx',
+                         condition=models.Q(status=JobStatus.RUNNING))
         ]
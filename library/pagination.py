@@ -0,0 +1,198 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time, timezone
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+# Курсор пустого списка: новее него любой объект
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def with_pk_tiebreaker(ordering: tuple) -> tuple:
+    '''
+    Сортировка с первичным ключом в конце (по направлению последнего поля):
+    строки с равными значениями неуникальных полей упорядочены однозначно
+    '''
+    if not ordering or any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+        return ordering
+    return (*ordering, '-id' if ordering[-1].startswith('-') else 'id')
+
+
+def _reverse(ordering: tuple) -> tuple:
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+def _to_json(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def _after(name: str, value, ascending: bool, nullable: bool, nulls_largest: bool) -> Q:
+    '''
+    Строки, идущие в порядке сортировки после значения value поля name. NULL
+    сортируется как наименьшее (SQLite) или наибольшее (PostgreSQL) значение
+    '''
+    if value is None:
+        return Q(**{f'{name}__isnull': False}) if ascending != nulls_largest else Q(pk__in=[])
+    after = Q(**{f'{name}__gt' if ascending else f'{name}__lt': value})
+    if nullable and ascending == nulls_largest:
+        after |= Q(**{f'{name}__isnull': True})
+    return after
+
+
+def _equal(name: str, value) -> Q:
+    return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+
+class KeysetPagination(CursorPagination):
+    '''
+    Курсорная (keyset) пагинация. Позиция курсора — значения всех полей
+    сортировки последнего объекта страницы, последнее из них — первичный ключ.
+    Страница выбирается условием (поле, id) > (позиция) без смещения, поэтому
+    строки с равными значениями поля не пропускаются и не повторяются, а
+    выборка страницы не зависит от глубины пролистывания. Курсор непрозрачен
+    для клиента
+    '''
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view) -> tuple:
+        return tuple(with_pk_tiebreaker(super().get_ordering(request, queryset, view)))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        # Позиции уникальны, поэтому ссылки CursorPagination строятся без смещения
+        reverse, position = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+
+        queryset = queryset.order_by(*(_reverse(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            queryset = queryset.filter(self._after_position(queryset, position, reverse))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = True, position
+            self.has_previous, self.previous_position = following is not None, following
+        else:
+            self.has_next, self.next_position = following is not None, following
+            self.has_previous, self.previous_position = position is not None, position
+        self.display_page_controls = (self.has_previous or self.has_next) and self.template is not None
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering) -> str:
+        names = [field.lstrip('-') for field in ordering]
+        if isinstance(instance, dict):
+            values = [instance[name] for name in names]
+        else:
+            values = [getattr(instance, name) for name in names]
+        return json.dumps(values, default=_to_json)
+
+    def _after_position(self, queryset, position: str, reverse: bool) -> Q:
+        '''
+        Условие «строка после позиции» для лексикографического порядка по
+        всем полям сортировки. Первое поле дополнительно ограничено
+        диапазоном, чтобы выборка шла по индексу
+        '''
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        nulls_largest = connections[queryset.db].features.nulls_order_largest
+        opts = queryset.model._meta
+        condition = bound = None
+        for field, value in reversed(list(zip(self.ordering, values))):
+            name = field.lstrip('-')
+            model_field = opts.pk if name == 'pk' else opts.get_field(name)
+            after = _after(name, value, field.startswith('-') == reverse, model_field.null, nulls_largest)
+            condition = after if condition is None else after | (_equal(name, value) & condition)
+            bound = after | _equal(name, value)
+        return condition if len(values) == 1 else bound & condition
+
+
+class SincePaginationMixin():
+    '''
+    Инкрементальный режим для опроса новых объектов по (created_at, id).
+    С параметром ?since=<курсор> возвращаются только объекты новее курсора
+    в порядке создания, не больше размера страницы, и курсор для следующего
+    опроса. Пустой ?since= возвращает курсор самого нового объекта без
+    данных — с него начинается опрос. Выборка идёт по индексу
+    (created_at, id), поэтому стоимость опроса зависит от числа новых объектов
+    '''
+    since_query_param = 'since'
+    since_fields = ('created_at', 'id')
+
+    def is_incremental(self, request) -> bool:
+        return self.since_query_param in request.query_params
+
+    def paginate_since(self, queryset, request) -> list:
+        self.page_size = self.get_page_size(request)
+        cursor = request.query_params[self.since_query_param]
+        if not cursor:
+            latest = queryset.order_by(*(f'-{field}' for field in self.since_fields)).first()
+            self.since = self.encode_since(*self._item_values(latest)) if latest else self.encode_since(EPOCH, 0)
+            self.has_more = False
+            return []
+        created_at, pk = self.decode_since(cursor)
+        # Эквивалент (created_at, id) > (курсор) в форме, для которой используется поиск по диапазону индекса
+        queryset = queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, id__lte=pk)
+        page = list(queryset.order_by(*self.since_fields)[:self.page_size + 1])
+        self.has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.since = self.encode_since(*self._item_values(page[-1])) if page else cursor
+        return page
+
+    def get_since_response(self, data) -> Response:
+        return Response({'since': self.since, 'has_more': self.has_more, 'results': data})
+
+    def _item_values(self, item) -> tuple:
+        if isinstance(item, dict):
+            return tuple(item[field] for field in self.since_fields)
+        return tuple(getattr(item, field) for field in self.since_fields)
+
+    @staticmethod
+    def encode_since(created_at: datetime, pk: int) -> str:
+        return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), pk]).encode()).decode()
+
+    @staticmethod
+    def decode_since(cursor: str) -> tuple:
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(cursor)
+            return created_at, int(pk)
+        except (binascii.Error, ValueError, TypeError):
+            raise ValidationError({'since': 'Некорректный курсор'})
+
+
+class CommentsKeysetPagination(SincePaginationMixin, KeysetPagination):
+    '''
+    Курсорная пагинация комментариев по дате создания
+    '''
+    ordering = ('created_at', 'id')
+
+
+class RecentCommentsPagination(SincePaginationMixin, KeysetPagination):
+    '''
+    Курсорная пагинация ленты комментариев: сначала новые
+    '''
+    ordering = ('-created_at', '-id')
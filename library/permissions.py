@@ -10,7 +10,15 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        if obj.owner:
-            return obj.owner == request.user
-        else:
-            return False
+        # owner_id загружается вместе с объектом, сравнение не требует запроса владельца
+        return obj.owner_id is not None and obj.owner_id == request.user.pk
+
+    def filter_queryset(self, request, queryset, view):
+        """
+        Разрешение на уровне набора объектов. Оставляет для изменения и удаления
+        только объекты владельца, чтобы выполнять их одним запросом без проверки
+        каждого объекта
+        """
+        if request.method in permissions.SAFE_METHODS:
+            return queryset
+        return queryset.filter(owner=request.user)
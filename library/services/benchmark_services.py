@@ -0,0 +1,322 @@
+'''
+Нагрузочные замеры REST API: заполнение базы, обход маршрутов
+library/urls.py, замер времени, числа запросов и пикового потребления
+памяти, сравнение с результатами предыдущего запуска
+'''
+import json
+import logging
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from rest_framework.authtoken.models import Token
+
+from library.models import Author, Book, Comment, Genre, Job, Library
+from library.services.command_services import DatabaseStuffer
+from library.throttling import bucket_store
+
+BENCHMARK_USERNAME = 'benchmark'
+BENCHMARK_PASSWORD = 'benchmark-password'
+# Поток Server-Sent Events обслуживает ASGI-приложение, а не Django, и не завершается сам
+UNMEASURED_ROUTES = {'async_comment_stream'}
+
+
+def seed_books(count: int, comments_per_book: int = 0, batch_size: int = 10000) -> int:
+    '''
+    Дополняет базу копиями каталога DatabaseStuffer, пока в ней не станет
+    не меньше count книг. Возвращает число книг
+    '''
+    books_count = Book.default_manager.count()
+    if books_count < count:
+        catalog_size = sum(1 for _ in DatabaseStuffer()._iter_catalog())
+        scale = -(-(count - books_count) // catalog_size)
+        DatabaseStuffer(batch_size=batch_size, scale=scale, comments_per_book=comments_per_book).fill()
+        books_count = Book.default_manager.count()
+    return books_count
+
+
+@dataclass
+class BenchmarkResult():
+    '''
+    Результат замера одного сценария. Время — в миллисекундах, память — в
+    килобайтах, пропускная способность — запросов в секунду в одном потоке
+    '''
+    name: str
+    method: str
+    path: str
+    status: int
+    rounds: int
+    throughput: float
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+    queries: int
+    response_bytes: int
+    peak_memory_kb: float
+
+
+@dataclass
+class BenchmarkCase():
+    '''
+    Сценарий замера: запрос к маршруту. Запросы, изменяющие данные,
+    выполняются в транзакции, которая откатывается после каждого повтора
+    '''
+    name: str
+    method: str
+    path: str
+    data: object = None
+    query: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def writes(self) -> bool:
+        return self.method not in ('get', 'head', 'options')
+
+
+def measure(func: Callable[[], object], rounds: int, warmup: int = 1) -> List[float]:
+    '''
+    Выполняет func warmup раз без замера и rounds раз с замером, возвращает
+    длительности в миллисекундах
+    '''
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(timings: List[float], share: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def iter_routes(patterns=None) -> Iterator[URLPattern]:
+    '''
+    Перебирает именованные маршруты library/urls.py, кроме вариантов с
+    суффиксом формата (.json), которые добавляет DefaultRouter
+    '''
+    if patterns is None:
+        from library.urls import urlpatterns as patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns)
+        elif pattern.name and 'format' not in _route_params(pattern):
+            yield pattern
+
+
+def _route_params(pattern: URLPattern) -> list:
+    return list(pattern.pattern.regex.groupindex)
+
+
+def _route_methods(pattern: URLPattern) -> list:
+    actions = getattr(pattern.callback, 'actions', None)
+    if actions is not None:
+        return [method for method in actions if method != 'put']
+    view_class = getattr(pattern.callback, 'cls', None)
+    if view_class is not None:
+        return [method for method in ('get', 'post') if hasattr(view_class, method)]
+    return ['get']
+
+
+class APIBenchmark():
+    '''
+    Замеры всех маршрутов API тестовым клиентом Django в текущем процессе.
+    Объекты, на которых выполняются запросы, создаются в транзакции, которая
+    откатывается после замеров, поэтому база данных не изменяется.
+    При warm_cache=False кэш ответов очищается перед каждым запросом
+    '''
+    def __init__(self, rounds: int = 50, warmup: int = 3, warm_cache: bool = False,
+                 only: Optional[List[str]] = None):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.warm_cache = warm_cache
+        self.only = only
+        self.skipped = []
+
+    def run(self) -> List[BenchmarkResult]:
+        # Число запросов входит в отчёт, предупреждения о превышении бюджета запросов не нужны
+        metrics_logger = logging.getLogger('library.middleware')
+        level = metrics_logger.level
+        metrics_logger.setLevel(logging.ERROR)
+        try:
+            with transaction.atomic():
+                try:
+                    client, fixtures = self._setup()
+                    return [self._measure_case(client, case) for case in self.build_cases(fixtures)]
+                finally:
+                    transaction.set_rollback(True)
+        finally:
+            metrics_logger.setLevel(level)
+
+    def _setup(self) -> tuple:
+        # Администратор, чтобы замерить и маршруты, доступные только администраторам
+        user = get_user_model().objects.create_user(BENCHMARK_USERNAME, password=BENCHMARK_PASSWORD, is_staff=True)
+        token = Token.objects.create(user=user)
+        library = Library.objects.create(title='Библиотека', address='Адрес', working_hours='09:00 - 17:00')
+        genre = Genre.objects.create(title='Жанр для замеров')
+        author = Author.objects.create(full_name='Автор для замеров', birthday=1900)
+        book = Book.default_manager.create(title='Книга для замеров', year=1950, author=author, genre=genre,
+                                           library=library, owner=user)
+        Comment.active.bulk_create(
+            Comment(book=book, owner=user, text=f'Комментарий для замеров {i}') for i in range(20)
+        )
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        fixtures = {
+            'user': user, 'library': library, 'genre': genre, 'author': author, 'book': book,
+            'comment': Comment.active.filter(book=book).order_by('id').first(),
+            'job': Job.objects.create(name='rebuild_search_index'),
+        }
+        return client, fixtures
+
+    def build_cases(self, fixtures: dict) -> List[BenchmarkCase]:
+        '''
+        Строит сценарии для каждого маршрута и каждого поддерживаемого метода
+        '''
+        book, comment, author = fixtures['book'], fixtures['comment'], fixtures['author']
+        ids = {'books': book.pk, 'genres': fixtures['genre'].pk, 'comments': comment.pk, 'authors': author.pk,
+               'jobs': fixtures['job'].pk, 'libraries': fixtures['library'].pk}
+        parents = {'book_id': book.pk, 'library_id': fixtures['library'].pk}
+        payloads = {
+            ('books-list', 'post'): {'title': 'Новая книга', 'year': 2000, 'author': author.pk},
+            ('books-detail', 'patch'): {'year': 2001},
+            ('books-bulk', 'post'): [{'title': f'Книга {i}', 'year': 2000, 'author': author.pk} for i in range(100)],
+            ('books-bulk', 'patch'): [{'id': book.pk, 'year': 2002}],
+            ('books-bulk', 'delete'): [book.pk],
+            ('comments-list', 'post'): {'text': 'Новый комментарий', 'book': book.pk},
+            ('comments-detail', 'patch'): {'text': 'Изменённый комментарий'},
+            ('comments-bulk', 'post'): [{'text': f'Комментарий {i}', 'book': book.pk} for i in range(100)],
+            ('comments-bulk', 'patch'): [{'id': comment.pk, 'text': 'Изменённый комментарий'}],
+            ('comments-bulk', 'delete'): [comment.pk],
+            ('token_authentication_url', 'post'): {'username': BENCHMARK_USERNAME, 'password': BENCHMARK_PASSWORD},
+        }
+        queries = {
+            'books-list': {'page_size': '100'},
+            'async_books_list': {'page_size': '100'},
+            'books-export': {'title': book.title},
+            'search': {'q': 'замеров'},
+            'async_comment_events': {'since': ''},
+        }
+
+        cases = []
+        for pattern in iter_routes():
+            resource = pattern.name.replace('async_', '').replace('-', '_').split('_')[0]
+            kwargs = {}
+            for param in _route_params(pattern):
+                kwargs[param] = parents.get(param, ids.get(resource, book.pk))
+            path = reverse(f'library_1_0:{pattern.name}', kwargs=kwargs)
+            for method in _route_methods(pattern):
+                name = f'{method.upper()} {pattern.name}'
+                if self.only and not any(selected in name for selected in self.only):
+                    continue
+                if pattern.name in UNMEASURED_ROUTES or (
+                        method != 'get' and method != 'delete' and (pattern.name, method) not in payloads):
+                    self.skipped.append(name)
+                    continue
+                cases.append(BenchmarkCase(name, method, path, payloads.get((pattern.name, method)),
+                                           queries.get(pattern.name, {})))
+        return cases
+
+    def _request(self, client: Client, case: BenchmarkCase) -> tuple:
+        '''
+        Выполняет запрос сценария, возвращает статус и размер ответа
+        '''
+        if not self.warm_cache:
+            caches[settings.API_CACHE_ALIAS].clear()
+        # Замеры повторяют запросы одного клиента, поэтому лимиты частоты запросов сбрасываются
+        bucket_store.clear()
+        if case.method == 'get':
+            response = client.get(case.path, case.query)
+        elif case.data is None:
+            response = getattr(client, case.method)(case.path)
+        else:
+            response = getattr(client, case.method)(case.path, json.dumps(case.data),
+                                                    content_type='application/json')
+        if response.streaming:
+            return response.status_code, sum(len(chunk) for chunk in response.streaming_content)
+        return response.status_code, len(response.content)
+
+    def _run_request(self, client: Client, case: BenchmarkCase) -> tuple:
+        if not case.writes:
+            return self._request(client, case)
+        with transaction.atomic():
+            try:
+                return self._request(client, case)
+            finally:
+                transaction.set_rollback(True)
+
+    def _measure_case(self, client: Client, case: BenchmarkCase) -> BenchmarkResult:
+        with CaptureQueriesContext(connection) as context:
+            status_code, response_bytes = self._run_request(client, case)
+        queries = len(context.captured_queries)
+
+        tracemalloc.start()
+        try:
+            self._run_request(client, case)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings = measure(lambda: self._run_request(client, case), self.rounds, self.warmup)
+        return BenchmarkResult(
+            name=case.name,
+            method=case.method.upper(),
+            path=case.path,
+            status=status_code,
+            rounds=self.rounds,
+            throughput=round(len(timings) / (sum(timings) / 1000), 1),
+            mean=round(statistics.mean(timings), 3),
+            p50=round(statistics.median(timings), 3),
+            p95=round(percentile(timings, 0.95), 3),
+            p99=round(percentile(timings, 0.99), 3),
+            max=round(max(timings), 3),
+            queries=queries,
+            response_bytes=response_bytes,
+            peak_memory_kb=round(peak_memory / 1024, 1),
+        )
+
+
+def make_report(results: List[BenchmarkResult], **meta) -> dict:
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            **meta,
+        },
+        'results': {result.name: asdict(result) for result in results},
+    }
+
+
+def find_regressions(report: dict, baseline: dict, threshold: float, metric: str = 'p50') -> List[str]:
+    '''
+    Сравнивает отчёт с базовым: сценарий считается ухудшившимся, если
+    значение metric выросло больше чем на threshold процентов или выросло
+    число запросов к базе данных
+    '''
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        if previous[metric] > 0 and result[metric] > previous[metric] * (1 + threshold / 100):
+            change = (result[metric] / previous[metric] - 1) * 100
+            regressions.append(f'{name}: {metric} {previous[metric]} -> {result[metric]} ms (+{change:.0f}%)')
+        if result['queries'] > previous['queries']:
+            regressions.append(f'{name}: queries {previous["queries"]} -> {result["queries"]}')
+    return regressions
@@ -0,0 +1,51 @@
+import hashlib
+import time
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_KEY_PREFIX = 'api:version:'
+RESPONSE_KEY_PREFIX = 'api:response:'
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def get_versions(scopes: Iterable[str]) -> Dict[str, float]:
+    '''
+    Возвращает версии областей кэша. Версия — время последнего изменения
+    данных области; отсутствующая версия инициализируется текущим временем,
+    поэтому вытесненный из кэша счётчик никогда не вернёт устаревший ответ
+    '''
+    cache = get_cache()
+    keys = {scope: f'{VERSION_KEY_PREFIX}{scope}' for scope in scopes}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for scope, key in keys.items():
+        if key not in stored:
+            cache.add(key, time.time(), None)
+            stored[key] = cache.get(key, time.time())
+        versions[scope] = stored[key]
+    return versions
+
+
+def invalidate(*scopes: str) -> None:
+    '''
+    Сбрасывает кэш областей. Версия обновляется сразу и повторно после
+    фиксации транзакции, чтобы ответ, построенный конкурентным запросом по
+    ещё не зафиксированным данным, не сохранился под новой версией
+    '''
+    def bump():
+        now = time.time()
+        get_cache().set_many({f'{VERSION_KEY_PREFIX}{scope}': now for scope in scopes}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def make_response_key(path: str, query: Iterable[tuple], versions: Dict[str, float], database: str) -> str:
+    parts = [path, repr(sorted(query)), repr(sorted(versions.items())), database]
+    return RESPONSE_KEY_PREFIX + hashlib.sha1('|'.join(parts).encode()).hexdigest()
@@ -0,0 +1,46 @@
+'''
+Сводки по фонду библиотеки. Каждая сводка считается одним запросом
+GROUP BY по опубликованным книгам библиотеки с отбором по частичному
+индексу (library, genre). Группировка идёт только по id жанра или автора,
+а название берётся агрегатом Max по присоединённой строке: так группы по
+жанрам собираются в порядке индекса, без сортировки
+'''
+from django.db.models import Count, F, Max, Value
+
+from library.models import Book
+
+
+def library_books(library_id: int):
+    return Book.active.filter(library_id=library_id).order_by()
+
+
+def books_by_genre(library_id: int) -> list:
+    '''
+    Число книг по жанрам, сначала самые многочисленные. Книги без жанра
+    учитываются в строке с id None
+    '''
+    rows = (library_books(library_id).values('genre_id')
+            .annotate(books=Count('id'), title=Max('genre__title')).order_by('-books', 'genre_id'))
+    return [{'id': row['genre_id'], 'title': row['title'], 'books': row['books']} for row in rows]
+
+
+def books_by_author(library_id: int, limit: int) -> list:
+    '''
+    Число книг по авторам, не больше limit самых представленных авторов
+    '''
+    rows = (library_books(library_id).values('author_id')
+            .annotate(books=Count('id'), full_name=Max('author__full_name')).order_by('-books', 'author_id')[:limit])
+    return [{'id': row['author_id'], 'full_name': row['full_name'], 'books': row['books']} for row in rows]
+
+
+def books_by_year(library_id: int, bucket: int) -> list:
+    '''
+    Число книг по интервалам годов выпуска длиной bucket лет. Книги без года
+    учитываются в строке с границами None
+    '''
+    rows = (library_books(library_id).annotate(start=F('year') / Value(bucket) * Value(bucket))
+            .values('start').annotate(books=Count('id')).order_by('start'))
+    return [
+        {'from': row['start'], 'to': None if row['start'] is None else row['start'] + bucket - 1, 'books': row['books']}
+        for row in rows
+    ]
@@ -1,14 +1,44 @@
-import json
 import uuid
 import random
 from pathlib import Path
+from typing import Iterator
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
 from library.models import Library, Genre, Author, Book, Comment
+from library.services.counter_services import reconcile_book_counters
+from library.services.import_services import iter_json_records
+from library.services.search_services import SearchIndex
+from library.services.stats_services import rebuild_stats
+from library.services.utils import batched, values_in
 
 
 class DatabaseStuffer():
+    '''
+    Заполняет базу данных тестовыми данными пакетными вставками (bulk_create).
+    Каждый этап выполняется в отдельной транзакции, а внешние ключи
+    проставляются по идентификаторам, сохранённым в памяти. Уже созданные
+    объекты пропускаются, поэтому заполнение можно запускать повторно
+    '''
+    USERS_COUNT = 100
+    LIBRARIES_COUNT = 5
+    COMMENTS_PER_BOOK = 5
+    GENRES = ['Детектив', 'Приключение', 'Роман', 'Фентези', 'Научная фантастика', 'Справочник']
+
+    def __init__(self, batch_size: int = 1000, scale: int = 1, comments_per_book: int = COMMENTS_PER_BOOK):
+        if batch_size < 1:
+            raise ValueError('batch_size должен быть положительным')
+        if scale < 1:
+            raise ValueError('scale должен быть положительным')
+        self.batch_size = batch_size
+        self.scale = scale
+        self.comments_per_book = comments_per_book
+        self.user_ids = []
+        self.library_ids = []
+        self.genre_ids = []
+        self.author_ids = {}
+
     def fill(self):
         '''
         Заполняет базу данных тестовыми данными
@@ -19,63 +49,127 @@ class DatabaseStuffer():
             self._fill_genres()
             self._fill_authors_and_books()
             self._fill_comments()
+            self._fill_book_counters()
+            self._fill_stats()
+            self._fill_search_index()
             print('Все данные успешно загружены!')
         except Exception as e:
             print(f'Что-то пошло нет так\nСообщение об ошибке: {e}')
 
+    @transaction.atomic
     def _fill_users(self) -> None:
         '''
-        Создаёт 100 случайно сгенерированных пользователей
+        Создаёт 100 случайно сгенерированных пользователей (уже существующие
+        пропускаются, поэтому заполнение можно запускать повторно)
         '''
-        for i in range(100):
-            get_user_model().objects.create(
-                username=f'user_{i}',
-                password=uuid.uuid4(),
-            )
+        user_model = get_user_model()
+        usernames = [f'user_{i}' for i in range(self.USERS_COUNT)]
+        user_model.objects.bulk_create(
+            (user_model(username=username, password=uuid.uuid4()) for username in usernames),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        self.user_ids = list(user_model.objects.filter(username__in=usernames).values_list('id', flat=True))
 
+    @transaction.atomic
     def _fill_library(self):
-        for i in range(5):
-            Library.objects.create(
-                title=f'Районная библиотека №{i+1}',
-                address=f'г. Рыбинск, улица {uuid.uuid4()}, дом {i}',
-                working_hours='09:00 - 17:00'
-            )
+        titles = [f'Районная библиотека №{i+1}' for i in range(self.LIBRARIES_COUNT)]
+        existing = set(Library.objects.filter(title__in=titles).values_list('title', flat=True))
+        Library.objects.bulk_create(
+            [
+                Library(
+                    title=title,
+                    address=f'г. Рыбинск, улица {uuid.uuid4()}, дом {i}',
+                    working_hours='09:00 - 17:00'
+                )
+                for i, title in enumerate(titles) if title not in existing
+            ],
+            batch_size=self.batch_size
+        )
+        self.library_ids = list(Library.objects.filter(title__in=titles).order_by('id').values_list('id', flat=True))
 
+    @transaction.atomic
     def _fill_genres(self):
-        genres = ['Детектив', 'Приключение', 'Роман', 'Фентези', 'Научная фантастика', 'Справочник']
-        for genre in genres:
-            Genre.objects.create(
-                title=genre
-            )
+        existing = set(Genre.objects.filter(title__in=self.GENRES).values_list('title', flat=True))
+        Genre.objects.bulk_create(
+            [Genre(title=genre) for genre in self.GENRES if genre not in existing],
+            batch_size=self.batch_size
+        )
+        self.genre_ids = list(Genre.objects.filter(title__in=self.GENRES).values_list('id', flat=True))
 
-    def _fill_authors_and_books(self):
+    def _iter_catalog(self) -> Iterator[dict]:
+        '''
+        Потоково читает каталог книг, не загружая файл в память целиком
+        '''
         file_path = f'{Path(__file__).resolve().parent.parent}/data/authors_books.json'
-        library = Library.objects.first()
-        users = get_user_model().objects.all()
-        genres = Genre.objects.all()
         with open(file_path) as json_file:
-            data = json.load(json_file)
-            for book_data in data:
-                author = Author.objects.create(
-                    full_name=book_data['author'],
-                    birthday=(book_data['year']-35)
-                )
-                Book.default_manager.create(
-                    title=book_data['title'],
-                    year=book_data['year'],
-                    library=library,
-                    author=author,
-                    genre=random.choice(genres),
-                    owner=random.choice(users)
-                )
+            yield from iter_json_records(json_file)
+
+    @transaction.atomic
+    def _fill_authors_and_books(self):
+        self._fill_authors(self._iter_catalog())
+        library_id = self.library_ids[0] if self.library_ids else None
+        books = (
+            Book(
+                title=book_data['title'] if copy == 0 else f'{book_data["title"]} (экз. {copy + 1})',
+                year=book_data['year'],
+                library_id=library_id,
+                author_id=self.author_ids[book_data['author']],
+                genre_id=random.choice(self.genre_ids),
+                owner_id=random.choice(self.user_ids)
+            )
+            for copy in range(self.scale)
+            for book_data in self._iter_catalog()
+        )
+        for batch in batched(books, self.batch_size):
+            existing = set(values_in(Book.default_manager.all(), 'title', [book.title for book in batch],
+                                     'title', 'author_id'))
+            Book.default_manager.bulk_create([book for book in batch if (book.title, book.author_id) not in existing])
 
+    def _fill_authors(self, data: Iterator[dict]) -> None:
+        '''
+        Создаёт по одному автору на каждое уникальное имя из каталога (если
+        автора с таким именем ещё нет) и запоминает соответствие имени автора
+        его идентификатору
+        '''
+        birthdays = {}
+        for book_data in data:
+            birthdays.setdefault(book_data['author'], book_data['year'] - 35)
+        for names in batched(birthdays, self.batch_size):
+            existing = dict(values_in(Author.objects.all(), 'full_name', names, 'full_name', 'id'))
+            Author.objects.bulk_create(
+                [Author(full_name=name, birthday=birthdays[name]) for name in names if name not in existing]
+            )
+            self.author_ids.update(values_in(Author.objects.all(), 'full_name', names, 'full_name', 'id'))
+
+    @transaction.atomic
     def _fill_comments(self):
-        users = get_user_model().objects.all()
-        books = Book.default_manager.all()
-        for book in books:
-            for i in range(5):
-                Comment.active.create(
-                    book=book,
-                    text=f'Содержательный комментарий о книге {book.title}',
-                    owner=random.choice(users)
-                )
+        '''
+        Создаёт комментарии для книг, у которых их ещё нет
+        '''
+        books = (Book.default_manager.filter(comments__isnull=True).order_by('id').values_list('id', 'title')
+                 .iterator(chunk_size=self.batch_size))
+        comments = (
+            Comment(
+                book_id=book_id,
+                text=f'Содержательный комментарий о книге {title}',
+                owner_id=random.choice(self.user_ids)
+            )
+            for book_id, title in books
+            for i in range(self.comments_per_book)
+        )
+        for batch in batched(comments, self.batch_size):
+            Comment.active.bulk_create(batch)
+
+    def _fill_book_counters(self):
+        reconcile_book_counters(batch_size=self.batch_size)
+
+    def _fill_stats(self):
+        rebuild_stats(batch_size=self.batch_size)
+
+    def _fill_search_index(self):
+        '''
+        Пакетные вставки не отправляют сигналы post_save, поэтому поисковый
+        индекс перестраивается после загрузки данных
+        '''
+        SearchIndex().rebuild(batch_size=self.batch_size)
@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from backend.base_models import Status
+from library.models import Book, Comment
+from library.services.cache_services import invalidate
+from library.services.utils import batched, MAX_IN_LIST
+
+
+def _published_comments():
+    '''
+    Опубликованные комментарии независимо от состояния книги: счётчики скрытой
+    книги остаются верными после её повторной публикации
+    '''
+    return Comment.default_manager.filter(status=Status.PUBLISHED)
+
+
+def _last_comment_at() -> Subquery:
+    comments = _published_comments().filter(book=OuterRef('pk')).order_by().values('book')
+    return Subquery(comments.annotate(last=Max('created_at')).values('last')[:1])
+
+
+def register_comment_created(comment: Comment) -> None:
+    '''
+    Увеличивает счётчик комментариев книги одним UPDATE с F-выражением
+    '''
+    register_comments_created(comment.book_id, 1, comment.created_at)
+
+
+def register_comments_created(book_id: int, count: int, last_created_at) -> None:
+    created_at = Value(last_created_at)
+    Book.default_manager.filter(pk=book_id).update(
+        comments_count=F('comments_count') + count,
+        last_comment_at=Greatest(Coalesce(F('last_comment_at'), created_at), created_at),
+    )
+    invalidate('book-counters', f'book:{book_id}')
+
+
+def register_comment_deleted(book_id: int) -> None:
+    '''
+    Уменьшает счётчик комментариев книги и пересчитывает дату последнего
+    комментария одним UPDATE. Вызывается после удаления комментария
+    '''
+    register_comments_deleted(book_id, 1)
+
+
+def register_comments_deleted(book_id: int, count: int) -> None:
+    Book.default_manager.filter(pk=book_id).update(
+        comments_count=Greatest(F('comments_count') - count, Value(0)),
+        last_comment_at=_last_comment_at(),
+    )
+    invalidate('book-counters', f'book:{book_id}')
+
+
+def register_comments_moved(comments: list, previous_book_ids: dict) -> None:
+    '''
+    Переносит счётчики комментариев, у которых изменилась книга
+    '''
+    for comment in comments:
+        old_book_id = previous_book_ids.get(comment.pk, comment.book_id)
+        if old_book_id != comment.book_id:
+            register_comments_deleted(old_book_id, 1)
+            register_comment_created(comment)
+
+
+def reconcile_book_counters(batch_size: int = 1000) -> int:
+    '''
+    Пересчитывает счётчики комментариев пакетами книг и исправляет
+    расхождения. Возвращает число исправленных книг
+    '''
+    fixed = 0
+    book_ids = Book.default_manager.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+    for batch in batched(book_ids, batch_size):
+        fixed += reconcile_books(batch)
+    return fixed
+
+
+def reconcile_books(book_ids: list) -> int:
+    '''
+    Пересчитывает счётчики комментариев указанных книг, например после
+    скрытия или публикации комментариев модератором. Книги обрабатываются
+    частями не больше MAX_IN_LIST
+    '''
+    return sum(_reconcile_chunk(chunk) for chunk in batched(book_ids, MAX_IN_LIST))
+
+
+def _reconcile_chunk(book_ids: list) -> int:
+    actual = {
+        row['book_id']: (row['count'], row['last'])
+        for row in _published_comments().filter(book_id__in=book_ids).order_by().values('book_id')
+        .annotate(count=Count('id'), last=Max('created_at'))
+    }
+    with transaction.atomic():
+        books = Book.default_manager.filter(id__in=book_ids).only('id', 'comments_count', 'last_comment_at')
+        drifted = []
+        for book in books:
+            count, last = actual.get(book.id, (0, None))
+            if (book.comments_count, book.last_comment_at) != (count, last):
+                book.comments_count, book.last_comment_at = count, last
+                drifted.append(book)
+        Book.default_manager.bulk_update(drifted, ['comments_count', 'last_comment_at'])
+    if drifted:
+        invalidate('book-counters', *[f'book:{book.id}' for book in drifted])
+    return len(drifted)
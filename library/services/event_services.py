@@ -0,0 +1,173 @@
+'''
+Публикация событий изменения комментариев подписчикам в памяти процесса.
+Подписчики — асинхронные обработчики (SSE и long polling), публикация
+возможна из любого потока. Брокер не требует внешних сервисов, поэтому
+события доходят только до подписчиков того же процесса: пропущенные
+новые комментарии клиенты получают из базы данных по курсору ?since=
+'''
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Optional, Set
+
+from django.conf import settings
+from django.db import transaction
+
+OVERFLOW = {'type': 'overflow'}
+
+
+class TooManySubscribers(Exception):
+    '''
+    Достигнуто максимальное число подписчиков процесса
+    '''
+
+
+class Subscription():
+    '''
+    Подписка на канал с ограниченным буфером событий. Если подписчик не
+    успевает забирать события и буфер переполняется, буфер очищается, а
+    подписка закрывается событием overflow: клиент переподключается и
+    получает пропущенное из базы данных
+    '''
+    def __init__(self, broker: 'EventBroker', channel: str, buffer_size: int):
+        self.broker = broker
+        self.channel = channel
+        self.buffer_size = buffer_size
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+        self._events = deque()
+        self._waiter: Optional[asyncio.Future] = None
+
+    def deliver(self, event: dict) -> None:
+        '''
+        Добавляет событие в буфер. Вызывается в цикле событий подписчика
+        '''
+        if self.closed:
+            return
+        if len(self._events) >= self.buffer_size:
+            self._events.clear()
+            self._events.append(OVERFLOW)
+            self.close()
+        else:
+            self._events.append(event)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        '''
+        Возвращает следующее событие или None, если за timeout секунд событий
+        не было или подписка закрыта
+        '''
+        if not self._events and not self.closed:
+            self._waiter = self.loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._waiter = None
+        return self._events.popleft() if self._events else None
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+
+    def __enter__(self) -> 'Subscription':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class EventBroker():
+    '''
+    Рассылка событий по каналам. Событие передаётся в цикл событий каждого
+    подписчика одним вызовом call_soon_threadsafe на цикл, поэтому тысячи
+    ожидающих подписчиков не создают потоков и не нагружают публикующий поток
+    '''
+    def __init__(self, buffer_size: int = 100, max_subscribers: int = 10000):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._channels: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(self, channel, self.buffer_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers()
+            self._channels.setdefault(channel, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            self._count -= 1
+            if not subscribers:
+                del self._channels[subscription.channel]
+
+    def has_subscribers(self, channel: str) -> bool:
+        return channel in self._channels
+
+    def subscribers_count(self) -> int:
+        return self._count
+
+    def publish(self, channel: str, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        by_loop = {}
+        for subscription in subscribers:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_fan_out, subscriptions, event)
+            except RuntimeError:
+                # Цикл событий подписчика уже завершён
+                for subscription in subscriptions:
+                    self.unsubscribe(subscription)
+
+
+def _fan_out(subscriptions: list, event: dict) -> None:
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+
+broker = EventBroker(buffer_size=settings.EVENTS_BUFFER_SIZE, max_subscribers=settings.EVENTS_MAX_SUBSCRIBERS)
+
+
+def comments_channel(book_id: int) -> str:
+    return f'comments:{book_id}'
+
+
+def publish_comment_events(event_type: str, comments: list) -> None:
+    '''
+    Публикует события created, updated или deleted для комментариев после
+    фиксации текущей транзакции. Если у книги нет подписчиков, комментарии
+    не сериализуются
+    '''
+    channels = {comments_channel(comment.book_id) for comment in comments}
+    if not any(broker.has_subscribers(channel) for channel in channels):
+        return
+    from library.pagination import CommentsKeysetPagination
+    from library.versions.v_1_0.serializers import CommentSerializer
+
+    events = []
+    for comment in comments:
+        event = {'type': event_type, 'id': comment.pk, 'book': comment.book_id}
+        if event_type == 'created':
+            event['since'] = CommentsKeysetPagination.encode_since(comment.created_at, comment.pk)
+        if event_type != 'deleted':
+            event['data'] = CommentSerializer(comment).data
+        events.append((comments_channel(comment.book_id), event))
+
+    def publish():
+        for channel, event in events:
+            broker.publish(channel, event)
+
+    transaction.on_commit(publish)
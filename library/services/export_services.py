@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+
+from library.models import Book, Comment
+from library.services.utils import batched, MAX_IN_LIST
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+CONTENT_TYPES = {
+    FORMAT_NDJSON: 'application/x-ndjson',
+    FORMAT_CSV: 'text/csv',
+}
+
+BOOK_FIELDS = ('id', 'title', 'year', 'author_id', 'genre_id', 'library_id', 'owner_id')
+COMMENT_FIELDS = ('id', 'owner_id', 'text', 'created_at')
+CSV_HEADER = (
+    'book_id', 'title', 'year', 'author', 'genre', 'library', 'owner',
+    'comment_id', 'comment_owner', 'comment_text', 'comment_created_at'
+)
+# Размер фрагмента, которым данные отдаются клиенту или пишутся в файл
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_books_with_comments(books: Optional[QuerySet] = None, batch_size: int = 1000) -> Iterator[dict]:
+    '''
+    Потоково читает книги и их комментарии. Книги читаются серверным
+    курсором пачками по batch_size, комментарии — одним запросом на пачку,
+    поэтому расход памяти не зависит от размера каталога
+    '''
+    if books is None:
+        books = Book.active.all()
+    rows = books.order_by('id').values(*BOOK_FIELDS).iterator(chunk_size=batch_size)
+    for batch in batched(rows, batch_size):
+        comments = {}
+        for book_ids in batched([book['id'] for book in batch], MAX_IN_LIST):
+            book_comments = (
+                Comment.active.filter(book_id__in=book_ids)
+                .order_by('book_id', 'id').values('book_id', *COMMENT_FIELDS)
+            )
+            for comment in book_comments.iterator(chunk_size=batch_size):
+                comments.setdefault(comment.pop('book_id'), []).append(comment)
+        for book in batch:
+            yield {
+                'id': book['id'],
+                'title': book['title'],
+                'year': book['year'],
+                'author': book['author_id'],
+                'genre': book['genre_id'],
+                'library': book['library_id'],
+                'owner': book['owner_id'],
+                'comments': [
+                    {
+                        'id': comment['id'],
+                        'owner': comment['owner_id'],
+                        'text': comment['text'],
+                        'created_at': comment['created_at'],
+                    }
+                    for comment in comments.get(book['id'], [])
+                ],
+            }
+
+
+def render_ndjson(books: Iterable[dict]) -> Iterator[str]:
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for book in books:
+        yield encoder.encode(book) + '\n'
+
+
+def render_csv(books: Iterable[dict]) -> Iterator[str]:
+    '''
+    Одна строка на комментарий; книга без комментариев занимает одну строку
+    с пустыми полями комментария
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writerow(CSV_HEADER)
+    yield flush()
+    for book in books:
+        book_columns = [book[name] for name in ('id', 'title', 'year', 'author', 'genre', 'library', 'owner')]
+        for comment in book['comments'] or [None]:
+            if comment is None:
+                writer.writerow(book_columns + [''] * 4)
+            else:
+                created_at = comment['created_at'].isoformat() if comment['created_at'] else ''
+                writer.writerow(book_columns + [comment['id'], comment['owner'], comment['text'], created_at])
+        yield flush()
+
+
+def export_catalog(fmt: str = FORMAT_NDJSON, books: Optional[QuerySet] = None, batch_size: int = 1000,
+                   gzip: bool = False) -> Iterator[bytes]:
+    '''
+    Возвращает экспорт каталога фрагментами байтов, при необходимости сжатыми gzip на лету
+    '''
+    renderer = render_csv if fmt == FORMAT_CSV else render_ndjson
+    chunks = _join_chunks(renderer(iter_books_with_comments(books, batch_size)))
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+    return chunks
+
+
+def _join_chunks(parts: Iterable[str]) -> Iterator[bytes]:
+    '''
+    Объединяет мелкие части в фрагменты размером около CHUNK_SIZE
+    '''
+    pending, size = [], 0
+    for part in parts:
+        data = part.encode()
+        pending.append(data)
+        size += len(data)
+        if size >= CHUNK_SIZE:
+            yield b''.join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b''.join(pending)
+
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
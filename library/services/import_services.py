@@ -0,0 +1,270 @@
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from django.db import transaction
+
+from library.models import Author, Book
+from library.services.search_services import author_document, book_document, SearchIndex
+from library.services.stats_services import book_state, register_books
+from library.services.utils import batched, values_in
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+FORMAT_AUTO = 'auto'
+FORMAT_JSON = 'json'
+FORMAT_JSONL = 'jsonl'
+
+
+class CatalogFormatError(ValueError):
+    '''
+    Ошибка формата входного файла каталога
+    '''
+
+
+def iter_json_records(stream: TextIO, fmt: str = FORMAT_AUTO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator:
+    '''
+    Инкрементально читает записи из JSON-массива или JSON Lines, не загружая
+    весь файл в память. В памяти хранится только текущий фрагмент файла
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    in_array = None if fmt == FORMAT_AUTO else fmt == FORMAT_JSON
+
+    def read_more() -> bool:
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def next_char() -> Optional[str]:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not read_more():
+                return None
+
+    char = next_char()
+    if char is None:
+        return
+    if in_array is None:
+        in_array = char == '['
+    if in_array:
+        if char != '[':
+            raise CatalogFormatError('Ожидался JSON-массив')
+        position += 1
+        if next_char() == ']':
+            return
+
+    while True:
+        char = next_char()
+        if char is None:
+            if in_array:
+                raise CatalogFormatError('Незавершённый JSON-массив')
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if read_more():
+                continue
+            raise CatalogFormatError(f'Некорректный JSON: {e}') from e
+        if end == len(buffer) and not isinstance(record, (dict, list)) and read_more():
+            continue
+        position = end
+        yield record
+
+        if in_array:
+            char = next_char()
+            if char == ',':
+                position += 1
+            elif char == ']':
+                return
+            else:
+                raise CatalogFormatError('Ожидалась запятая или конец JSON-массива')
+
+
+class BoundedCache():
+    '''
+    Ограниченный по размеру LRU-кэш
+    '''
+    def __init__(self, max_size: int):
+        if max_size < 1:
+            raise ValueError('max_size должен быть положительным')
+        self.max_size = max_size
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+@dataclass
+class ImportProgress:
+    records: int = 0
+    books: int = 0
+    authors: int = 0
+    skipped: int = 0
+
+
+class Checkpoint():
+    '''
+    Контрольная точка импорта: количество уже обработанных записей источника.
+    Записывается атомарно после фиксации каждой транзакции
+    '''
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self) -> int:
+        try:
+            with open(self.path) as checkpoint_file:
+                data = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return 0
+        if data.get('source') != self.source:
+            return 0
+        return int(data.get('records', 0))
+
+    def save(self, records: int) -> None:
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump({'source': self.source, 'records': records}, checkpoint_file)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class CatalogImporter():
+    '''
+    Пакетно загружает книги из потока записей каталога. Авторы
+    дедуплицируются через ограниченный кэш "ФИО -> id"
+    '''
+    def __init__(self, batch_size: int = 1000, cache_size: int = 10000, library_id: Optional[int] = None,
+                 on_progress: Optional[Callable[[ImportProgress], None]] = None):
+        if batch_size < 1:
+            raise ValueError('batch_size должен быть положительным')
+        self.batch_size = batch_size
+        self.library_id = library_id
+        self.on_progress = on_progress
+        self.authors_cache = BoundedCache(cache_size)
+        self.progress = ImportProgress()
+        self.search_index = SearchIndex()
+
+    def run(self, records: Iterable, checkpoint: Optional[Checkpoint] = None) -> ImportProgress:
+        '''
+        Импортирует записи, пропуская уже обработанные согласно контрольной точке
+        '''
+        records = iter(records)
+        if checkpoint is not None:
+            already_done = checkpoint.load()
+            for _ in range(already_done):
+                if next(records, None) is None:
+                    break
+            self.progress.records = already_done
+
+        for batch in batched(records, self.batch_size):
+            self._import_batch(batch)
+            self.progress.records += len(batch)
+            if checkpoint is not None:
+                checkpoint.save(self.progress.records)
+            if self.on_progress is not None:
+                self.on_progress(self.progress)
+
+        if checkpoint is not None:
+            checkpoint.clear()
+        return self.progress
+
+    @transaction.atomic
+    def _import_batch(self, batch: List) -> None:
+        rows = []
+        for record in batch:
+            if isinstance(record, dict) and record.get('title') and record.get('author'):
+                rows.append(record)
+            else:
+                self.progress.skipped += 1
+        author_ids = self._resolve_authors(rows)
+        books = Book.default_manager.bulk_create([
+            Book(
+                title=record['title'],
+                year=record.get('year'),
+                library_id=self.library_id,
+                author_id=author_ids[record['author']],
+            )
+            for record in rows
+        ])
+        # Идентификаторы после bulk_create известны только на SQLite 3.35+ и PostgreSQL,
+        # в остальных случаях индекс нужно перестроить командой rebuild_search_index
+        self.search_index.update(book_document(book) for book in books if book.pk is not None)
+        register_books(after=[book_state(book) for book in books])
+        self.progress.books += len(rows)
+
+    def _resolve_authors(self, rows: List[Dict]) -> Dict[str, int]:
+        '''
+        Возвращает id авторов для пакета записей: из кэша, из базы данных
+        либо создаёт недостающих авторов одной пакетной вставкой
+        '''
+        author_ids = {}
+        missing = {}
+        for record in rows:
+            name = record['author']
+            author_id = self.authors_cache.get(name)
+            if author_id is not None:
+                author_ids[name] = author_id
+            elif name not in missing:
+                missing[name] = self._birthday(record)
+
+        if missing:
+            author_ids.update(values_in(Author.objects.order_by('-id'), 'full_name', missing, 'full_name', 'id'))
+            new_names = [name for name in missing if name not in author_ids]
+            if new_names:
+                Author.objects.bulk_create([Author(full_name=name, birthday=missing[name]) for name in new_names])
+                created = dict(values_in(Author.objects.order_by('-id'), 'full_name', new_names, 'full_name', 'id'))
+                author_ids.update(created)
+                self.search_index.update(
+                    author_document(Author(pk=author_id, full_name=name)) for name, author_id in created.items()
+                )
+                self.progress.authors += len(new_names)
+
+        for name, author_id in author_ids.items():
+            self.authors_cache.set(name, author_id)
+        return author_ids
+
+    @staticmethod
+    def _birthday(record: Dict) -> int:
+        if record.get('birthday') is not None:
+            return record['birthday']
+        if record.get('year') is not None:
+            return record['year'] - 35
+        return 0
@@ -0,0 +1,283 @@
+'''
+Очередь фоновых задач в базе данных. Задача — функция, зарегистрированная
+декоратором task, в очередь ставятся её имя и аргументы в JSON. Задачи
+выполняет команда run_jobs пулом потоков или процессов, неудачные попытки
+повторяются с экспоненциальной задержкой
+'''
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.utils import timezone
+
+from library.models import Job, JobStatus
+from library.services.sqlite_services import immediate_atomic
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownTask(LookupError):
+    '''
+    Задача с таким именем не зарегистрирована
+    '''
+
+
+@dataclass(frozen=True)
+class Task():
+    func: Callable
+    max_attempts: int
+    retry_delay: float
+
+
+TASKS: Dict[str, Task] = {}
+
+# Задачи в этих состояниях занимают ключ идемпотентности
+ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+# Изменения очереди из потоков одного процесса (обработчик забирает задачи, пока исполнители записывают
+# итоги) выполняются по одному: SQLite всё равно допускает одну пишущую транзакцию
+_queue_writes = threading.Lock()
+
+
+def _update(jobs, **fields) -> int:
+    with _queue_writes:
+        return jobs.update(**fields)
+
+
+def task(name: Optional[str] = None, max_attempts: int = 3, retry_delay: float = 30):
+    '''
+    Регистрирует функцию как фоновую задачу. Аргументы функции должны
+    сериализоваться в JSON. Задача может выполниться повторно, поэтому она
+    должна быть идемпотентной. retry_delay — задержка перед второй попыткой
+    в секундах, каждая следующая задержка вдвое больше
+    '''
+    def decorator(func):
+        TASKS[name or func.__name__] = Task(func, max_attempts, retry_delay)
+        return func
+    return decorator
+
+
+def enqueue(name: str, payload: Optional[dict] = None, idempotency_key: Optional[str] = None, delay: float = 0,
+            using: str = DEFAULT_DB_ALIAS) -> Job:
+    '''
+    Ставит задачу в очередь. Строка задачи создаётся в текущей транзакции:
+    обработчики увидят её только после фиксации, а при откате задача не
+    выполнится. Повторная постановка с тем же idempotency_key, пока задача
+    ждёт в очереди или выполняется, возвращает её же; завершённая или
+    ошибочная задача освобождает ключ, и ставится новая задача. При
+    JOBS_EAGER задача выполняется в текущем процессе после фиксации
+    транзакции (transaction.on_commit)
+    '''
+    if name not in TASKS:
+        raise UnknownTask(name)
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'max_attempts': TASKS[name].max_attempts,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    jobs = Job.objects.using(using)
+    if idempotency_key is None:
+        job = jobs.create(**fields)
+    else:
+        job, created = jobs.get_or_create(idempotency_key=idempotency_key, defaults=fields)
+        if not created:
+            if job.status in ACTIVE_STATUSES:
+                return job
+            jobs.filter(pk=job.pk).update(idempotency_key=None)
+            job, created = jobs.get_or_create(idempotency_key=idempotency_key, defaults=fields)
+            if not created:
+                return job
+    if settings.JOBS_EAGER and not delay:
+        transaction.on_commit(partial(run_job, job.pk, 'eager', using), using=using)
+    return job
+
+
+def claim_jobs(worker: str, limit: int, using: str = DEFAULT_DB_ALIAS) -> List[int]:
+    '''
+    Забирает до limit готовых к запуску задач и помечает их выполняемыми.
+    В SQLite транзакция BEGIN IMMEDIATE не даёт двум обработчикам забрать
+    одну задачу, в остальных СУБД строки блокируются SELECT ... FOR UPDATE SKIP LOCKED
+    '''
+    now = timezone.now()
+    with _queue_writes, immediate_atomic(using):
+        ids = list(
+            Job.objects.using(using).select_for_update(skip_locked=True)
+            .filter(status=JobStatus.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            Job.objects.using(using).filter(pk__in=ids, status=JobStatus.QUEUED).update(
+                status=JobStatus.RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+            )
+    return ids
+
+
+def run_job(job_id: int, worker: str = '', using: str = DEFAULT_DB_ALIAS) -> Optional[int]:
+    '''
+    Забирает задачу из очереди и выполняет её. Возвращает итоговое состояние
+    или None, если задачу уже забрал другой обработчик
+    '''
+    now = timezone.now()
+    claimed = Job.objects.using(using).filter(pk=job_id, status=JobStatus.QUEUED).update(
+        status=JobStatus.RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+    )
+    return execute_job(job_id, using) if claimed else None
+
+
+def execute_job(job_id: int, using: str = DEFAULT_DB_ALIAS) -> Optional[int]:
+    '''
+    Выполняет забранную задачу. При ошибке задача возвращается в очередь с
+    задержкой, пока не исчерпано число попыток, затем помечается ошибочной.
+    Итог записывается, только пока аренда задачи за этой попыткой (тот же
+    обработчик и номер попытки): задачу, которую requeue_stale_jobs вернул в
+    очередь и забрал другой обработчик, устаревшая попытка не перезаписывает.
+    Возвращает итоговое состояние или None, если аренда потеряна
+    '''
+    job = Job.objects.using(using).get(pk=job_id)
+    lease = Job.objects.using(using).filter(pk=job_id, status=JobStatus.RUNNING, worker=job.worker,
+                                            attempts=job.attempts)
+    definition = TASKS.get(job.name)
+    now = timezone.now
+    try:
+        if definition is None:
+            raise UnknownTask(job.name)
+        with Heartbeat(job_id, using, lease):
+            definition.func(**job.payload)
+    except Exception:
+        logger.exception('Job %s failed (attempt %s of %s)', job, job.attempts, job.max_attempts)
+        error = traceback.format_exc()
+        if definition is not None and job.attempts < job.max_attempts:
+            delay = definition.retry_delay * 2 ** (job.attempts - 1)
+            status = JobStatus.QUEUED
+            updated = _update(lease, status=status, run_at=now() + timedelta(seconds=delay), last_error=error)
+        else:
+            status = JobStatus.FAILED
+            updated = _update(lease, status=status, finished_at=now(), last_error=error)
+    else:
+        status = JobStatus.DONE
+        updated = _update(lease, status=status, finished_at=now(), last_error='')
+    if not updated:
+        logger.warning('Job %s lease lost (attempt %s), result discarded', job, job.attempts)
+        return None
+    return status
+
+
+class Heartbeat():
+    '''
+    Продлевает аренду выполняемой задачи: пока задача выполняется, отдельный
+    поток раз в JOBS_HEARTBEAT_INTERVAL секунд обновляет heartbeat_at, и
+    requeue_stale_jobs не возвращает в очередь долгую, но живую задачу
+    '''
+    def __init__(self, job_id: int, using: str = DEFAULT_DB_ALIAS, lease=None):
+        self.job_id = job_id
+        self.using = using
+        self.lease = lease
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'job-heartbeat-{job_id}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            while not self._stopped.wait(settings.JOBS_HEARTBEAT_INTERVAL):
+                lease = self.lease
+                if lease is None:
+                    lease = Job.objects.using(self.using).filter(pk=self.job_id, status=JobStatus.RUNNING)
+                _update(lease, heartbeat_at=timezone.now())
+        finally:
+            # Соединения с базой данных принадлежат потоку и закрываются вместе с ним
+            connections.close_all()
+
+
+def _execute_in_pool(job_id: int, using: str) -> Optional[int]:
+    try:
+        return execute_job(job_id, using)
+    finally:
+        close_old_connections()
+
+
+def requeue_stale_jobs(timeout: float, using: str = DEFAULT_DB_ALIAS) -> int:
+    '''
+    Возвращает в очередь задачи, от которых timeout секунд нет сигнала
+    (Heartbeat): обработчик, забравший их, скорее всего завершился аварийно.
+    timeout должен быть в несколько раз больше JOBS_HEARTBEAT_INTERVAL
+    '''
+    stale = Job.objects.using(using).filter(status=JobStatus.RUNNING,
+                                            heartbeat_at__lt=timezone.now() - timedelta(seconds=timeout))
+    failed = _update(stale.filter(attempts__gte=F('max_attempts')), status=JobStatus.FAILED,
+                     finished_at=timezone.now(), last_error='Превышено время выполнения')
+    return failed + _update(stale, status=JobStatus.QUEUED, last_error='Превышено время выполнения')
+
+
+class Worker():
+    '''
+    Обработчик очереди: забирает задачи по мере освобождения исполнителей и
+    выполняет их в пуле потоков (pool='thread') или процессов (pool='process').
+    Процессы создаются через fork после закрытия соединений с базой данных,
+    поэтому каждый процесс открывает собственное соединение
+    '''
+    def __init__(self, concurrency: int = 4, pool: str = 'thread', poll_interval: float = 1, timeout: float = 600,
+                 using: str = DEFAULT_DB_ALIAS):
+        if pool not in ('thread', 'process'):
+            raise ValueError('pool должен быть thread или process')
+        if timeout <= settings.JOBS_HEARTBEAT_INTERVAL:
+            raise ValueError('timeout должен быть больше JOBS_HEARTBEAT_INTERVAL')
+        self.concurrency = concurrency
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.using = using
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+
+    def _executor(self):
+        if self.pool == 'thread':
+            return ThreadPoolExecutor(self.concurrency, thread_name_prefix='job')
+        connections.close_all()
+        return ProcessPoolExecutor(self.concurrency, mp_context=multiprocessing.get_context('fork'))
+
+    def run(self, once: bool = False) -> Dict[int, int]:
+        '''
+        Выполняет задачи, пока once=False, иначе — до опустошения очереди.
+        Новые задачи забираются сразу, как только освобождается исполнитель,
+        не дожидаясь завершения всей пачки. Возвращает число задач по
+        итоговым состояниям
+        '''
+        totals, running = {}, set()
+        with self._executor() as executor:
+            while True:
+                requeue_stale_jobs(self.timeout, self.using)
+                free = self.concurrency - len(running)
+                ids = claim_jobs(self.name, free, self.using) if free else []
+                running.update(executor.submit(_execute_in_pool, job_id, self.using) for job_id in ids)
+                if not running:
+                    if once:
+                        return totals
+                    time.sleep(self.poll_interval)
+                    continue
+                # Очередь опрашивается снова после завершения задачи или, если есть свободные исполнители
+                # и обработчик не завершается с опустошением очереди, через poll_interval
+                timeout = None if once or len(ids) == free else self.poll_interval
+                done, running = wait(running, timeout, FIRST_COMPLETED)
+                for future in done:
+                    status = future.result()
+                    if status is not None:
+                        totals[status] = totals.get(status, 0) + 1
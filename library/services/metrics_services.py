@@ -0,0 +1,227 @@
+'''
+Метрики запросов к API в памяти процесса и их выгрузка в формате Prometheus
+'''
+import bisect
+import itertools
+import threading
+import weakref
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Iterable, Optional, Tuple
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Wall time of a request', DURATION_BUCKETS),
+    'http_request_db_duration_seconds': ('Time spent in database queries during a request', DURATION_BUCKETS),
+    'http_request_queries': ('Number of database queries issued by a request', QUERY_BUCKETS),
+    'http_response_size_bytes': ('Size of the serialized response body', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Number of sampled requests',
+    'http_request_query_budget_exceeded_total': 'Number of requests over the query budget',
+    'api_response_cache_total': 'Lookups of the API response cache',
+}
+
+_request_metrics = ContextVar('request_metrics', default=None)
+
+
+class _ShardOwner():
+    '''
+    Владелец набора значений потока: хранится в данных потока и удаляется
+    вместе с ними при завершении потока
+    '''
+    __slots__ = ('__weakref__',)
+
+
+def _merge(target: dict, shard: dict) -> None:
+    for key, value in list(shard.items()):
+        if isinstance(value, list):
+            total = target.setdefault(key, [0] * len(value))
+            for index, item in enumerate(value):
+                total[index] += item
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+class MetricsRegistry():
+    '''
+    Счётчики и гистограммы с метками. Каждый поток пишет в собственный набор
+    значений без блокировок, блокировка берётся только при появлении нового
+    потока и при выгрузке, которая суммирует значения всех потоков. Значения
+    завершившегося потока переносятся в общий набор, поэтому число наборов
+    не растёт при сервере с потоком на запрос
+    '''
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            shard = {}
+            with self._lock:
+                shard_id = next(self._ids)
+                self._shards[shard_id] = shard
+            owner = self._local.owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, shard_id)
+            self._local.values = shard
+        return shard
+
+    def _retire(self, shard_id: int) -> None:
+        with self._lock:
+            shard = self._shards.pop(shard_id, None)
+            if shard:
+                _merge(self._retired, shard)
+
+    def inc(self, name: str, labels: Tuple[tuple, ...], value: float = 1) -> None:
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name: str, labels: Tuple[tuple, ...], value: float) -> None:
+        shard = self._shard()
+        key = (name, labels)
+        histogram = shard.get(key)
+        if histogram is None:
+            # Счётчики корзин (последняя — +Inf), затем сумма и количество наблюдений
+            histogram = shard[key] = [0] * (len(HISTOGRAMS[name][1]) + 3)
+        histogram[bisect.bisect_left(HISTOGRAMS[name][1], value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def collect(self) -> Dict[tuple, object]:
+        merged = {}
+        with self._lock:
+            _merge(merged, self._retired)
+            shards = list(self._shards.values())
+        for shard in shards:
+            _merge(merged, shard)
+        return merged
+
+    def shards_count(self) -> int:
+        with self._lock:
+            return len(self._shards)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._retired.clear()
+            for shard in self._shards.values():
+                shard.clear()
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetrics():
+    '''
+    Метрики одного запроса, накапливаемые во время его обработки
+    '''
+    __slots__ = ('queries', 'db_time', 'view')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.view = None
+
+    def __call__(self, execute, sql, params, many, context):
+        '''
+        Обёртка выполнения запросов к базе данных (connection.execute_wrapper)
+        '''
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started
+            self.queries += 1
+
+
+def record_query(execute, sql, params, many, context):
+    '''
+    Обёртка выполнения запросов всех соединений: учитывает запрос в метриках
+    текущего запроса, если он попал в выборку. Метрики берутся из контекста,
+    поэтому учитываются и запросы асинхронных представлений, выполняемые
+    через sync_to_async в другом потоке
+    '''
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_metrics(connection) -> None:
+    # Обёртка ставится первой, чтобы не мешать снятию обёрток connection.execute_wrapper()
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def start_request() -> Tuple[RequestMetrics, object]:
+    metrics = RequestMetrics()
+    return metrics, _request_metrics.set(metrics)
+
+
+def finish_request(token) -> None:
+    _request_metrics.reset(token)
+
+
+def current_request() -> Optional[RequestMetrics]:
+    return _request_metrics.get()
+
+
+def record_cache_lookup(result: str) -> None:
+    '''
+    Учитывает обращение к кэшу ответов: hit, miss или not_modified
+    '''
+    metrics = current_request()
+    if metrics is not None:
+        registry.inc('api_response_cache_total', (('view', metrics.view or ''), ('result', result)))
+
+
+def _format_labels(labels: Iterable[tuple]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus(extra: Iterable[tuple] = ()) -> str:
+    '''
+    Выгружает метрики в текстовом формате Prometheus. extra — дополнительные
+    метрики вида (имя, тип, описание, [(метки, значение), ...])
+    '''
+    collected = registry.collect()
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for (metric, labels), values in sorted(collected.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), values[:-2]):
+                cumulative += count
+                bucket_labels = (*labels, ('le', bound if bound == '+Inf' else _format_value(bound)))
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+    for name, description in COUNTERS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+        for (metric, labels), value in sorted(collected.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for name, metric_type, description, samples in extra:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {metric_type}']
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
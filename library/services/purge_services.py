@@ -0,0 +1,86 @@
+'''
+Физическое удаление книг и комментариев пакетами. Строки
+удаляются небольшими пакетами, каждый пакет — в отдельной короткой
+транзакции, поэтому блокировка записи не удерживается долго и запросы API
+выполняются между пакетами. Пакет удаляется по списку id, поэтому его
+размер не превышает MAX_IN_LIST
+'''
+import time
+from datetime import timedelta
+
+from django.db import connections
+from django.utils import timezone
+
+from backend.base_models import Status
+from library.models import Book, Comment
+from library.services.cache_services import invalidate
+from library.services.search_services import SearchIndex
+from library.services.sqlite_services import immediate_atomic
+from library.services.stats_services import register_comments, visible_status
+from library.services.utils import MAX_IN_LIST
+
+
+def purge_comments(comments, batch_size: int = 500, pause: float = 0) -> int:
+    '''
+    Удаляет комментарии из набора пакетами по batch_size с паузой pause
+    секунд между пакетами. Возвращает число удалённых комментариев
+    '''
+    purged, batch_size = 0, min(batch_size, MAX_IN_LIST)
+    while True:
+        batch = list(comments.values_list('id', 'book_id', 'created_at', 'status', 'book__status')[:batch_size])
+        if not batch:
+            return purged
+        ids = [comment_id for comment_id, *_ in batch]
+        with immediate_atomic():
+            # Комментарии удаляются одним DELETE без сигналов, поэтому видимые
+            # комментарии вычитаются из сводок явно
+            _delete_rows(Comment, ids)
+            SearchIndex().remove_many('comment', ids)
+            register_comments(before=[(created_at, visible_status(status, book_status))
+                                      for _, _, created_at, status, book_status in batch])
+            invalidate(*{f'comments:{book_id}' for _, book_id, *_ in batch})
+        purged += len(batch)
+        if pause:
+            time.sleep(pause)
+
+
+def _delete_rows(model, ids: list) -> None:
+    '''
+    Удаляет строки по первичным ключам одним DELETE, без выборки объектов и сигналов
+    '''
+    connection = connections[model.default_manager.db]
+    table, pk = connection.ops.quote_name(model._meta.db_table), connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({", ".join(["%s"] * len(ids))})', ids)
+
+
+def purge_books(books, batch_size: int = 500, pause: float = 0) -> dict:
+    '''
+    Удаляет книги из набора пакетами. Комментарии книг удаляются пакетами до
+    удаления самих книг, чтобы каскадное удаление не затрагивало их все в
+    одной транзакции
+    '''
+    purged, batch_size = {'books': 0, 'comments': 0}, min(batch_size, MAX_IN_LIST)
+    while True:
+        book_ids = list(books.values_list('id', flat=True)[:batch_size])
+        if not book_ids:
+            return purged
+        purged['comments'] += purge_comments(Comment.default_manager.filter(book_id__in=book_ids), batch_size, pause)
+        with immediate_atomic():
+            Book.default_manager.filter(pk__in=book_ids).delete()
+        purged['books'] += len(book_ids)
+        if pause:
+            time.sleep(pause)
+
+
+def purge_deleted(older_than: timedelta, batch_size: int = 500, pause: float = 0) -> dict:
+    '''
+    Удаляет книги и комментарии, помеченные удалёнными раньше чем older_than назад
+    '''
+    cutoff = timezone.now() - older_than
+    comments = purge_comments(
+        Comment.default_manager.filter(status=Status.DELETED, deleted_at__lt=cutoff), batch_size, pause
+    )
+    purged = purge_books(Book.default_manager.filter(status=Status.DELETED, deleted_at__lt=cutoff), batch_size, pause)
+    purged['comments'] += comments
+    return purged
@@ -0,0 +1,203 @@
+import base64
+import binascii
+import json
+from typing import Iterable, List, Optional
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+from library.models import Author, Book, Comment
+from library.services.stemmer import stem, tokenize, WORD_RE
+from library.services.utils import batched, MAX_IN_LIST, values_in
+
+SEARCH_TABLE = 'search_index'
+
+# Идентификатор строки индекса кодирует тип и id объекта: rowid = id * KIND_BASE + kind.
+# Это позволяет обновлять и удалять документ по первичному ключу FTS-таблицы
+KIND_BASE = 4
+KINDS = {
+    'book': 1,
+    'author': 2,
+    'comment': 3,
+}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+LABEL_LENGTH = 200
+
+
+class SearchCursorError(ValueError):
+    '''
+    Некорректный курсор постраничного поиска
+    '''
+
+
+def encode_cursor(rank: float, rowid: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, rowid]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        rank, rowid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(rowid)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise SearchCursorError('Некорректный курсор') from e
+
+
+def build_match_query(query: str) -> str:
+    '''
+    Преобразует пользовательский запрос в выражение FTS5: каждое слово
+    приводится к основе и ищется по префиксу
+    '''
+    return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+
+def index_terms(text: str) -> str:
+    '''
+    Возвращает термы документа: основу и исходную словоформу каждого слова.
+    Словоформа нужна, когда алгоритм отсекает от слова больше, чем от
+    словоформы в запросе (например, "маргарите" -> "маргар")
+    '''
+    terms = []
+    for word in WORD_RE.findall(text.lower().replace('ё', 'е')):
+        word_stem = stem(word)
+        terms.append(word_stem)
+        if word_stem != word:
+            terms.append(word)
+    return ' '.join(terms)
+
+
+def book_document(book: Book) -> tuple:
+    return book.pk * KIND_BASE + KINDS['book'], book.title, book.pk
+
+
+def author_document(author: Author) -> tuple:
+    return author.pk * KIND_BASE + KINDS['author'], author.full_name, None
+
+
+def comment_document(comment: Comment) -> tuple:
+    return comment.pk * KIND_BASE + KINDS['comment'], comment.text, comment.book_id
+
+
+class SearchIndex():
+    '''
+    Инвертированный индекс по названиям книг, авторам и комментариям на
+    основе виртуальной таблицы SQLite FTS5. Текст хранится в виде основ
+    слов (стемминг для русского языка), результаты ранжируются по bm25
+    '''
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def is_available(self) -> bool:
+        return self.connection.vendor == 'sqlite'
+
+    def update(self, documents: Iterable[tuple]) -> None:
+        '''
+        Добавляет или заменяет документы вида (rowid, текст, id книги)
+        '''
+        if not self.is_available():
+            return
+        rows = [
+            (rowid, index_terms(text), text[:LABEL_LENGTH], book_id)
+            for rowid, text, book_id in documents
+        ]
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, content, label, book_id) VALUES (%s, %s, %s, %s)', rows
+            )
+
+    def remove(self, kind: str, object_id: int) -> None:
+        self.remove_many(kind, [object_id])
+
+    def remove_many(self, kind: str, object_ids: Iterable[int]) -> None:
+        if not self.is_available():
+            return
+        rows = [(object_id * KIND_BASE + KINDS[kind],) for object_id in object_ids]
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', rows)
+
+    def sync_book_comments(self, book_ids: Iterable[int], published: bool) -> None:
+        '''
+        Добавляет в индекс комментарии опубликованных книг (published) или
+        удаляет из него комментарии скрытых и удалённых
+        '''
+        if not self.is_available():
+            return
+        if not published:
+            comments = Comment.default_manager.using(self.using).order_by()
+            self.remove_many('comment', [comment_id for comment_id, in values_in(comments, 'book_id', book_ids, 'id')])
+            return
+        for chunk in batched(book_ids, MAX_IN_LIST):
+            comments = Comment.active.using(self.using).filter(book_id__in=chunk).only('id', 'text', 'book_id')
+            self.update(comment_document(comment) for comment in comments.iterator())
+
+    def search(self, query: str, kinds: Optional[List[str]] = None, cursor: Optional[str] = None,
+               limit: int = 20) -> tuple:
+        '''
+        Возвращает страницу результатов, упорядоченных по релевантности, и
+        курсор следующей страницы (None, если страница последняя)
+        '''
+        match = build_match_query(query)
+        if not match:
+            return [], None
+        sql = f'SELECT rowid, label, book_id, rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        params = [match]
+        if kinds:
+            sql += f' AND rowid %% {KIND_BASE} IN ({", ".join("%s" for _ in kinds)})'
+            params += [KINDS[kind] for kind in kinds]
+        if cursor:
+            rank, rowid = decode_cursor(cursor)
+            sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+            params += [rank, rank, rowid]
+        sql += ' ORDER BY rank, rowid LIMIT %s'
+        params.append(limit + 1)
+        with self.connection.cursor() as db_cursor:
+            db_cursor.execute(sql, params)
+            rows = db_cursor.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+        results = [
+            {
+                'type': KIND_NAMES[rowid % KIND_BASE],
+                'id': rowid // KIND_BASE,
+                'text': label,
+                'book': book_id,
+                'rank': rank,
+            }
+            for rowid, label, book_id, rank in rows
+        ]
+        return results, next_cursor
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        '''
+        Полностью перестраивает индекс пакетами, возвращает число документов
+        '''
+        if not self.is_available():
+            return 0
+        with transaction.atomic(using=self.using):
+            return self._rebuild(batch_size)
+
+    def _rebuild(self, batch_size: int) -> int:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        sources = (
+            (Book.active.using(self.using).only('id', 'title'), book_document),
+            (Author.objects.using(self.using).only('id', 'full_name'), author_document),
+            (Comment.active.using(self.using).only('id', 'text', 'book_id'), comment_document),
+        )
+        total = 0
+        for queryset, to_document in sources:
+            objects = queryset.order_by('id').iterator(chunk_size=batch_size)
+            for batch in batched(objects, batch_size):
+                self.update(to_document(obj) for obj in batch)
+                total += len(batch)
+        return total
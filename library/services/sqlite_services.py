@@ -0,0 +1,45 @@
+'''
+Настройка соединений SQLite для конкурентной нагрузки
+'''
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+
+def apply_pragmas(connection) -> None:
+    '''
+    Применяет к новому соединению SQLite параметры из settings.SQLITE_PRAGMAS.
+    Журнал WAL позволяет читать параллельно с записью, synchronous=NORMAL в
+    режиме WAL синхронизирует диск только при контрольных точках, а
+    busy_timeout заставляет ждать освобождения блокировки вместо ошибки
+    "database is locked"
+    '''
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def immediate_atomic(using: str = DEFAULT_DB_ALIAS):
+    '''
+    Аналог transaction.atomic, который в SQLite начинает внешнюю транзакцию
+    командой BEGIN IMMEDIATE. Блокировка записи берётся сразу, поэтому
+    конкурирующие транзакции ждут её в пределах busy_timeout. В отложенной
+    транзакции повышение блокировки чтения до записи при конфликте
+    завершается ошибкой "database is locked" без ожидания
+    '''
+    connection = connections[using]
+    if not hasattr(connection, 'begin_mode') or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    connection.begin_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_mode = ''
+            yield
+    finally:
+        connection.begin_mode = ''
@@ -0,0 +1,180 @@
+'''
+Сводные таблицы для статистики: число опубликованных книг по жанрам и
+комментариев по дням. Таблицы обновляются приращениями при изменении книг
+и комментариев (сигналы, пакетные операции API, импорт), поэтому чтение
+сводки не зависит от размера таблиц books и comments. Команда rebuild_stats
+полностью пересчитывает сводки, например после загрузки данных
+'''
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from backend.base_models import Status
+from library.models import Book, Comment, DailyCommentStats, Genre, GenreStats
+from library.services.utils import batched, values_in
+
+# Ключ строки книг без жанра
+NO_GENRE = 0
+
+
+def book_state(book: Book) -> Tuple[Optional[int], int]:
+    return book.genre_id, book.status
+
+
+def visible_status(status: int, book_status: int) -> int:
+    '''
+    Состояние комментария с учётом книги: комментарии неопубликованной книги
+    не видны и учитываются в сводках как скрытые
+    '''
+    return status if book_status == Status.PUBLISHED else Status.HIDDEN
+
+
+def comment_state(comment: Comment, book_status: int = Status.PUBLISHED) -> Tuple[datetime, int]:
+    return comment.created_at, visible_status(comment.status, book_status)
+
+
+def register_books(before: Iterable[tuple] = (), after: Iterable[tuple] = ()) -> None:
+    '''
+    Учитывает изменение книг: before и after — состояния книг (book_state)
+    до и после изменения. Созданным книгам соответствует только after,
+    удалённым — только before
+    '''
+    deltas = Counter()
+    for sign, states in ((-1, before), (1, after)):
+        for genre_id, status in states:
+            if status == Status.PUBLISHED:
+                deltas[genre_id or NO_GENRE] += sign
+    _add(GenreStats, 'genre_key', 'books', deltas)
+
+
+def register_comments(before: Iterable[tuple] = (), after: Iterable[tuple] = ()) -> None:
+    '''
+    Учитывает изменение комментариев, аналогично register_books
+    '''
+    deltas = Counter()
+    for sign, states in ((-1, before), (1, after)):
+        for created_at, status in states:
+            if status == Status.PUBLISHED:
+                deltas[timezone.localdate(created_at)] += sign
+    _add(DailyCommentStats, 'day', 'comments', deltas)
+
+
+def register_book_comments(book_ids: Iterable[int], published: bool) -> None:
+    '''
+    Учитывает публикацию (published) или скрытие и удаление книг: их
+    опубликованные комментарии прибавляются к сводке или вычитаются из неё
+    '''
+    comments = Comment.default_manager.filter(status=Status.PUBLISHED).order_by()
+    states = [(created_at, Status.PUBLISHED) for created_at, in values_in(comments, 'book_id', book_ids, 'created_at')]
+    if published:
+        register_comments(after=states)
+    else:
+        register_comments(before=states)
+
+
+def move_genre_books(genre_id: int) -> None:
+    '''
+    Переносит книги удалённого жанра в строку книг без жанра: при удалении
+    жанра ссылки на него обнуляются одним UPDATE без сигналов
+    '''
+    with transaction.atomic():
+        books = GenreStats.objects.filter(genre_key=genre_id).values_list('books', flat=True).first()
+        if books is not None:
+            GenreStats.objects.filter(genre_key=genre_id).delete()
+            _add(GenreStats, 'genre_key', 'books', {NO_GENRE: books})
+
+
+def genre_stats() -> list:
+    '''
+    Число опубликованных книг по жанрам, сначала самые многочисленные. Книги
+    без жанра учитываются в строке с id None
+    '''
+    rows = list(GenreStats.objects.filter(books__gt=0).order_by('-books', 'genre_key'))
+    titles = Genre.objects.in_bulk([row.genre_key for row in rows if row.genre_key != NO_GENRE])
+    return [
+        {'id': row.genre_key or None, 'title': getattr(titles.get(row.genre_key), 'title', None), 'books': row.books}
+        for row in rows
+    ]
+
+
+def daily_comment_stats(days: int) -> list:
+    '''
+    Число опубликованных комментариев за последние days дней, включая
+    сегодняшний; дни без комментариев учитываются с нулём
+    '''
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    counts = dict(DailyCommentStats.objects.filter(day__gte=start).values_list('day', 'comments'))
+    return [
+        {'day': day, 'comments': counts.get(day, 0)}
+        for day in (start + timedelta(days=offset) for offset in range(days))
+    ]
+
+
+def top_commented_books(limit: int) -> list:
+    '''
+    Самые комментируемые опубликованные книги. Порядок совпадает с частичным
+    индексом (comments_count, id), поэтому запрос читает только limit строк индекса
+    '''
+    return list(Book.active.order_by('-comments_count', '-id').values('id', 'title', 'comments_count')[:limit])
+
+
+def _add(model, key_field: str, count_field: str, deltas: dict) -> None:
+    '''
+    Прибавляет приращения к счётчикам одним UPDATE на строку. Отсутствующая
+    строка создаётся; если её одновременно создал другой запрос, повторяется UPDATE
+    '''
+    objects = model.objects
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        rows = objects.filter(**{key_field: key})
+        if rows.update(**{count_field: Greatest(F(count_field) + delta, Value(0))}):
+            continue
+        try:
+            with transaction.atomic():
+                objects.create(**{key_field: key, count_field: max(delta, 0)})
+        except IntegrityError:
+            rows.update(**{count_field: Greatest(F(count_field) + delta, Value(0))})
+
+
+def rebuild_stats(batch_size: int = 1000) -> dict:
+    '''
+    Пересчитывает сводки с нуля. Книги и комментарии читаются пакетами по
+    диапазонам id, а сводные таблицы заменяются в одной короткой транзакции.
+    Изменения, сделанные во время пересчёта, могут не попасть в сводки —
+    команду стоит запускать при низкой нагрузке
+    '''
+    genres = Counter()
+    for ids in _id_ranges(Book.active.all(), batch_size):
+        for row in (Book.active.filter(id__range=ids).order_by().values('genre_id')
+                    .annotate(count=Count('id'))):
+            genres[row['genre_id'] or NO_GENRE] += row['count']
+    days = Counter()
+    for ids in _id_ranges(Comment.active.all(), batch_size):
+        for row in (Comment.active.filter(id__range=ids).order_by().annotate(day=TruncDate('created_at'))
+                    .values('day').annotate(count=Count('id'))):
+            days[row['day']] += row['count']
+
+    with transaction.atomic():
+        GenreStats.objects.all().delete()
+        GenreStats.objects.bulk_create(GenreStats(genre_key=key, books=count) for key, count in genres.items())
+        DailyCommentStats.objects.all().delete()
+        for batch in batched((DailyCommentStats(day=day, comments=count) for day, count in days.items()),
+                             batch_size):
+            DailyCommentStats.objects.bulk_create(batch)
+    return {'genres': len(genres), 'days': len(days)}
+
+
+def _id_ranges(queryset, batch_size: int):
+    '''
+    Границы пакетов по batch_size строк: (первый id, последний id)
+    '''
+    ids = queryset.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+    for batch in batched(ids, batch_size):
+        yield batch[0], batch[-1]
@@ -0,0 +1,119 @@
+'''
+Стеммер для русского языка по алгоритму Snowball (Портера)
+http://snowball.tartarus.org/algorithms/russian/stemmer.html
+'''
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND_1 = ('вшись', 'вши', 'в')
+PERFECTIVE_GERUND_2 = ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв')
+ADJECTIVE = ('ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой', 'ем', 'им',
+             'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею')
+PARTICIPLE_1 = ('ем', 'нн', 'вш', 'ющ', 'щ')
+PARTICIPLE_2 = ('ивш', 'ывш', 'ующ')
+REFLEXIVE = ('ся', 'сь')
+VERB_1 = ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н')
+VERB_2 = ('ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют', 'ены', 'ить',
+          'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю')
+NOUN = ('иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям',
+        'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю', 'я')
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'^[а-я]+$')
+
+
+def _regions(word: str) -> tuple:
+    '''
+    Возвращает начало областей RV и R2
+    '''
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word: str, start: int, endings: tuple, preceded_by: str = '') -> tuple:
+    '''
+    Удаляет самое длинное окончание из endings, целиком лежащее в word[start:].
+    Если задано preceded_by, окончание должно следовать за одной из этих букв
+    '''
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            if preceded_by:
+                position = len(word) - len(ending) - 1
+                if position < start or word[position] not in preceded_by:
+                    continue
+            return word[:-len(ending)], True
+    return word, False
+
+
+def _strip_any(word: str, start: int, grouped: tuple, plain: tuple) -> tuple:
+    '''
+    Удаляет окончание группы 1 (после "а"/"я") или группы 2, выбирая самое длинное
+    '''
+    first, first_found = _strip(word, start, grouped, preceded_by='ая')
+    second, second_found = _strip(word, start, plain)
+    if first_found and second_found:
+        return (first, True) if len(first) <= len(second) else (second, True)
+    if first_found:
+        return first, True
+    return second, second_found
+
+
+def stem(word: str) -> str:
+    '''
+    Возвращает основу русского слова. Слова не на кириллице возвращаются без изменений
+    '''
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.match(word):
+        return word
+    rv, r2 = _regions(word)
+
+    # Шаг 1
+    word, found = _strip_any(word, rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if not found:
+        word, _ = _strip(word, rv, REFLEXIVE)
+        adjective_stripped, found = _strip(word, rv, ADJECTIVE)
+        if found:
+            word, _ = _strip_any(adjective_stripped, rv, PARTICIPLE_1, PARTICIPLE_2)
+        else:
+            word, found = _strip_any(word, rv, VERB_1, VERB_2)
+            if not found:
+                word, _ = _strip(word, rv, NOUN)
+
+    # Шаг 2
+    word, _ = _strip(word, rv, ('и',))
+
+    # Шаг 3
+    word, _ = _strip(word, r2, DERIVATIONAL)
+
+    # Шаг 4
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    word, found = _strip(word, rv, SUPERLATIVE)
+    if found:
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    word, _ = _strip(word, rv, ('ь',))
+    return word
+
+
+def tokenize(text: str) -> list:
+    '''
+    Разбивает текст на слова и приводит каждое к основе
+    '''
+    return [stem(token) for token in WORD_RE.findall(text.lower())]
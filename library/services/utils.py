@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+
+# Наибольшая длина списка IN в одном запросе: SQLite до версии 3.32 допускает не более 999 параметров
+MAX_IN_LIST = 900
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    '''
+    Разбивает итерируемый объект на списки длиной не более size
+    '''
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def values_in(queryset, field: str, values: Iterable, *fields: str) -> Iterator[tuple]:
+    '''
+    values_list(*fields) строк queryset, у которых field входит в values.
+    Список IN разбивается на запросы не длиннее MAX_IN_LIST
+    '''
+    for chunk in batched(values, MAX_IN_LIST):
+        yield from queryset.filter(**{f'{field}__in': chunk}).values_list(*fields)
+
+
+class TTLCache():
+    '''
+    Потокобезопасный LRU-кэш ограниченного размера со временем жизни записей
+    '''
+    def __init__(self, max_size: int, ttl: float):
+        if max_size < 1:
+            raise ValueError('max_size должен быть положительным')
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,205 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from backend.base_models import Status
+from library.authentication import token_cache
+from library.models import Author, Book, Comment, Genre, Library
+from library.services.cache_services import invalidate
+from library.services.event_services import publish_comment_events
+from library.services.metrics_services import install_query_metrics
+from library.services.search_services import author_document, book_document, comment_document, SearchIndex
+from library.services.sqlite_services import apply_pragmas
+from library.services.stats_services import (
+    book_state, comment_state, move_genre_books, register_book_comments, register_books, register_comments,
+    visible_status
+)
+
+
+# Скрытые и удалённые книги и комментарии удаляются из индекса сразу, не дожидаясь физического удаления
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, using, **kwargs):
+    if instance.status == Status.PUBLISHED:
+        SearchIndex(using).update([book_document(instance)])
+    else:
+        SearchIndex(using).remove('book', instance.pk)
+
+
+@receiver(post_save, sender=Author)
+def index_author(sender, instance, using, **kwargs):
+    SearchIndex(using).update([author_document(instance)])
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, using, **kwargs):
+    if instance.status == Status.PUBLISHED and instance.book.status == Status.PUBLISHED:
+        SearchIndex(using).update([comment_document(instance)])
+    else:
+        SearchIndex(using).remove('comment', instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, using, **kwargs):
+    SearchIndex(using).remove('book', instance.pk)
+
+
+@receiver(post_delete, sender=Author)
+def unindex_author(sender, instance, using, **kwargs):
+    SearchIndex(using).remove('author', instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, using, **kwargs):
+    SearchIndex(using).remove('comment', instance.pk)
+
+
+# Прежнее состояние книги читается одним запросом: для сброса кэша библиотеки,
+# из которой книга перенесена, и для обновления сводок статистики
+@receiver(pre_save, sender=Book)
+def remember_previous_book(sender, instance, using, update_fields=None, **kwargs):
+    instance._stats_previous = None
+    if instance.pk is None or (update_fields is not None and not {'library', 'genre', 'status'} & set(update_fields)):
+        return
+    books = Book.default_manager.using(using).filter(pk=instance.pk)
+    previous = books.values_list('library_id', 'genre_id', 'status').first()
+    if previous is None:
+        return
+    old_library_id, genre_id, status = previous
+    instance._stats_previous = (genre_id, status)
+    if old_library_id is not None and old_library_id != instance.library_id:
+        invalidate(f'library:{old_library_id}')
+
+
+@receiver(post_save, sender=Book)
+def register_saved_book(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_stats_previous', None)
+    if created or previous is not None:
+        register_books(before=[previous] if previous else [], after=[book_state(instance)])
+
+
+# Комментарии скрытой или удалённой книги не видны: они удаляются из индекса и
+# сводок и возвращаются в них при повторной публикации книги
+@receiver(post_save, sender=Book)
+def sync_book_comments(sender, instance, using, **kwargs):
+    previous = getattr(instance, '_stats_previous', None)
+    published = instance.status == Status.PUBLISHED
+    if previous is None or (previous[1] == Status.PUBLISHED) == published:
+        return
+    SearchIndex(using).sync_book_comments([instance.pk], published)
+    register_book_comments([instance.pk], published)
+    invalidate(f'comments:{instance.pk}')
+
+
+@receiver(post_delete, sender=Book)
+def register_deleted_book(sender, instance, **kwargs):
+    register_books(before=[book_state(instance)])
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    scopes = ['books', f'book:{instance.pk}']
+    if instance.library_id:
+        scopes.append(f'library:{instance.library_id}')
+    invalidate(*scopes)
+
+
+@receiver([post_save, post_delete], sender=Author)
+def invalidate_author_cache(sender, instance, **kwargs):
+    invalidate('authors')
+
+
+@receiver([post_save, post_delete], sender=Library)
+def invalidate_library_cache(sender, instance, **kwargs):
+    invalidate('libraries')
+
+
+@receiver(post_save, sender=Genre)
+def invalidate_genre_cache(sender, instance, **kwargs):
+    invalidate('genres')
+
+
+@receiver(pre_save, sender=Comment)
+def remember_previous_comment(sender, instance, using, **kwargs):
+    instance._stats_previous = None
+    if instance.pk is None:
+        return
+    comments = Comment.default_manager.using(using).filter(pk=instance.pk)
+    previous = comments.values_list('book_id', 'created_at', 'status', 'book__status').first()
+    if previous is None:
+        return
+    old_book_id, created_at, status, book_status = previous
+    instance._stats_previous = (created_at, visible_status(status, book_status))
+    if old_book_id is not None and old_book_id != instance.book_id:
+        invalidate(f'comments:{old_book_id}')
+        publish_comment_events('deleted', [Comment(pk=instance.pk, book_id=old_book_id)])
+
+
+@receiver(post_save, sender=Comment)
+def register_saved_comment(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_stats_previous', None)
+    if created or previous is not None:
+        register_comments(before=[previous] if previous else [], after=[comment_state(instance, instance.book.status)])
+
+
+@receiver(post_delete, sender=Comment)
+def register_deleted_comment(sender, instance, **kwargs):
+    register_comments(before=[comment_state(instance, instance.book.status)])
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_cache(sender, instance, **kwargs):
+    invalidate(f'comments:{instance.book_id}')
+
+
+# Скрытие и удаление комментария — событие deleted для подписчиков книги
+@receiver(post_save, sender=Comment)
+def publish_comment_event(sender, instance, created, **kwargs):
+    if created:
+        event_type = 'created'
+    else:
+        event_type = 'updated' if instance.status == Status.PUBLISHED else 'deleted'
+    publish_comment_events(event_type, [instance])
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_cache(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate('users')
+
+
+# Удаление жанра или пользователя обнуляет ссылки на них в книгах и комментариях
+# (on_delete=SET_NULL) одним UPDATE без сигналов, поэтому сбрасываются все книги и комментарии
+@receiver(post_delete, sender=Genre)
+def invalidate_deleted_genre_cache(sender, instance, **kwargs):
+    invalidate('genres', 'nullified-relations')
+    move_genre_books(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def invalidate_deleted_user_cache(sender, instance, **kwargs):
+    invalidate('users', 'nullified-relations')
+
+
+@receiver(post_delete, sender=Token)
+def revoke_deleted_token(sender, instance, **kwargs):
+    token_cache.revoke(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def revoke_user_tokens(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    token_cache.revoke(instance.pk)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    apply_pragmas(connection)
+
+
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    install_query_metrics(connection)
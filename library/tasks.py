@@ -0,0 +1,35 @@
+'''
+Фоновые задачи. Модуль импортируется при запуске приложения, чтобы задачи
+были зарегистрированы и в процессе API, и в обработчике очереди
+'''
+from library.models import Author, Book, Library
+from library.services.counter_services import reconcile_books
+from library.services.job_services import task
+from library.services.purge_services import purge_books
+from library.services.search_services import SearchIndex
+
+
+@task()
+def delete_author(author_id: int, batch_size: int = 500) -> None:
+    '''
+    Удаляет автора и его книги с комментариями пакетами вместо одного
+    каскадного удаления
+    '''
+    purge_books(Book.default_manager.filter(author_id=author_id), batch_size)
+    Author.objects.filter(pk=author_id).delete()
+
+
+@task()
+def delete_library(library_id: int, batch_size: int = 500) -> None:
+    purge_books(Book.default_manager.filter(library_id=library_id), batch_size)
+    Library.objects.filter(pk=library_id).delete()
+
+
+@task(name='reconcile_books')
+def reconcile_books_task(book_ids: list) -> None:
+    reconcile_books(book_ids)
+
+
+@task(max_attempts=1)
+def rebuild_search_index(batch_size: int = 1000) -> None:
+    SearchIndex().rebuild(batch_size)
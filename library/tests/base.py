@@ -0,0 +1,27 @@
+'''
+Общая подготовка тестов API: пользователи и аутентификация клиента по токену
+'''
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+
+def create_user(username: str = 'user1', password: str = 'pass1', **fields):
+    return get_user_model().objects.create(username=username, password=password, **fields)
+
+
+def set_token(client, token: Token) -> None:
+    '''
+    Передаёт токен во всех следующих запросах клиента в заголовке Authorization
+    '''
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+
+class AuthenticatedAPITestCase(APITestCase):
+    '''
+    Тест API, клиент которого аутентифицирован токеном пользователя user1
+    '''
+    def setUp(self) -> None:
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        set_token(self.client, self.token)
@@ -54,10 +54,27 @@ class TestBooksAPIViews(APITestCase):
             "owner": 1,
             "year": 1510,
             "genre": 1,
-            "author": 1
+            "author": 1,
+            "comments_count": 0,
+            "last_comment_at": None
         }]
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(json.loads(response.content), data)
+        self.assertEqual(json.loads(response.content), {'next': None, 'previous': None, 'results': data})
+
+    def test_books_cursor_pagination(self):
+        for i in range(4):
+            Book.default_manager.create(owner=self.user_1, title=f'Книга {i}', author=self.book.author)
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.user_1_token.key)
+        titles = []
+        url = '/api/v1/books/?page_size=2'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            content = json.loads(response.content)
+            self.assertLessEqual(len(content['results']), 2)
+            titles += [book['title'] for book in content['results']]
+            url = content['next']
+        self.assertEqual(titles, ['Книга', 'Книга 0', 'Книга 1', 'Книга 2', 'Книга 3'])
 
     def test_create_book(self):
         client.credentials(HTTP_AUTHORIZATION='Token ' + self.user_1_token.key)
@@ -72,7 +89,9 @@ class TestBooksAPIViews(APITestCase):
             "title": "Книга 2",
             "year": 2003,
             "genre": 1,
-            "author": 1
+            "author": 1,
+            "comments_count": 0,
+            "last_comment_at": None
         }
         response = client.post('/api/v1/books/', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -85,7 +104,9 @@ class TestBooksAPIViews(APITestCase):
             "owner": 1,
             "year": 1510,
             "genre": 1,
-            "author": 1
+            "author": 1,
+            "comments_count": 0,
+            "last_comment_at": None
         }
         response = client.get('/api/v1/books/1/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -98,7 +119,9 @@ class TestBooksAPIViews(APITestCase):
             "owner": 1,
             "year": 2003,
             "genre": 1,
-            "author": 1
+            "author": 1,
+            "comments_count": 0,
+            "last_comment_at": None
         }
         response = client.put('/api/v1/books/1/', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -117,7 +140,9 @@ class TestBooksAPIViews(APITestCase):
             "owner": 1,
             "year": 1510,
             "genre": 1,
-            "author": 1
+            "author": 1,
+            "comments_count": 0,
+            "last_comment_at": None
         }
         response = client.patch('/api/v1/books/1/', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -157,7 +182,7 @@ class TestGenresAPIViews(APITestCase):
             "title": "Жанр",
         }]
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(json.loads(response.content), data)
+        self.assertEqual(json.loads(response.content), {'next': None, 'previous': None, 'results': data})
 
     def test_get_genre(self):
         client.credentials(HTTP_AUTHORIZATION='Token ' + self.user_1_token.key)
@@ -194,7 +219,8 @@ class TestAuthorsAPIViews(APITestCase):
             "birthday": 1495
         }]
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(json.loads(response.content), data)
+        self.assertEqual(json.loads(response.content), {'next': None, 'previous': None, 'results': data})
+        self.assertEqual(client.get('/api/v1/authors/1/').status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
 class TestCommentsAPIViews(APITestCase):
@@ -249,7 +275,7 @@ class TestCommentsAPIViews(APITestCase):
             "created_at": self.comment_1.created_at.strftime(format='%Y-%m-%dT%H:%M:%S.%fZ')
         }]
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(json.loads(response.content), data)
+        self.assertEqual(json.loads(response.content), {'next': None, 'previous': None, 'results': data})
 
     def test_create_comment(self):
         client.credentials(HTTP_AUTHORIZATION='Token ' + self.user_1_token.key)
@@ -0,0 +1,48 @@
+import json
+
+from rest_framework import status
+
+from library.models import Author, Book, Comment, Genre, Library
+from library.tests.base import AuthenticatedAPITestCase
+
+
+class TestAsyncReadViews(AuthenticatedAPITestCase):
+    '''
+    Тестирует совпадение ответов асинхронных и синхронных представлений
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        library = Library.objects.create(title='Библиотека', address='Дом и улица', working_hours='09:00-18:00')
+        genre = Genre.objects.create(title='Жанр')
+        author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book = Book.default_manager.create(owner=self.user, title='Книга', year=1510, author=author,
+                                                genre=genre, library=library)
+        Book.default_manager.create(owner=self.user, title='Книга 2', year=1600, author=author)
+        Comment.active.create(owner=self.user, book=self.book, text='Тест')
+
+    def assertSameResponse(self, path: str):
+        sync_response = self.client.get(f'/api/v1/{path}')
+        async_response = self.client.get(f'/api/v1/async/{path}')
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content.replace(b'/async', b'')), json.loads(sync_response.content))
+
+    def test_same_output(self):
+        self.assertSameResponse('books/')
+        self.assertSameResponse('books/?page_size=1')
+        self.assertSameResponse('books/?year_from=1550&expand=author,genre,library,owner')
+        self.assertSameResponse(f'books/{self.book.id}/?expand=author')
+        self.assertSameResponse(f'books/{self.book.id}/comments/?expand=owner')
+        self.assertSameResponse('genres/')
+        self.assertSameResponse('genres/1/')
+        self.assertSameResponse('authors/')
+
+    def test_errors(self):
+        self.assertSameResponse('books/999/')
+        self.assertSameResponse('books/abc/')
+        self.assertSameResponse('books/?expand=unknown')
+        for path in ('books/abc/comments/', 'async/books/abc/comments/'):
+            self.assertEqual(self.client.get(f'/api/v1/{path}').status_code, status.HTTP_404_NOT_FOUND)
+        self.client.credentials()
+        self.assertSameResponse('books/')
+        response = self.client.post('/api/v1/async/books/', {})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
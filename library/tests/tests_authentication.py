@@ -0,0 +1,104 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from library.authentication import TokenCache, token_cache
+from library.tests.base import AuthenticatedAPITestCase, create_user
+
+
+class TestCachedTokenAuthentication(AuthenticatedAPITestCase):
+    '''
+    Тестирует кэширование аутентификации по токену и отзыв токенов
+    '''
+    url = '/api/v1/genres/'
+
+    def setUp(self) -> None:
+        super().setUp()
+
+    @mock.patch.object(TokenCache, 'process_local', False)
+    def test_lookup_is_cached(self):
+        stats = token_cache.stats()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(self.url + '?page_size=1').status_code, status.HTTP_200_OK)
+        self.assertNotIn('authtoken_token', ' '.join(query['sql'] for query in context.captured_queries))
+        new_stats = token_cache.stats()
+        self.assertEqual(new_stats['misses'], stats['misses'] + 1)
+        self.assertEqual(new_stats['hits'], stats['hits'] + 1)
+
+    def test_deleted_token_is_revoked(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_revoked(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_in_other_process(self):
+        # С локальным для процесса кэшем удаление токена другим процессом видно по базе данных
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with mock.patch.object(token_cache, 'revoke'):
+            self.token.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @mock.patch.object(TokenCache, 'process_local', False)
+    def test_other_user_changes_keep_cache(self):
+        other = create_user('user2', 'pass2')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        other.is_active = False
+        other.save()
+        Token.objects.create(user=other).delete()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(self.url + '?page_size=1').status_code, status.HTTP_200_OK)
+        self.assertNotIn('authtoken_token', ' '.join(query['sql'] for query in context.captured_queries))
+
+    def test_unknown_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestTokenCache(APITestCase):
+    '''
+    Тестирует разделяемый между процессами кэш токенов
+    '''
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = create_user()
+        self.other = create_user('user2', 'pass2')
+
+    def test_shared_cache(self):
+        first_process = TokenCache(max_size=10, ttl=60, shared_alias='default')
+        second_process = TokenCache(max_size=10, ttl=60, shared_alias='default')
+        # Отметки отзыва создаются при первом обращении, записи, проверенные раньше, не сохраняются
+        first_process.set('key', (self.user, 'token'), time.time())
+        self.assertIsNone(second_process.get('key'))
+        first_process.set('key', (self.user, 'token'), time.time())
+        first_process.revoked_at(self.other.pk)
+        first_process.set('other', (self.other, 'token'), time.time())
+        self.assertEqual(second_process.get('key'), (self.user, 'token'))
+        self.assertEqual(second_process.stats()['shared_hits'], 1)
+        first_process.revoke(self.user.pk)
+        self.assertIsNone(second_process.get('key'))
+        self.assertIsNone(first_process.get('key'))
+        # Отзыв касается только токенов одного пользователя
+        self.assertEqual(second_process.get('other'), (self.other, 'token'))
+
+    def test_evicted_revocation(self):
+        tokens = TokenCache(max_size=10, ttl=60, shared_alias='default')
+        checked_at = time.time()
+        tokens.revoke(self.user.pk)
+        tokens.set('key', (self.user, 'token'), checked_at)
+        self.assertIsNone(tokens.get('key'))
+        # Вытесненная отметка отзыва заменяется текущим временем и не возвращает устаревшие записи
+        cache.delete(f'{TokenCache.REVOKED_KEY_PREFIX}{self.user.pk}')
+        cache.set(f'{TokenCache.KEY_PREFIX}key', (checked_at, (self.user, 'token')))
+        self.assertIsNone(TokenCache(max_size=10, ttl=60, shared_alias='default').get('key'))
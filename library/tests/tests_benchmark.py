@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from library.authentication import TokenCache
+from library.models import Book, Comment
+from library.services.benchmark_services import APIBenchmark, find_regressions, make_report
+
+
+class TestAPIBenchmark(TestCase):
+    '''
+    Тестирует замеры маршрутов API и поиск ухудшений
+    '''
+    @mock.patch.object(TokenCache, 'process_local', False)
+    def test_run(self):
+        benchmark = APIBenchmark(rounds=2, warmup=0, only=['GET genres-list', 'POST books-list',
+                                                           'DELETE books-detail', 'GET async_books_detail'])
+        results = {result.name: result for result in benchmark.run()}
+        self.assertEqual(set(results), {'GET genres-list', 'POST books-list', 'DELETE books-detail',
+                                        'GET async_books_detail'})
+        self.assertEqual(results['POST books-list'].status, 201)
+        self.assertEqual(results['DELETE books-detail'].status, 204)
+        self.assertEqual(results['GET async_books_detail'].status, 200)
+        self.assertEqual(results['GET genres-list'].queries, 1)
+        self.assertGreater(results['GET genres-list'].throughput, 0)
+        # Объекты замеров и изменения запросов откатываются
+        self.assertFalse(Book.default_manager.exists())
+        self.assertFalse(Comment.active.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_all_routes_covered(self):
+        results = APIBenchmark(rounds=1, warmup=0).run()
+        self.assertTrue(all(result.status < 400 for result in results),
+                        [(result.name, result.status) for result in results if result.status >= 400])
+        self.assertIn('GET search', {result.name for result in results})
+
+    def test_find_regressions(self):
+        report = make_report(APIBenchmark(rounds=1, warmup=0, only=['GET genres-list']).run())
+        baseline = {'results': {name: dict(result) for name, result in report['results'].items()}}
+        self.assertEqual(find_regressions(report, baseline, threshold=10), [])
+        baseline['results']['GET genres-list']['p50'] = report['results']['GET genres-list']['p50'] / 2
+        baseline['results']['GET genres-list']['queries'] = 0
+        self.assertEqual(len(find_regressions(report, baseline, threshold=10)), 2)
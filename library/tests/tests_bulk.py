@@ -0,0 +1,166 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from library.models import Author, Book, Comment, Genre
+from library.permissions import IsOwnerOrReadOnly
+from library.tests.base import AuthenticatedAPITestCase, create_user
+
+
+class TestBulkAPIViews(AuthenticatedAPITestCase):
+    '''
+    Тестирует пакетные операции над книгами и комментариями
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        self.user_2 = create_user('user2', 'pass2')
+        self.author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.own_book = Book.default_manager.create(owner=self.user, title='Своя книга', author=self.author)
+        self.other_book = Book.default_manager.create(owner=self.user_2, title='Чужая книга', author=self.author)
+
+    def test_bulk_create_books(self):
+        data = [
+            {'title': 'Книга 1', 'year': 2000, 'author': self.author.id},
+            {'title': 'Книга 2', 'year': 3000, 'author': self.author.id},
+            {'title': 'Книга 3', 'author': self.author.id},
+        ]
+        response = self.client.post('/api/v1/books/bulk/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = json.loads(response.content)['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 201])
+        self.assertIn('year', results[1]['errors'])
+        self.assertEqual(results[0]['data']['owner'], self.user.id)
+        self.assertEqual(Book.default_manager.get(pk=results[2]['id']).title, 'Книга 3')
+
+    def test_bulk_create_ndjson(self):
+        body = '\n'.join(json.dumps({'title': f'Книга {i}', 'author': self.author.id}) for i in range(3))
+        response = self.client.post('/api/v1/books/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(json.loads(response.content)['results']), 3)
+        self.assertEqual(Book.default_manager.filter(owner=self.user).count(), 4)
+
+    def test_bulk_create_query_count(self):
+        # Связанные объекты загружаются одним запросом на поле для всего пакета. Первый пакет
+        # дополнительно проверяет токен и создаёт строки сводок статистики
+        genre = Genre.objects.create(title='Жанр')
+        counts = []
+        for size in (1, 10, 50):
+            books = [{'title': f'Книга {i}', 'author': self.author.id, 'genre': genre.id} for i in range(size)]
+            comments = [{'text': f'Комментарий {i}', 'book': self.own_book.id} for i in range(size)]
+            with CaptureQueriesContext(connection) as books_context:
+                response = self.client.post('/api/v1/books/bulk/', books, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            with CaptureQueriesContext(connection) as comments_context:
+                response = self.client.post(f'/api/v1/books/{self.own_book.id}/comments/bulk/', comments,
+                                            format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            counts.append((len(books_context), len(comments_context)))
+        self.assertEqual(counts[1], counts[2])
+
+        response = self.client.post('/api/v1/books/bulk/', [{'title': 'Книга', 'author': 0},
+                                                            {'title': 'Книга', 'author': 'abc'}], format='json')
+        self.assertEqual([result['status'] for result in json.loads(response.content)['results']], [400, 400])
+
+    def test_bulk_update_books(self):
+        data = [
+            {'id': self.own_book.id, 'title': 'Новое название'},
+            {'id': self.other_book.id, 'title': 'Новое название'},
+            {'id': 999, 'title': 'Новое название'},
+            {'title': 'Без id'},
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch('/api/v1/books/bulk/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = json.loads(response.content)['results']
+        self.assertEqual([result['status'] for result in results], [200, 403, 404, 400])
+        self.assertEqual(Book.default_manager.get(pk=self.own_book.id).title, 'Новое название')
+        self.assertEqual(Book.default_manager.get(pk=self.other_book.id).title, 'Чужая книга')
+        book_selects = [query for query in context.captured_queries
+                        if query['sql'].startswith('SELECT') and '"books"' in query['sql']]
+        self.assertEqual(len(book_selects), 1)
+
+    def test_bulk_update_duplicate_ids(self):
+        data = [{'id': self.own_book.id, 'title': 'Первое'}, {'id': self.own_book.id, 'title': 'Второе'}]
+        response = self.client.patch('/api/v1/books/bulk/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.own_book.id), json.loads(response.content)['non_field_errors'][0])
+        self.assertEqual(Book.default_manager.get(pk=self.own_book.id).title, self.own_book.title)
+
+    def test_bulk_destroy_books(self):
+        response = self.client.delete('/api/v1/books/bulk/', [self.own_book.id, {'id': self.other_book.id}],
+                                      format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = json.loads(response.content)['results']
+        self.assertEqual([result['status'] for result in results], [204, 403])
+        self.assertEqual(list(Book.active.values_list('id', flat=True)), [self.other_book.id])
+
+    def test_bulk_comments_update_counters(self):
+        url = f'/api/v1/books/{self.own_book.id}/comments/bulk/'
+        data = [{'book': self.own_book.id, 'text': f'Комментарий {i}'} for i in range(3)]
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ids = [result['id'] for result in json.loads(response.content)['results']]
+        self.own_book.refresh_from_db()
+        self.assertEqual(self.own_book.comments_count, 3)
+
+        response = self.client.delete(url, ids[:2], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.own_book.refresh_from_db()
+        self.assertEqual(self.own_book.comments_count, 1)
+        self.assertEqual(list(Comment.active.values_list('id', flat=True)), ids[2:])
+
+    def test_bulk_requires_list(self):
+        response = self.client.post('/api/v1/books/bulk/', {'title': 'Книга'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_owner_check_does_not_load_owner(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(f'/api/v1/books/{self.own_book.id}/', {'year': 2001}, format='json')
+            forbidden = self.client.delete(f'/api/v1/books/{self.other_book.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(forbidden.status_code, status.HTTP_403_FORBIDDEN)
+        user_selects = [query for query in context.captured_queries if 'FROM "auth_user" WHERE' in query['sql']]
+        self.assertEqual(user_selects, [])
+
+    def test_bulk_destroy_scoped_by_owner(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.delete('/api/v1/books/bulk/', [self.own_book.id], format='json')
+        self.assertTrue(any('"books"."owner_id" =' in query['sql'] for query in context.captured_queries))
+        self.assertFalse(Book.active.filter(pk=self.own_book.id).exists())
+        self.assertFalse(any('FROM "auth_user" WHERE' in query['sql'] for query in context.captured_queries))
+
+
+class TestIsOwnerOrReadOnly(APITestCase):
+    '''
+    Тестирует разрешение владельца на уровне объекта и набора объектов
+    '''
+    def setUp(self) -> None:
+        self.user_1 = create_user()
+        self.user_2 = create_user('user2', 'pass2')
+        author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book_1 = Book.default_manager.create(owner=self.user_1, title='Книга 1', author=author)
+        self.book_2 = Book.default_manager.create(owner=self.user_2, title='Книга 2', author=author)
+        self.orphan = Book.default_manager.create(title='Книга без владельца', author=author)
+        self.permission = IsOwnerOrReadOnly()
+
+    def _request(self, method: str):
+        request = getattr(APIRequestFactory(), method)('/')
+        request.user = self.user_1
+        return request
+
+    def test_has_object_permission(self):
+        request = self._request('patch')
+        with self.assertNumQueries(0):
+            self.assertTrue(self.permission.has_object_permission(request, None, self.book_1))
+            self.assertFalse(self.permission.has_object_permission(request, None, self.book_2))
+            self.assertFalse(self.permission.has_object_permission(request, None, self.orphan))
+        self.assertTrue(self.permission.has_object_permission(self._request('get'), None, self.book_2))
+
+    def test_filter_queryset(self):
+        queryset = Book.default_manager.order_by('id')
+        scoped = self.permission.filter_queryset(self._request('delete'), queryset, None)
+        self.assertEqual(list(scoped), [self.book_1])
+        self.assertEqual(self.permission.filter_queryset(self._request('get'), queryset, None).count(), 3)
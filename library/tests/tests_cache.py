@@ -0,0 +1,76 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date, parse_http_date
+from rest_framework import status
+
+from library.authentication import TokenCache
+from library.models import Genre, Author, Book, Comment
+from library.services.cache_services import get_versions
+from library.tests.base import AuthenticatedAPITestCase
+
+
+class TestResponseCache(AuthenticatedAPITestCase):
+    '''
+    Тестирует кэширование ответов, условные запросы и инвалидацию
+    '''
+    def setUp(self) -> None:
+        cache.clear()
+        super().setUp()
+        self.genre = Genre.objects.create(title='Жанр')
+        self.author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book_1 = Book.default_manager.create(owner=self.user, title='Книга 1', author=self.author)
+        self.book_2 = Book.default_manager.create(owner=self.user, title='Книга 2', author=self.author)
+        Comment.active.create(owner=self.user, book=self.book_1, text='Тест')
+
+    @mock.patch.object(TokenCache, 'process_local', False)
+    def test_cached_response_skips_database(self):
+        response = self.client.get('/api/v1/genres/')
+        with CaptureQueriesContext(connection) as context:
+            cached_response = self.client.get('/api/v1/genres/')
+        self.assertEqual(cached_response.content, response.content)
+        # Токен проверяется по общему кэшу аутентификации
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_conditional_requests(self):
+        response = self.client.get(f'/api/v1/books/{self.book_1.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        response = self.client.get(f'/api/v1/books/{self.book_1.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Полученный Last-Modified, переданный без изменений, подтверждает актуальность ответа
+        last_modified = response['Last-Modified']
+        response = self.client.get(f'/api/v1/books/{self.book_1.id}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(f'/api/v1/books/{self.book_1.id}/',
+                                   HTTP_IF_MODIFIED_SINCE=http_date(parse_http_date(last_modified) - 1))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.patch(f'/api/v1/books/{self.book_1.id}/', {'title': 'Новое название'}, format='json')
+        response = self.client.get(f'/api/v1/books/{self.book_1.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['title'], 'Новое название')
+
+    def test_comment_invalidates_only_its_book(self):
+        scopes = [f'comments:{self.book_1.id}', f'comments:{self.book_2.id}', f'book:{self.book_2.id}']
+        versions = get_versions(scopes)
+        response = self.client.post(f'/api/v1/books/{self.book_1.id}/comments/',
+                                    {'book': self.book_1.id, 'text': 'Новый'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        new_versions = get_versions(scopes)
+        self.assertNotEqual(new_versions[scopes[0]], versions[scopes[0]])
+        self.assertEqual(new_versions[scopes[1]], versions[scopes[1]])
+        self.assertEqual(new_versions[scopes[2]], versions[scopes[2]])
+        response = self.client.get(f'/api/v1/books/{self.book_1.id}/comments/')
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+
+    def test_expanded_response_follows_related_changes(self):
+        url = '/api/v1/books/?expand=author'
+        self.assertEqual(json.loads(self.client.get(url).content)['results'][0]['author']['full_name'], 'Автор')
+        self.author.full_name = 'Другой автор'
+        self.author.save()
+        self.assertEqual(json.loads(self.client.get(url).content)['results'][0]['author']['full_name'],
+                         'Другой автор')
@@ -0,0 +1,93 @@
+import re
+from contextlib import ExitStack
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from backend.base_models import Status
+from library.models import Genre, Author, Book, Library, Comment
+from library.services.command_services import DatabaseStuffer
+from library.services.counter_services import reconcile_books
+from library.services.export_services import iter_books_with_comments
+from library.services.purge_services import purge_deleted
+from library.services.utils import MAX_IN_LIST, batched, values_in
+
+
+class TestDatabaseStuffer(TestCase):
+    '''
+    Тестирует пакетное заполнение базы данных
+    '''
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(batched([], 2)), [])
+
+    def test_values_in(self):
+        names = [f'Автор {i}' for i in range(MAX_IN_LIST + 100)]
+        Author.objects.bulk_create(Author(full_name=name, birthday=1800) for name in names)
+        with CaptureQueriesContext(connection) as context:
+            found = dict(values_in(Author.objects.all(), 'full_name', names, 'full_name', 'id'))
+        self.assertEqual(sorted(found), sorted(names))
+        self.assertEqual(len(context.captured_queries), 2)
+
+    def test_in_lists_capped(self):
+        # Списки id в условиях IN пакетных сервисов не длиннее MAX_IN_LIST
+        author = Author.objects.create(full_name='Автор', birthday=1800)
+        books = [Book.default_manager.create(title=f'Книга {i}', author=author) for i in range(5)]
+        for book in books:
+            Comment.active.create(book=book, text='Комментарий')
+        modules = ('utils', 'counter_services', 'export_services', 'purge_services')
+        with ExitStack() as stack, CaptureQueriesContext(connection) as context:
+            for module in modules:
+                stack.enter_context(mock.patch(f'library.services.{module}.MAX_IN_LIST', 2))
+            Book.default_manager.update(comments_count=0)
+            self.assertEqual(reconcile_books([book.id for book in books]), 5)
+            exported = list(iter_books_with_comments())
+            Book.default_manager.update(status=Status.DELETED, deleted_at=timezone.now() - timedelta(days=1))
+            purged = purge_deleted(timedelta(0), batch_size=10)
+        self.assertEqual([len(book['comments']) for book in exported], [1] * 5)
+        self.assertEqual(purged, {'books': 5, 'comments': 5})
+        in_lists = [values for query in context.captured_queries
+                    for values in re.findall(r' IN \(([\d, ]+)\)', query['sql'])]
+        self.assertTrue(in_lists)
+        self.assertLessEqual(max(len(values.split(',')) for values in in_lists), 2)
+
+    def test_fill(self):
+        DatabaseStuffer(batch_size=7).fill()
+        books_count = Book.default_manager.count()
+        self.assertEqual(get_user_model().objects.count(), DatabaseStuffer.USERS_COUNT)
+        self.assertEqual(Library.objects.count(), DatabaseStuffer.LIBRARIES_COUNT)
+        self.assertEqual(Genre.objects.count(), len(DatabaseStuffer.GENRES))
+        self.assertGreater(books_count, 0)
+        self.assertEqual(Comment.active.count(), books_count * DatabaseStuffer.COMMENTS_PER_BOOK)
+        self.assertEqual(Author.objects.count(), Author.objects.values('full_name').distinct().count())
+        self.assertFalse(Book.default_manager.filter(owner__isnull=True).exists())
+        self.assertFalse(Book.default_manager.exclude(comments_count=DatabaseStuffer.COMMENTS_PER_BOOK).exists())
+
+    def test_fill_twice(self):
+        def counts():
+            return [manager.count() for manager in (Library.objects, Genre.objects, Author.objects,
+                                                    Book.default_manager, Comment.default_manager)]
+
+        DatabaseStuffer(batch_size=50).fill()
+        filled = counts()
+        DatabaseStuffer(batch_size=50).fill()
+        self.assertEqual(counts(), filled)
+
+    def test_fill_with_scale(self):
+        stuffer = DatabaseStuffer(batch_size=50, scale=3)
+        stuffer.fill()
+        catalog = list(stuffer._iter_catalog())
+        self.assertEqual(Book.default_manager.count(), len(catalog) * 3)
+        self.assertEqual(Author.objects.count(), len({book_data['author'] for book_data in catalog}))
+        self.assertEqual(Comment.active.count(), len(catalog) * 3 * DatabaseStuffer.COMMENTS_PER_BOOK)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            DatabaseStuffer(batch_size=0)
+        with self.assertRaises(ValueError):
+            DatabaseStuffer(scale=0)
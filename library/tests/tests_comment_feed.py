@@ -0,0 +1,86 @@
+import json
+
+from django.db import connection
+from django.test import override_settings
+from rest_framework import status
+
+from library.models import Author, Book, Comment
+from library.pagination import EPOCH
+from library.tests.base import AuthenticatedAPITestCase
+
+
+class TestCommentFeed(AuthenticatedAPITestCase):
+    '''
+    Тестирует инкрементальный опрос комментариев (?since=) и ленту последних комментариев
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book_1 = Book.default_manager.create(owner=self.user, title='Книга 1', author=author)
+        self.book_2 = Book.default_manager.create(owner=self.user, title='Книга 2', author=author)
+        self.url = f'/api/v1/books/{self.book_1.id}/comments/'
+
+    def _get(self, url: str, **params) -> dict:
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)
+
+    def _comment(self, book: Book, text: str) -> int:
+        response = self.client.post(f'/api/v1/books/{book.id}/comments/', {'book': book.id, 'text': text},
+                                    format='json')
+        return json.loads(response.content)['id']
+
+    def test_since_polling(self):
+        self._comment(self.book_1, 'Старый')
+        start = self._get(self.url, since='')
+        self.assertEqual((start['results'], start['has_more']), ([], False))
+
+        ids = [self._comment(self.book_1, f'Новый {i}') for i in range(3)]
+        self._comment(self.book_2, 'Другая книга')
+        page = self._get(self.url, since=start['since'], page_size=2)
+        self.assertEqual([comment['id'] for comment in page['results']], ids[:2])
+        self.assertTrue(page['has_more'])
+        page = self._get(self.url, since=page['since'], page_size=2)
+        self.assertEqual([comment['id'] for comment in page['results']], ids[2:])
+        self.assertFalse(page['has_more'])
+
+        empty = self._get(self.url, since=page['since'])
+        self.assertEqual((empty['results'], empty['since']), ([], page['since']))
+
+    def test_since_empty_list(self):
+        start = self._get(self.url, since='')
+        comment_id = self._comment(self.book_1, 'Первый')
+        self.assertEqual([comment['id'] for comment in self._get(self.url, since=start['since'])['results']],
+                         [comment_id])
+
+    def test_since_matches_serializer(self):
+        start = self._get(self.url, since='')
+        self._comment(self.book_1, 'Комментарий')
+        fast = self._get(self.url, since=start['since'], expand='owner')
+        with override_settings(API_FAST_SERIALIZATION=False):
+            slow = self._get(self.url, since=start['since'], expand='owner', page_size=100)
+        self.assertEqual(fast['results'], slow['results'])
+        self.assertEqual(fast['results'][0]['owner'], {'id': self.user.id, 'username': 'user1'})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'since': 'не курсор'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recent_feed(self):
+        first = self._comment(self.book_1, 'Первый')
+        second = self._comment(self.book_2, 'Второй')
+        feed = self._get('/api/v1/comments/')
+        self.assertEqual([comment['id'] for comment in feed['results']], [second, first])
+
+        start = self._get('/api/v1/comments/', since='')
+        third = self._comment(self.book_1, 'Третий')
+        page = self._get('/api/v1/comments/', since=start['since'])
+        self.assertEqual([comment['id'] for comment in page['results']], [third])
+
+    def test_since_uses_index(self):
+        queryset = Comment.active.get_book_comments(book_id=self.book_1.id)
+        sql, params = queryset.filter(created_at__gte=EPOCH).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('comments_book_published_idx (book_id=? AND created_at>?)', plan)
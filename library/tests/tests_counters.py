@@ -0,0 +1,78 @@
+import json
+
+from django.test import override_settings
+from rest_framework import status
+
+from library.models import Author, Book, Comment
+from library.services.cache_services import get_cache, get_versions
+from library.services.counter_services import reconcile_book_counters
+from library.tests.base import AuthenticatedAPITestCase
+
+
+class TestBookCommentCounters(AuthenticatedAPITestCase):
+    '''
+    Тестирует денормализованные счётчики комментариев книг
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book_1 = Book.default_manager.create(owner=self.user, title='Книга 1', author=author)
+        self.book_2 = Book.default_manager.create(owner=self.user, title='Книга 2', author=author)
+
+    def _book(self, book: Book) -> dict:
+        return json.loads(self.client.get(f'/api/v1/books/{book.id}/').content)
+
+    def _create_comment(self, book: Book) -> dict:
+        response = self.client.post(f'/api/v1/books/{book.id}/comments/', {'book': book.id, 'text': 'Тест'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return json.loads(response.content)
+
+    def test_counters_follow_api_changes(self):
+        first = self._create_comment(self.book_1)
+        second = self._create_comment(self.book_1)
+        book = self._book(self.book_1)
+        self.assertEqual(book['comments_count'], 2)
+        self.assertEqual(book['last_comment_at'], second['created_at'])
+
+        response = self.client.delete(f'/api/v1/books/{self.book_1.id}/comments/{second["id"]}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        book = self._book(self.book_1)
+        self.assertEqual(book['comments_count'], 1)
+        self.assertEqual(book['last_comment_at'], first['created_at'])
+
+        response = self.client.patch(f'/api/v1/books/{self.book_1.id}/comments/{first["id"]}/',
+                                     {'book': self.book_2.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._book(self.book_1)['comments_count'], 0)
+        self.assertIsNone(self._book(self.book_1)['last_comment_at'])
+        self.assertEqual(self._book(self.book_2)['comments_count'], 1)
+
+    def test_counters_in_cached_list(self):
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(API_FAST_SERIALIZATION=fast):
+                response = self.client.get('/api/v1/books/')
+                versions = get_versions(['books'])
+                count = json.loads(response.content)['results'][0]['comments_count']
+                comment = self._create_comment(self.book_1)
+                # Комментарий не сбрасывает кэш списка книг, но меняет счётчики и ETag ответа
+                self.assertEqual(get_versions(['books']), versions)
+                cached = self.client.get('/api/v1/books/', HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(cached.status_code, status.HTTP_200_OK)
+                book = json.loads(cached.content)['results'][0]
+                self.assertEqual(book['comments_count'], count + 1)
+                self.assertEqual(book['last_comment_at'], comment['created_at'])
+                get_cache().clear()
+                self.assertEqual(cached.content, self.client.get('/api/v1/books/').content)
+
+    def test_reconcile(self):
+        Comment.active.create(owner=self.user, book=self.book_1, text='Тест')
+        Comment.active.create(owner=self.user, book=self.book_1, text='Тест')
+        Book.default_manager.filter(pk=self.book_2.pk).update(comments_count=5)
+        self.assertEqual(reconcile_book_counters(batch_size=1), 2)
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.assertEqual(self.book_1.comments_count, 2)
+        self.assertIsNotNone(self.book_1.last_comment_at)
+        self.assertEqual((self.book_2.comments_count, self.book_2.last_comment_at), (0, None))
+        self.assertEqual(reconcile_book_counters(), 0)
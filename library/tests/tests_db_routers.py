@@ -0,0 +1,110 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.test import override_settings, TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from library.authentication import TokenCache
+from library.db_routers import PrimaryReplicaRouter, replica_reads, stick_to_primary
+from library.models import Author, Book, Genre
+from library.tests.base import AuthenticatedAPITestCase, create_user, set_token
+from library.versions.v_1_0.views import BooksAPIViewSet
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class TestPrimaryReplicaRouter(TestCase):
+    '''
+    Тестирует выбор базы данных роутером
+    '''
+    def setUp(self) -> None:
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+
+    def test_routing(self):
+        self.assertIsNone(self.router.db_for_read(Book))
+        with replica_reads(user_id=1) as alias:
+            self.assertIn(alias, ['replica_1', 'replica_2'])
+            self.assertEqual(self.router.db_for_read(Book), alias)
+            self.assertEqual(self.router.db_for_read(Genre), alias)
+            self.assertEqual(self.router.db_for_write(Book), DEFAULT_DB_ALIAS)
+        self.assertIsNone(self.router.db_for_read(Book))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'library'))
+        self.assertIsNone(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'library'))
+
+    def test_read_your_writes(self):
+        stick_to_primary(1)
+        with replica_reads(user_id=1):
+            self.assertIsNone(self.router.db_for_read(Book))
+        with replica_reads(user_id=2):
+            self.assertIsNotNone(self.router.db_for_read(Book))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        stick_to_primary(1)
+        with replica_reads(user_id=1):
+            self.assertIsNone(self.router.db_for_read(Book))
+
+
+class TestReplicaReadViews(AuthenticatedAPITestCase):
+    '''
+    Тестирует направление чтений представлений в реплику. Роль реплики
+    играет основная база, поэтому выбор реплики виден только по ответам роутера
+    '''
+    def setUp(self) -> None:
+        cache.clear()
+        super().setUp()
+        self.author = Author.objects.create(full_name='Автор', birthday=1495)
+
+    def _read_databases(self, method: str, path: str, data=None) -> set:
+        databases = set()
+        db_for_read = PrimaryReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            database = db_for_read(router, model, **hints)
+            databases.add(database)
+            return database
+
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', spy):
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return databases
+
+    @override_settings(DATABASE_REPLICAS=[DEFAULT_DB_ALIAS])
+    @mock.patch.object(TokenCache, 'process_local', False)
+    def test_views(self):
+        # Токен проверяется до выбора базы, поэтому сначала он попадает в общий кэш
+        self.client.get('/api/v1/genres/')
+        self.assertEqual(self._read_databases('get', '/api/v1/genres/?page_size=1'), {DEFAULT_DB_ALIAS})
+        self.assertEqual(self._read_databases('get', '/api/v1/async/genres/'), {DEFAULT_DB_ALIAS})
+        self.assertEqual(self._read_databases('get', '/api/v1/books/?expand=author'), {DEFAULT_DB_ALIAS})
+        self.assertNotIn(DEFAULT_DB_ALIAS, self._read_databases('post', '/api/v1/books/',
+                                                                {'title': 'Книга', 'year': 1510,
+                                                                 'author': self.author.id}))
+        # После изменения данных клиент читает из основной базы
+        self.assertEqual(self._read_databases('get', '/api/v1/genres/?page_size=2'), {None})
+        self.assertEqual(self._read_databases('get', '/api/v1/async/genres/?page_size=2'), {None})
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_cached_response_read_your_writes(self):
+        other = create_user('user2', 'pass2')
+        other_client = APIClient()
+        set_token(other_client, Token.objects.create(user=other))
+        # Роль реплики replica_1 играет основная база: роутер не выбирает базу для чтения
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', lambda router, model, **hints: None):
+            self.client.get('/api/v1/books/')
+            self.client.post('/api/v1/books/', {'title': 'Новая', 'year': 1510, 'author': self.author.id},
+                             format='json')
+            book_id = Book.active.get(title='Новая').pk
+
+            # Реплика отстаёт: другой клиент читает список без новой книги, и ответ попадает в кэш
+            with mock.patch.object(BooksAPIViewSet, 'get_queryset', lambda view: Book.active.exclude(pk=book_id)):
+                response = other_client.get('/api/v1/books/')
+            self.assertEqual(response.data['results'], [])
+            response = other_client.get('/api/v1/books/')
+            self.assertEqual(response.data['results'], [])
+
+            # Клиент, изменивший данные, читает основную базу мимо ответа реплики
+            response = self.client.get('/api/v1/books/')
+        self.assertEqual([book['title'] for book in response.data['results']], ['Новая'])
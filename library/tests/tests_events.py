@@ -0,0 +1,218 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core import signals
+from django.db import close_old_connections
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from library.models import Author, Book, Comment
+from library.pagination import CommentsKeysetPagination
+from library.services.event_services import EventBroker, OVERFLOW, TooManySubscribers
+from library.services.metrics_services import registry
+from library.tests.base import create_user
+from library.versions.v_1_0 import event_stream
+from library.versions.v_1_0.event_stream import CommentEventStream
+
+
+class TestEventBroker(SimpleTestCase):
+    '''
+    Тестирует рассылку событий подписчикам, ограничение буфера и числа подписчиков
+    '''
+    async def test_publish_from_thread(self):
+        broker = EventBroker()
+        with broker.subscribe('a') as first, broker.subscribe('a') as second, broker.subscribe('b') as other:
+            thread = threading.Thread(target=broker.publish, args=('a', {'type': 'created'}))
+            thread.start()
+            thread.join()
+            self.assertEqual(await first.get(1), {'type': 'created'})
+            self.assertEqual(await second.get(1), {'type': 'created'})
+            self.assertIsNone(await other.get(0.01))
+        self.assertEqual(broker.subscribers_count(), 0)
+        self.assertFalse(broker.has_subscribers('a'))
+
+    async def test_overflow(self):
+        broker = EventBroker(buffer_size=2)
+        subscription = broker.subscribe('a')
+        for i in range(3):
+            broker.publish('a', {'type': 'created', 'id': i})
+        await asyncio.sleep(0)
+        self.assertIs(await subscription.get(1), OVERFLOW)
+        self.assertIsNone(await subscription.get(1))
+        self.assertTrue(subscription.closed)
+        self.assertFalse(broker.has_subscribers('a'))
+
+    async def test_max_subscribers(self):
+        broker = EventBroker(max_subscribers=1)
+        with broker.subscribe('a'):
+            with self.assertRaises(TooManySubscribers):
+                broker.subscribe('b')
+        broker.subscribe('b').close()
+
+
+class TestCommentEvents(TestCase):
+    '''
+    Тестирует long polling новых комментариев книги
+    '''
+    def setUp(self) -> None:
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book = Book.default_manager.create(owner=self.user, title='Книга', author=author)
+        self.old = Comment.active.create(owner=self.user, book=self.book, text='Старый')
+        self.url = f'/api/v1/async/books/{self.book.id}/comments/'
+        # Как и тестовые клиенты Django, не закрываем соединение теста по сигналам запроса
+        for signal in (signals.request_started, signals.request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def _create_comment(self, text: str) -> Comment:
+        with self.captureOnCommitCallbacks(execute=True):
+            return Comment.active.create(owner=self.user, book=self.book, text=text)
+
+    async def _poll(self, client: AsyncClient, **params) -> dict:
+        response = await client.get(self.url + 'events/', params, authorization='Token ' + self.token.key)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    async def test_long_poll(self):
+        client = AsyncClient()
+        start = await self._poll(client, since='')
+        self.assertEqual(start['results'], [])
+        self.assertEqual(await self._poll(client, since=start['since'], timeout=0), start)
+
+        poll = asyncio.ensure_future(self._poll(client, since=start['since'], timeout=5))
+        await asyncio.sleep(0.1)
+        self.assertFalse(poll.done())
+        comment = await sync_to_async(self._create_comment)('Новый')
+        page = await asyncio.wait_for(poll, 5)
+        self.assertEqual([item['id'] for item in page['results']], [comment.id])
+
+    async def test_long_poll_errors(self):
+        client = AsyncClient()
+        response = await client.get(self.url + 'events/', {'since': ''})
+        self.assertEqual(response.status_code, 401)
+        response = await client.get(self.url + 'events/', authorization='Token ' + self.token.key)
+        self.assertEqual(response.status_code, 400)
+        response = await client.get('/api/v1/async/books/0/comments/events/', {'since': ''},
+                                    authorization='Token ' + self.token.key)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestCommentStream(TransactionTestCase):
+    '''
+    Тестирует поток Server-Sent Events новых комментариев книги. Синхронный
+    код потока выполняется в собственном потоке соединения (ThreadSensitiveContext)
+    с отдельным соединением с базой данных, поэтому данные теста фиксируются
+    '''
+    def setUp(self) -> None:
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book = Book.default_manager.create(owner=self.user, title='Книга', author=author)
+        self.old = Comment.active.create(owner=self.user, book=self.book, text='Старый')
+        self.url = f'/api/v1/async/books/{self.book.id}/comments/'
+
+    def _create_comment(self, text: str) -> Comment:
+        return Comment.active.create(owner=self.user, book=self.book, text=text)
+
+    async def _open_stream(self, query: str, headers=()) -> ApplicationCommunicator:
+        django_app = sync_to_async(lambda *args: None)
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': self.url + 'stream/', 'query_string': query.encode(),
+            'headers': list(headers),
+        }
+        communicator = ApplicationCommunicator(CommentEventStream(django_app), scope)
+        await communicator.send_input({'type': 'http.request'})
+        return communicator
+
+    async def _stream_token(self) -> str:
+        response = await AsyncClient().get(self.url + 'stream/token/', authorization='Token ' + self.token.key)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['token']
+
+    @override_settings(EVENTS_HEARTBEAT=0.05, METRICS_SAMPLE_RATE=1)
+    async def test_stream(self):
+        registry.clear()
+        communicator = await self._open_stream(f'token={await self._stream_token()}&since=')
+        start = await communicator.receive_output(5)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream; charset=utf-8'), start['headers'])
+        ready = (await communicator.receive_output(5))['body'].decode()
+        self.assertTrue(ready.startswith('id: ') and '\nevent: ready\n' in ready)
+        self.assertEqual((await communicator.receive_output(5))['body'], b': ping\n\n')
+
+        comment = await sync_to_async(self._create_comment)('Новый')
+        body = b''
+        while b'event: created' not in body:
+            body = (await communicator.receive_output(5))['body']
+        data = json.loads(body.decode().split('data: ', 1)[1])
+        self.assertEqual((data['id'], data['text']), (comment.id, 'Новый'))
+
+        # Комментарий из другого процесса (без события брокера) приходит с очередным heartbeat
+        other = await sync_to_async(Comment.active.create)(owner=self.user, book=self.book, text='Другой процесс')
+        body = b''
+        while b'event: created' not in body:
+            body = (await communicator.receive_output(5))['body']
+        self.assertEqual(json.loads(body.decode().split('data: ', 1)[1])['id'], other.id)
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+        labels = (('view', 'library_1_0:async_comment_stream'), ('method', 'GET'), ('status', '200'))
+        self.assertEqual(registry.collect()[('http_requests_total', labels)], 1)
+
+    @override_settings(EVENTS_HEARTBEAT=0.02)
+    async def test_stream_heartbeat_without_changes(self):
+        communicator = await self._open_stream('since=', [(b'authorization', f'Token {self.token.key}'.encode())])
+        await communicator.receive_output(5)
+        await communicator.receive_output(5)
+        # Без изменений комментариев книги heartbeat не обращается к базе данных
+        with mock.patch.object(event_stream, 'poll_book_comments', wraps=event_stream.poll_book_comments) as poll:
+            for _ in range(3):
+                self.assertEqual((await communicator.receive_output(5))['body'], b': ping\n\n')
+        self.assertEqual(poll.call_count, 0)
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    async def test_stream_replay(self):
+        new = await sync_to_async(Comment.active.create)(owner=self.user, book=self.book, text='Пропущенный')
+        last_event_id = CommentsKeysetPagination.encode_since(self.old.created_at, self.old.id)
+        communicator = await self._open_stream('', [(b'authorization', f'Token {self.token.key}'.encode()),
+                                                    (b'last-event-id', last_event_id.encode())])
+        await communicator.receive_output(5)
+        replay = (await communicator.receive_output(5))['body'].decode()
+        since = CommentsKeysetPagination.encode_since(new.created_at, new.id)
+        self.assertTrue(replay.startswith(f'id: {since}\nevent: created\n'))
+        self.assertEqual(json.loads(replay.split('data: ', 1)[1])['id'], new.id)
+        self.assertIn(f'id: {since}\nevent: ready', (await communicator.receive_output(5))['body'].decode())
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+
+    @override_settings(EVENTS_HEARTBEAT=0.02)
+    async def test_stream_book_deleted(self):
+        communicator = await self._open_stream('since=', [(b'authorization', f'Token {self.token.key}'.encode())])
+        self.assertEqual((await communicator.receive_output(5))['status'], 200)
+        self.assertIn(b'event: ready', (await communicator.receive_output(5))['body'])
+        # Удаление книги меняет версию кэша её комментариев: очередной heartbeat получает 404 и закрывает поток
+        await sync_to_async(self.book.soft_delete)()
+        message = await communicator.receive_output(5)
+        while message['more_body']:
+            message = await communicator.receive_output(5)
+        self.assertEqual(message['body'], b'')
+        await communicator.wait(5)
+
+    async def test_stream_unauthorized(self):
+        other_book = await sync_to_async(Book.default_manager.create)(owner=self.user, title='Другая',
+                                                                      author=self.book.author)
+        response = await AsyncClient().get(f'/api/v1/async/books/{other_book.id}/comments/stream/token/',
+                                           authorization='Token ' + self.token.key)
+        # Постоянный токен и токен потока другой книги в адресе не принимаются
+        for query in ('since=', f'token={self.token.key}', f'token={json.loads(response.content)["token"]}'):
+            communicator = await self._open_stream(query)
+            start = await communicator.receive_output(5)
+            self.assertEqual(start['status'], 401)
+            await communicator.wait(5)
@@ -0,0 +1,75 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from library.models import Genre, Author, Book, Library, Comment
+from library.tests.base import AuthenticatedAPITestCase
+
+
+class TestExpandAPIViews(AuthenticatedAPITestCase):
+    '''
+    Тестирует разворачивание связанных объектов (?expand=) и постоянство
+    числа запросов к базе данных
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        self.library = Library.objects.create(title='Библиотека', address='Дом и улица', working_hours='09:00-18:00')
+        self.genre = Genre.objects.create(title='Жанр')
+        self.author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book = self._create_books(1)[0]
+
+    def _create_books(self, count: int) -> list:
+        books = []
+        for i in range(count):
+            book = Book.default_manager.create(owner=self.user, title=f'Книга {i}', year=1510, library=self.library,
+                                               author=self.author, genre=self.genre)
+            Comment.active.create(owner=self.user, book=book, text='Тест')
+            books.append(book)
+        return books
+
+    def _count_queries(self, url: str) -> int:
+        # Прогрев кэша аутентификации, чтобы сравнивать только запросы представления
+        self.client.get('/api/v1/genres/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_expand_book(self):
+        response = self.client.get(f'/api/v1/books/{self.book.id}/?expand=author,genre,library,owner')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {
+            'title': 'Книга 0',
+            'year': 1510,
+            'comments_count': 0,
+            'last_comment_at': None,
+            'author': {'id': self.author.id, 'full_name': 'Автор', 'birthday': 1495},
+            'genre': {'id': self.genre.id, 'title': 'Жанр'},
+            'owner': {'id': self.user.id, 'username': 'user1'},
+            'library': {'id': self.library.id, 'title': 'Библиотека', 'address': 'Дом и улица',
+                        'working_hours': '09:00-18:00'},
+        })
+
+    def test_expand_comment(self):
+        response = self.client.get(f'/api/v1/books/{self.book.id}/comments/?expand=book,owner')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        comment = json.loads(response.content)['results'][0]
+        self.assertEqual(comment['owner'], {'id': self.user.id, 'username': 'user1'})
+        self.assertEqual(comment['book']['title'], 'Книга 0')
+        self.assertEqual(comment['book']['author'], self.author.id)
+
+    def test_expand_unknown_field(self):
+        response = self.client.get('/api/v1/books/?expand=comments')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_constant_query_count(self):
+        self._create_books(9)
+        for url in ('/api/v1/books/?page_size={}',
+                    '/api/v1/books/?page_size={}&expand=author,genre,library,owner'):
+            self.assertEqual(self._count_queries(url.format(2)), self._count_queries(url.format(10)))
+        for i in range(9):
+            Comment.active.create(owner=self.user, book=self.book, text='Тест')
+        url = f'/api/v1/books/{self.book.id}/comments/?expand=book,owner&page_size={{}}'
+        self.assertEqual(self._count_queries(url.format(2)), self._count_queries(url.format(10)))
@@ -0,0 +1,55 @@
+import csv
+import gzip
+import io
+import json
+
+from rest_framework import status
+
+from library.models import Author, Book, Comment
+from library.services.export_services import export_catalog
+from library.tests.base import AuthenticatedAPITestCase
+
+
+class TestCatalogExport(AuthenticatedAPITestCase):
+    '''
+    Тестирует потоковую выгрузку каталога
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        self.author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book_1 = Book.default_manager.create(owner=self.user, title='Книга 1', year=1510, author=self.author)
+        self.book_2 = Book.default_manager.create(owner=self.user, title='Книга 2', author=self.author)
+        self.comment = Comment.active.create(owner=self.user, book=self.book_1, text='Текст, с "кавычками"')
+
+    def _get(self, query: str) -> bytes:
+        response = self.client.get(f'/api/v1/books/export/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson(self):
+        lines = self._get('').decode().splitlines()
+        books = [json.loads(line) for line in lines]
+        self.assertEqual([book['title'] for book in books], ['Книга 1', 'Книга 2'])
+        self.assertEqual(books[0]['comments'][0]['text'], 'Текст, с "кавычками"')
+        self.assertEqual(books[0]['comments'][0]['id'], self.comment.id)
+        self.assertEqual(books[1]['comments'], [])
+
+    def test_csv_with_filter(self):
+        rows = list(csv.reader(io.StringIO(self._get('export_format=csv&year_from=1500').decode())))
+        self.assertEqual(rows[0][:3], ['book_id', 'title', 'year'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1], 'Книга 1')
+        self.assertEqual(rows[1][9], 'Текст, с "кавычками"')
+
+    def test_gzip(self):
+        content = gzip.decompress(self._get('compress=gzip'))
+        self.assertEqual(len(content.decode().splitlines()), 2)
+
+    def test_small_batches(self):
+        content = b''.join(export_catalog(batch_size=1)).decode()
+        self.assertEqual(len(content.splitlines()), 2)
+
+    def test_invalid_format(self):
+        response = self.client.get('/api/v1/books/export/?export_format=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from library.fast_serializers import get_values_plan
+from library.models import Author, Book, Comment, Genre, Library
+from library.tests.base import AuthenticatedAPITestCase
+from library.versions.v_1_0.serializers import BookSerializer, CommentSerializer, OwnerSerializer
+
+
+class TestFastSerialization(AuthenticatedAPITestCase):
+    '''
+    Тестирует побайтное совпадение ответов быстрого и обычного режимов
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        library = Library.objects.create(title='Библиотека', address='Дом и улица', working_hours='09:00-18:00')
+        genre = Genre.objects.create(title='Жанр "в кавычках"')
+        authors = [Author.objects.create(full_name=f'Автор {i} ', birthday=1495 + i) for i in range(3)]
+        for i in range(12):
+            book = Book.default_manager.create(
+                title=f'Книга {i} \\ «{i}»', year=1500 + i % 4, author=authors[i % 3],
+                genre=genre if i % 2 else None, library=library if i % 3 else None,
+                owner=self.user if i % 4 else None
+            )
+            for j in range(i % 3):
+                Comment.active.create(owner=self.user if j else None, book=book, text=f'Комментарий {j}\n')
+        self.book = Book.default_manager.order_by('id').last()
+
+    def assertSameContent(self, path: str):
+        cache.clear()
+        with override_settings(API_FAST_SERIALIZATION=True):
+            fast = self.client.get(path)
+        cache.clear()
+        with override_settings(API_FAST_SERIALIZATION=False):
+            regular = self.client.get(path)
+        self.assertEqual(fast.status_code, regular.status_code)
+        self.assertEqual(fast.content, regular.content)
+        return fast
+
+    def test_same_content(self):
+        self.assertSameContent('/api/v1/books/')
+        self.assertSameContent('/api/v1/books/?page_size=5&ordering=-year')
+        self.assertSameContent('/api/v1/books/?expand=library,author,genre,owner&ordering=title')
+        self.assertSameContent('/api/v1/books/?genre=1&year_from=1501')
+        self.assertSameContent(f'/api/v1/books/{self.book.id}/comments/?expand=book,owner')
+        self.assertSameContent(f'/api/v1/books/{self.book.id}/comments/?page_size=1')
+        self.assertSameContent('/api/v1/genres/')
+        self.assertSameContent('/api/v1/authors/')
+        self.assertSameContent('/api/v1/async/books/?expand=owner&page_size=3')
+        self.assertSameContent(f'/api/v1/async/books/{self.book.id}/comments/?expand=owner')
+        self.assertSameContent('/api/v1/books/?indent=2')
+
+    @mock.patch('library.renderers.orjson', None)
+    def test_same_content_without_orjson(self):
+        self.assertSameContent('/api/v1/books/?expand=owner')
+        self.assertSameContent(f'/api/v1/books/{self.book.id}/comments/')
+
+    def test_cursor_pages(self):
+        path = '/api/v1/books/?page_size=5&ordering=-year'
+        while path:
+            response = self.assertSameContent(path)
+            path = response.json()['next']
+
+    def test_plan(self):
+        plan = get_values_plan(CommentSerializer, ['owner'])
+        self.assertEqual(plan.lookups, ['id', 'text', 'created_at', 'owner', 'owner__id', 'owner__username', 'book'])
+        self.assertIs(get_values_plan(BookSerializer), get_values_plan(BookSerializer, ()))
+        self.assertIsNotNone(get_values_plan(OwnerSerializer))
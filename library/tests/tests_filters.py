@@ -0,0 +1,102 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from library.models import Genre, Author, Book, Library
+from library.tests.base import AuthenticatedAPITestCase, create_user
+
+
+class TestBooksFilters(AuthenticatedAPITestCase):
+    '''
+    Тестирует фильтрацию, поиск и сортировку книг
+    '''
+    def setUp(self) -> None:
+        super().setUp()
+        self.user_2 = create_user('user2', 'pass2')
+        self.library = Library.objects.create(title='Библиотека', address='Дом и улица', working_hours='09:00-18:00')
+        self.genre_1 = Genre.objects.create(title='Жанр 1')
+        self.genre_2 = Genre.objects.create(title='Жанр 2')
+        self.author_1 = Author.objects.create(full_name='Автор 1', birthday=1800)
+        self.author_2 = Author.objects.create(full_name='Автор 2', birthday=1900)
+        books = [
+            ('Война и мир', 1869, self.author_1, self.genre_1, self.user, self.library),
+            ('Воскресение', 1899, self.author_1, self.genre_2, self.user_2, None),
+            ('Мастер и Маргарита', 1967, self.author_2, self.genre_1, self.user, self.library),
+        ]
+        for title, year, author, genre, owner, library in books:
+            Book.default_manager.create(title=title, year=year, author=author, genre=genre, owner=owner,
+                                        library=library)
+
+    def _titles(self, query: str) -> list:
+        response = self.client.get(f'/api/v1/books/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book['title'] for book in json.loads(response.content)['results']]
+
+    def test_filter_by_relations(self):
+        self.assertEqual(self._titles(f'author={self.author_1.id}'), ['Война и мир', 'Воскресение'])
+        self.assertEqual(self._titles(f'genre={self.genre_1.id}'), ['Война и мир', 'Мастер и Маргарита'])
+        self.assertEqual(self._titles(f'genre={self.genre_1.id},{self.genre_2.id}&author={self.author_2.id}'),
+                         ['Мастер и Маргарита'])
+        self.assertEqual(self._titles(f'library={self.library.id}'), ['Война и мир', 'Мастер и Маргарита'])
+        self.assertEqual(self._titles(f'owner={self.user_2.id}'), ['Воскресение'])
+
+    def test_filter_by_year_range(self):
+        self.assertEqual(self._titles('year_from=1869&year_to=1900'), ['Война и мир', 'Воскресение'])
+        self.assertEqual(self._titles('year_from=1900'), ['Мастер и Маргарита'])
+
+    def test_search(self):
+        self.assertEqual(self._titles('title=Во'), ['Война и мир', 'Воскресение'])
+        self.assertEqual(self._titles('title=во'), [])
+        self.assertEqual(self._titles('search=ргар'), ['Мастер и Маргарита'])
+
+    def test_ordering(self):
+        self.assertEqual(self._titles('ordering=-year'), ['Мастер и Маргарита', 'Воскресение', 'Война и мир'])
+        self.assertEqual(self._titles('ordering=title&page_size=2'), ['Война и мир', 'Воскресение'])
+
+    def _pages(self, url: str, link: str = 'next') -> tuple:
+        '''
+        Книги всех страниц по ссылкам link и последняя страница
+        '''
+        books = []
+        while url:
+            page = json.loads(self.client.get(url).content)
+            books += page['results'] if link == 'next' else page['results'][::-1]
+            url = page[link]
+        return books, page
+
+    def test_ordering_pages(self):
+        # Книги с равными значениями поля сортировки не теряются и не повторяются между страницами
+        for i in range(5):
+            Book.default_manager.create(title=f'Книга {i}', year=2000, author=self.author_1, owner=self.user)
+            Book.default_manager.create(title='Книга', year=2001 + i, author=self.author_1, owner=self.user)
+        for ordering in ('year', '-year', 'title', '-title'):
+            with self.subTest(ordering=ordering):
+                with CaptureQueriesContext(connection) as context:
+                    books, _ = self._pages(f'/api/v1/books/?ordering={ordering}&page_size=2')
+                self.assertEqual(len({(book['title'], book['year']) for book in books}), 13)
+                self.assertEqual(len(books), 13)
+                tiebreaker = '"books"."id" DESC' if ordering.startswith('-') else '"books"."id" ASC'
+                self.assertIn(tiebreaker, context.captured_queries[-1]['sql'].rsplit('ORDER BY', 1)[1])
+
+    def test_ordering_pages_many_ties(self):
+        # Равных значений больше, чем допускает смещение курсора CursorPagination (offset_cutoff)
+        Book.default_manager.bulk_create([Book(title=f'Книга {i}', year=2000 if i < 1200 else None,
+                                               author=self.author_1) for i in range(1205)])
+        for ordering in ('year', '-year'):
+            with self.subTest(ordering=ordering):
+                expected = list(Book.active.order_by(ordering, ordering.replace('year', 'id'))
+                                .values_list('title', flat=True))
+                with CaptureQueriesContext(connection) as context:
+                    books, page = self._pages(f'/api/v1/books/?ordering={ordering}&page_size=400')
+                self.assertEqual([book['title'] for book in books], expected)
+                self.assertFalse(any('OFFSET' in query['sql'] for query in context.captured_queries))
+                # По ссылкам previous с последней страницы — остальные книги в обратном порядке
+                books, _ = self._pages(page['previous'], link='previous')
+                self.assertEqual([book['title'] for book in books], expected[-len(page['results']) - 1::-1])
+
+    def test_invalid_filter(self):
+        for query in ('author=abc', 'year_from=1869,1900', 'year_to=abc'):
+            response = self.client.get(f'/api/v1/books/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
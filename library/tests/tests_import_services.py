@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+
+from django.test import TestCase
+
+from library.models import Author, Book
+from library.services.import_services import (
+    BoundedCache, CatalogFormatError, CatalogImporter, Checkpoint, iter_json_records
+)
+
+
+class TestIterJsonRecords(TestCase):
+    '''
+    Тестирует потоковое чтение JSON-массивов и JSON Lines
+    '''
+    def test_json_array(self):
+        stream = io.StringIO('[ {"a": 1}, {"b": "}, ]"} ,\n{"c": [1, 2]} ]')
+        records = list(iter_json_records(stream, chunk_size=3))
+        self.assertEqual(records, [{'a': 1}, {'b': '}, ]'}, {'c': [1, 2]}])
+
+    def test_json_lines(self):
+        stream = io.StringIO('{"a": 1}\n\n{"b": 2}\n')
+        self.assertEqual(list(iter_json_records(stream, chunk_size=4)), [{'a': 1}, {'b': 2}])
+
+    def test_empty(self):
+        self.assertEqual(list(iter_json_records(io.StringIO(''))), [])
+        self.assertEqual(list(iter_json_records(io.StringIO(' [ ] '))), [])
+
+    def test_broken(self):
+        with self.assertRaises(CatalogFormatError):
+            list(iter_json_records(io.StringIO('[{"a": 1}, {"b": ')))
+        with self.assertRaises(CatalogFormatError):
+            list(iter_json_records(io.StringIO('{"a": 1}'), fmt='json'))
+
+
+class TestBoundedCache(TestCase):
+    '''
+    Тестирует ограниченный LRU-кэш
+    '''
+    def test_eviction(self):
+        cache = BoundedCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(len(cache), 2)
+
+
+class TestCatalogImporter(TestCase):
+    '''
+    Тестирует пакетный импорт каталога
+    '''
+    records = [
+        {'title': 'Книга 1', 'author': 'Автор 1', 'year': 1900},
+        {'title': 'Книга 2', 'author': 'Автор 2', 'year': 1910},
+        {'title': 'Книга 3', 'author': 'Автор 1', 'year': 1920},
+        {'title': 'Без автора'},
+    ]
+
+    def test_import_dedupes_authors(self):
+        Author.objects.create(full_name='Автор 2', birthday=1880)
+        progress = CatalogImporter(batch_size=2, cache_size=1).run(self.records)
+        self.assertEqual(progress.books, 3)
+        self.assertEqual(progress.authors, 1)
+        self.assertEqual(progress.skipped, 1)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Book.default_manager.filter(author__full_name='Автор 1').count(), 2)
+
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = Checkpoint(os.path.join(tmp_dir, 'checkpoint.json'), 'catalog.json')
+            checkpoint.save(2)
+            progress = CatalogImporter(batch_size=10).run(self.records, checkpoint)
+            self.assertFalse(os.path.exists(checkpoint.path))
+        self.assertEqual(progress.records, 4)
+        self.assertEqual(list(Book.default_manager.values_list('title', flat=True)), ['Книга 3'])
@@ -0,0 +1,199 @@
+import json
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from library.models import Author, Book, Comment, Job, JobStatus
+from library.services.job_services import (
+    claim_jobs, enqueue, execute_job, requeue_stale_jobs, task, UnknownTask, Worker
+)
+from library.tests.base import create_user, set_token
+
+calls = []
+
+
+@task(name='tests.record', retry_delay=0)
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.sleep')
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+@task(name='tests.fail', max_attempts=2, retry_delay=60)
+def fail():
+    raise RuntimeError('Ошибка задачи')
+
+
+@task(name='tests.reclaimed')
+def reclaimed():
+    # Пока задача выполняется, её считают зависшей и забирает другой обработчик
+    Job.objects.filter(name='tests.reclaimed').update(heartbeat_at=timezone.now() - timedelta(hours=1))
+    requeue_stale_jobs(timeout=600)
+    claim_jobs('other', 10)
+
+
+class TestJobQueue(TestCase):
+    '''
+    Тестирует очередь фоновых задач: постановку, повторы и идемпотентность
+    '''
+    def setUp(self) -> None:
+        calls.clear()
+
+    def test_idempotency_key(self):
+        first = enqueue('tests.record', {'value': 1}, idempotency_key='record:1')
+        second = enqueue('tests.record', {'value': 2}, idempotency_key='record:1')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+        # Завершённая задача освобождает ключ: повторная постановка создаёт новую задачу
+        claim_jobs('test', 10)
+        execute_job(first.pk)
+        third = enqueue('tests.record', {'value': 3}, idempotency_key='record:1')
+        self.assertNotEqual(third.pk, first.pk)
+        self.assertEqual(third.payload, {'value': 3})
+        self.assertEqual(enqueue('tests.record', idempotency_key='record:1').pk, third.pk)
+        first.refresh_from_db()
+        self.assertIsNone(first.idempotency_key)
+
+    def test_unknown_task(self):
+        with self.assertRaises(UnknownTask):
+            enqueue('tests.unknown')
+
+    def test_rollback_drops_job(self):
+        with transaction.atomic():
+            enqueue('tests.record', {'value': 1})
+            transaction.set_rollback(True)
+        self.assertFalse(Job.objects.exists())
+
+    def test_execute(self):
+        job = enqueue('tests.record', {'value': 'a'})
+        self.assertEqual(claim_jobs('test', 10), [job.pk])
+        self.assertEqual(claim_jobs('test', 10), [])
+        self.assertEqual(execute_job(job.pk), JobStatus.DONE)
+        self.assertEqual(calls, ['a'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.worker), (JobStatus.DONE, 1, 'test'))
+
+    def test_retries(self):
+        job = enqueue('tests.fail')
+        claim_jobs('test', 10)
+        with self.assertLogs('library.services.job_services', 'ERROR'):
+            self.assertEqual(execute_job(job.pk), JobStatus.QUEUED)
+        job.refresh_from_db()
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=50))
+        self.assertIn('Ошибка задачи', job.last_error)
+        self.assertEqual(claim_jobs('test', 10), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        claim_jobs('test', 10)
+        with self.assertLogs('library.services.job_services', 'ERROR'):
+            self.assertEqual(execute_job(job.pk), JobStatus.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 2))
+
+    def test_requeue_stale(self):
+        job = enqueue('tests.record', {'value': 1})
+        claim_jobs('test', 10)
+        # Долгая задача с недавним сигналом обработчика остаётся выполняемой
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(timeout=600), 0)
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(timeout=600), 1)
+        self.assertEqual(claim_jobs('test', 10), [job.pk])
+
+    def test_lost_lease(self):
+        job = enqueue('tests.reclaimed')
+        claim_jobs('test', 10)
+        with self.assertLogs('library.services.job_services', 'WARNING'):
+            self.assertIsNone(execute_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts), (JobStatus.RUNNING, 'other', 2))
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            job = enqueue('tests.record', {'value': 'eager'})
+        self.assertEqual(calls, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(calls, ['eager'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.DONE)
+
+
+class TestWorker(TransactionTestCase):
+    '''
+    Тестирует обработчик очереди с пулом потоков и продление аренды задач
+    '''
+    @override_settings(JOBS_HEARTBEAT_INTERVAL=0.05)
+    def test_heartbeat(self):
+        job = enqueue('tests.sleep', {'seconds': 0.3})
+        claim_jobs('test', 10)
+        started_at = Job.objects.get(pk=job.pk).heartbeat_at
+        self.assertEqual(execute_job(job.pk), JobStatus.DONE)
+        self.assertGreater(Job.objects.get(pk=job.pk).heartbeat_at, started_at + timedelta(seconds=0.1))
+
+    def test_run_once(self):
+        calls.clear()
+        for value in range(5):
+            enqueue('tests.record', {'value': value})
+        enqueue('tests.fail')
+        with self.assertLogs('library.services.job_services', 'ERROR'):
+            totals = Worker(concurrency=2, poll_interval=0).run(once=True)
+        self.assertEqual(totals, {JobStatus.DONE: 5, JobStatus.QUEUED: 1})
+        self.assertEqual(sorted(calls), list(range(5)))
+
+    def test_run_claims_free_slots(self):
+        # Короткие задачи выполняются на свободном исполнителе, не дожидаясь долгой задачи из той же пачки
+        slow = enqueue('tests.sleep', {'seconds': 0.5})
+        for value in range(4):
+            enqueue('tests.record', {'value': value})
+        totals = Worker(concurrency=2, poll_interval=0.05).run(once=True)
+        self.assertEqual(totals, {JobStatus.DONE: 5})
+        slow.refresh_from_db()
+        self.assertFalse(Job.objects.filter(name='tests.record', finished_at__gte=slow.finished_at).exists())
+
+
+class TestBackgroundDelete(APITestCase):
+    '''
+    Тестирует фоновое удаление автора через API
+    '''
+    def setUp(self) -> None:
+        self.admin = create_user('admin', 'pass', is_staff=True)
+        self.user = create_user('user', 'pass')
+        self.admin_token = Token.objects.create(user=self.admin)
+        self.user_token = Token.objects.create(user=self.user)
+        self.author = Author.objects.create(full_name='Автор', birthday=1495)
+        book = Book.default_manager.create(owner=self.user, title='Книга', author=self.author)
+        Comment.active.create(owner=self.user, book=book, text='Комментарий')
+
+    def test_delete_author(self):
+        set_token(self.client, self.user_token)
+        response = self.client.delete(f'/api/v1/authors/{self.author.id}/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        set_token(self.client, self.admin_token)
+        response = self.client.delete(f'/api/v1/authors/{self.author.id}/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = json.loads(response.content)
+        self.assertEqual(response['Location'], f'http://testserver/api/v1/jobs/{job["id"]}/')
+        self.assertTrue(Author.objects.filter(pk=self.author.id).exists())
+        repeated = json.loads(self.client.delete(f'/api/v1/authors/{self.author.id}/').content)
+        self.assertEqual(repeated['id'], job['id'])
+
+        claim_jobs('test', 10)
+        execute_job(job['id'])
+        self.assertFalse(Author.objects.exists())
+        self.assertFalse(Book.default_manager.exists())
+        self.assertFalse(Comment.default_manager.exists())
+        response = self.client.get(response['Location'])
+        self.assertEqual(json.loads(response.content)['status'], JobStatus.DONE.label)
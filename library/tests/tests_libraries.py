@@ -0,0 +1,103 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from library.authentication import TokenCache
+from library.models import Author, Book, Genre, Library
+from library.services.catalog_services import library_books
+
+
+class TestLibraryAPI(APITestCase):
+    '''
+    Тестирует каталог библиотеки и сводки по её фонду
+    '''
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = get_user_model().objects.create(username='user1', password='pass1')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.library = Library.objects.create(title='Библиотека', address='Адрес', working_hours='09:00 - 18:00')
+        other = Library.objects.create(title='Другая', address='Адрес', working_hours='09:00 - 18:00')
+        self.novel = Genre.objects.create(title='Роман')
+        poetry = Genre.objects.create(title='Поэзия')
+        self.author_1 = Author.objects.create(full_name='Автор 1', birthday=1800)
+        author_2 = Author.objects.create(full_name='Автор 2', birthday=1900)
+        books = [
+            (self.novel, self.author_1, 1851), (self.novel, self.author_1, 1859), (self.novel, author_2, 1860),
+            (poetry, author_2, 1905), (None, author_2, None),
+        ]
+        self.books = [Book.default_manager.create(owner=self.user, title=f'Книга {i}', year=year, genre=genre,
+                                                  author=author, library=self.library)
+                      for i, (genre, author, year) in enumerate(books)]
+        Book.default_manager.create(owner=self.user, title='Чужая', year=1850, genre=poetry, author=author_2,
+                                    library=other)
+        self.url = f'/api/v1/libraries/{self.library.id}/'
+
+    def _get(self, url: str, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)
+
+    def test_catalog(self):
+        self.assertEqual(len(self._get('/api/v1/libraries/')['results']), 2)
+        self.assertEqual(self._get(self.url)['title'], 'Библиотека')
+        catalog = self._get(self.url + 'books/', genre=self.novel.id, ordering='-year', expand='genre')
+        self.assertEqual([book['year'] for book in catalog['results']], [1860, 1859, 1851])
+        self.assertEqual(catalog['results'][0]['genre'], {'id': self.novel.id, 'title': 'Роман'})
+
+    def test_genres(self):
+        self.books[3].set_status(1)
+        data = self._get(self.url + 'genres/')
+        self.assertEqual(data, {'library': self.library.id, 'results': [
+            {'id': self.novel.id, 'title': 'Роман', 'books': 3},
+            {'id': None, 'title': None, 'books': 1},
+        ]})
+
+    def test_authors(self):
+        results = self._get(self.url + 'authors/', limit=1)['results']
+        self.assertEqual(results, [{'id': self.books[2].author_id, 'full_name': 'Автор 2', 'books': 3}])
+        response = self.client.get(self.url + 'authors/', {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_years(self):
+        self.assertEqual(self._get(self.url + 'years/')['results'], [
+            {'from': None, 'to': None, 'books': 1},
+            {'from': 1850, 'to': 1859, 'books': 2},
+            {'from': 1860, 'to': 1869, 'books': 1},
+            {'from': 1900, 'to': 1909, 'books': 1},
+        ])
+        self.assertEqual(self._get(self.url + 'years/', bucket=100)['results'][1:],
+                         [{'from': 1800, 'to': 1899, 'books': 3}, {'from': 1900, 'to': 1999, 'books': 1}])
+
+    @mock.patch.object(TokenCache, 'process_local', False)
+    def test_cache_invalidation(self):
+        self.assertEqual(self._get(self.url + 'genres/')['results'][0]['books'], 3)
+        with self.assertNumQueries(0):
+            self._get(self.url + 'genres/')
+        Book.default_manager.create(owner=self.user, title='Новая', genre=self.novel, author=self.author_1,
+                                    library=self.library)
+        self.assertEqual(self._get(self.url + 'genres/')['results'][0]['books'], 4)
+
+        self.books[0].library = None
+        self.books[0].save()
+        self.assertEqual(self._get(self.url + 'genres/')['results'][0]['books'], 3)
+
+    def test_missing_library(self):
+        response = self.client.get('/api/v1/libraries/0/genres/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_genre_summary_uses_index(self):
+        queryset = library_books(self.library.id).values('genre_id').annotate(books=Count('id'))
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('books_lib_genre_published_idx (library_id=?)', plan)
+        self.assertNotIn('GROUP BY', plan)
@@ -0,0 +1,106 @@
+import gc
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings, SimpleTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from library.models import Genre
+from library.services.metrics_services import MetricsRegistry, registry
+
+
+class TestMetricsRegistry(SimpleTestCase):
+    '''
+    Тестирует суммирование метрик, записанных разными потоками
+    '''
+    def test_collect(self):
+        metrics = MetricsRegistry()
+        labels = (('view', 'books'),)
+
+        def write():
+            for _ in range(1000):
+                metrics.inc('http_requests_total', labels)
+                metrics.observe('http_request_queries', labels, 3)
+
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        collected = metrics.collect()
+        self.assertEqual(collected[('http_requests_total', labels)], 4000)
+        histogram = collected[('http_request_queries', labels)]
+        self.assertEqual(histogram[-1], 4000)
+        self.assertEqual(histogram[-2], 12000)
+        self.assertEqual(histogram[3], 4000)
+
+    def test_finished_threads(self):
+        metrics = MetricsRegistry()
+        labels = (('view', 'books'),)
+        for _ in range(10):
+            thread = threading.Thread(target=metrics.inc, args=('http_requests_total', labels))
+            thread.start()
+            thread.join()
+        gc.collect()
+        # Значения завершившихся потоков сохраняются, а их наборы удаляются
+        self.assertEqual(metrics.shards_count(), 0)
+        self.assertEqual(metrics.collect()[('http_requests_total', labels)], 10)
+
+
+@override_settings(METRICS_PUBLIC=True)
+class TestMetricsMiddleware(APITestCase):
+    '''
+    Тестирует сбор метрик запросов и их выгрузку
+    '''
+    def setUp(self) -> None:
+        cache.clear()
+        registry.clear()
+        self.user = get_user_model().objects.create(username='user1', password='pass1')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        Genre.objects.create(title='Жанр')
+
+    def test_metrics(self):
+        self.client.get('/api/v1/genres/')
+        self.client.get('/api/v1/genres/')
+        self.client.get('/api/v1/books/999/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        labels = 'view="library_1_0:genres-list",method="GET"'
+        self.assertIn(f'http_requests_total{{{labels},status="200"}} 2', text)
+        self.assertIn('http_requests_total{view="library_1_0:books-detail",method="GET",status="404"} 1', text)
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'http_request_queries_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f'http_response_size_bytes_count{{{labels}}} 2', text)
+        self.assertIn('api_response_cache_total{view="library_1_0:genres-list",result="hit"} 1', text)
+        self.assertIn('api_response_cache_total{view="library_1_0:genres-list",result="miss"} 1', text)
+        self.assertIn('token_cache_lookups_total{result="hit"}', text)
+
+    @override_settings(METRICS_QUERY_BUDGET=0)
+    def test_query_budget(self):
+        with self.assertLogs('library.middleware', 'WARNING') as logs:
+            self.client.get('/api/v1/genres/')
+        self.assertIn('/api/v1/genres/', logs.output[0])
+        self.assertIn('http_request_query_budget_exceeded_total{view="library_1_0:genres-list",method="GET"} 1',
+                      self.client.get('/metrics').content.decode())
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling(self):
+        self.client.get('/api/v1/genres/')
+        self.assertNotIn('genres-list', self.client.get('/metrics').content.decode())
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_PUBLIC=False)
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(get_user_model().objects.create(username='admin', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
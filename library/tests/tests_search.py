@@ -0,0 +1,89 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from library.models import Author, Book, Comment
+from library.services.search_services import SearchIndex
+from library.services.stemmer import stem
+
+
+class TestStemmer(TestCase):
+    '''
+    Тестирует стемминг русских слов
+    '''
+    def test_stem(self):
+        self.assertEqual(stem('книгами'), 'книг')
+        self.assertEqual(stem('Книга'), 'книг')
+        self.assertEqual(stem('содержательный'), 'содержательн')
+        self.assertEqual(stem('вежливость'), 'вежлив')
+        self.assertEqual(stem('ёлка'), 'елк')
+        self.assertEqual(stem('Love'), 'love')
+
+
+class TestSearchAPIView(APITestCase):
+    '''
+    Тестирует полнотекстовый поиск и синхронизацию индекса
+    '''
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create(username='user1', password='pass1')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Михаил Булгаков', birthday=1891)
+        self.book = Book.default_manager.create(title='Мастер и Маргарита', author=self.author, owner=self.user)
+        self.comment = Comment.active.create(book=self.book, owner=self.user, text='Маргарите сочувствуешь')
+
+    def _search(self, query: str) -> dict:
+        response = self.client.get('/api/v1/search/', {'q': query} if isinstance(query, str) else query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)
+
+    def test_search_with_stemming(self):
+        results = self._search('МАРГАРИТОЙ')['results']
+        self.assertEqual({(item['type'], item['id']) for item in results},
+                         {('book', self.book.id), ('comment', self.comment.id)})
+        comment = next(item for item in results if item['type'] == 'comment')
+        self.assertEqual(comment['book'], self.book.id)
+        self.assertEqual(self._search('булгаковым')['results'][0]['type'], 'author')
+
+    def test_search_by_type(self):
+        results = self._search({'q': 'маргарита', 'type': 'comment'})['results']
+        self.assertEqual([item['id'] for item in results], [self.comment.id])
+
+    def test_index_follows_changes(self):
+        self.book.title = 'Белая гвардия'
+        self.book.save()
+        self.assertEqual(self._search({'q': 'маргарита', 'type': 'book'})['results'], [])
+        self.assertEqual(self._search('гвардии')['results'][0]['id'], self.book.id)
+        self.book.delete()
+        self.assertEqual(self._search('маргарита')['results'], [])
+
+    def test_cursor_pagination(self):
+        for i in range(4):
+            Comment.active.create(book=self.book, owner=self.user, text=f'Маргарита {i}')
+        ids = []
+        content = self._search({'q': 'маргарита', 'page_size': 2})
+        while True:
+            ids += [(item['type'], item['id']) for item in content['results']]
+            if not content['next']:
+                break
+            response = self.client.get(content['next'])
+            content = json.loads(response.content)
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get('/api/v1/search/').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/v1/search/', {'q': 'книга', 'type': 'genre'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/v1/search/', {'q': 'книга', 'cursor': 'broken'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild(self):
+        Book.default_manager.bulk_create([Book(title='Собачье сердце', author=self.author)])
+        self.assertEqual(self._search('сердце')['results'], [])
+        self.assertEqual(SearchIndex().rebuild(batch_size=1), 4)
+        self.assertEqual(len(self._search('сердце')['results']), 1)
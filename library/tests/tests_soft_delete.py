@@ -0,0 +1,139 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from backend.base_models import Status
+from library.models import Author, Book, Comment
+from library.services.counter_services import reconcile_books
+from library.services.purge_services import purge_deleted
+from library.services.search_services import SearchIndex
+from library.services.stats_services import daily_comment_stats, rebuild_stats
+
+
+class TestSoftDelete(APITestCase):
+    '''
+    Тестирует пометку книг и комментариев удалёнными, модерацию и
+    физическое удаление пакетами
+    '''
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create(username='user1', password='pass1')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.author = Author.objects.create(full_name='Автор', birthday=1495)
+        self.book = Book.default_manager.create(owner=self.user, title='Книга', author=self.author)
+        self.comments = [
+            Comment.active.create(owner=self.user, book=self.book, text=f'Комментарий {i}') for i in range(5)
+        ]
+        reconcile_books([self.book.id])
+        self.comments_url = f'/api/v1/books/{self.book.id}/comments/'
+
+    def _comment_ids(self) -> list:
+        response = self.client.get(self.comments_url)
+        return [comment['id'] for comment in json.loads(response.content)['results']]
+
+    def test_delete_book_marks_deleted(self):
+        response = self.client.delete(f'/api/v1/books/{self.book.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        book = Book.default_manager.get(pk=self.book.id)
+        self.assertEqual(book.status, Status.DELETED)
+        self.assertIsNotNone(book.deleted_at)
+        self.assertEqual(Comment.default_manager.filter(status=Status.PUBLISHED).count(), 5)
+        self.assertEqual(Comment.active.count(), 0)
+        self.assertEqual(self.client.get(f'/api/v1/books/{self.book.id}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(self.client.get('/api/v1/books/').content)['results'], [])
+        self.assertEqual(SearchIndex().search('Книга', kinds=['book'])[0], [])
+
+        response = self.client.post(self.comments_url, {'book': self.book.id, 'text': 'Ещё'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _visible_comments(self) -> dict:
+        feed = json.loads(self.client.get('/api/v1/comments/?expand=book').content)['results']
+        found = SearchIndex().search('Комментарий', kinds=['comment'])[0]
+        return {'feed': len(feed), 'search': len(found), 'stats': daily_comment_stats(1)[0]['comments']}
+
+    def test_book_status_hides_comments(self):
+        self.assertEqual(self._comment_ids(), [comment.id for comment in self.comments])
+        self.assertEqual(self._visible_comments(), {'feed': 5, 'search': 5, 'stats': 5})
+        for hide in (lambda: self.book.set_status(Status.HIDDEN),
+                     lambda: self.client.delete('/api/v1/books/bulk/', [self.book.id], format='json')):
+            hide()
+            self.assertEqual(self.client.get(self.comments_url).status_code, status.HTTP_404_NOT_FOUND)
+            self.assertEqual(self.client.get(f'/api/v1/async/books/{self.book.id}/comments/').status_code,
+                             status.HTTP_404_NOT_FOUND)
+            self.assertEqual(self._visible_comments(), {'feed': 0, 'search': 0, 'stats': 0})
+            rebuild_stats()
+            self.assertEqual(daily_comment_stats(1)[0]['comments'], 0)
+
+            self.book.set_status(Status.PUBLISHED)
+            self.assertEqual(self._comment_ids(), [comment.id for comment in self.comments])
+            self.assertEqual(self._visible_comments(), {'feed': 5, 'search': 5, 'stats': 5})
+            self.assertEqual(json.loads(self.client.get(f'/api/v1/books/{self.book.id}/').content)['comments_count'],
+                             5)
+
+    def test_delete_comment_marks_deleted(self):
+        comment = self.comments[0]
+        self.assertIn(comment.id, self._comment_ids())
+        response = self.client.delete(f'{self.comments_url}{comment.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertNotIn(comment.id, self._comment_ids())
+        self.assertEqual(Comment.default_manager.get(pk=comment.id).status, Status.DELETED)
+        self.assertEqual(json.loads(self.client.get(f'/api/v1/books/{self.book.id}/').content)['comments_count'], 4)
+
+    def test_bulk_destroy_marks_deleted(self):
+        ids = [comment.id for comment in self.comments[:3]]
+        response = self.client.delete(f'{self.comments_url}bulk/', ids, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._comment_ids(), [comment.id for comment in self.comments[3:]])
+        self.assertEqual(Comment.default_manager.filter(status=Status.DELETED).count(), 3)
+
+    def test_hide_and_publish(self):
+        comment = self.comments[0]
+        self.assertIn(comment.id, self._comment_ids())
+        comment.set_status(Status.HIDDEN)
+        self.assertNotIn(comment.id, self._comment_ids())
+        self.assertIsNone(Comment.default_manager.get(pk=comment.id).deleted_at)
+        comment.set_status(Status.PUBLISHED)
+        self.assertIn(comment.id, self._comment_ids())
+
+    def test_admin_delete_marks_deleted(self):
+        admin = get_user_model().objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.post(f'/admin/library/comment/{self.comments[0].id}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        response = self.client.get('/admin/library/comment/')
+        actions = [name for name, _ in response.context['action_form'].fields['action'].choices]
+        self.assertNotIn('delete_selected', actions)
+        self.assertEqual(Comment.default_manager.count(), 5)
+        self.assertEqual(Comment.default_manager.get(pk=self.comments[0].id).status, Status.DELETED)
+
+    def test_purge_deleted(self):
+        other = Book.default_manager.create(owner=self.user, title='Другая книга', author=self.author)
+        old_comment = Comment.active.create(owner=self.user, book=other, text='Старый')
+        recent_comment = Comment.active.create(owner=self.user, book=other, text='Недавний')
+        old_comment.soft_delete()
+        recent_comment.soft_delete()
+        self.book.soft_delete()
+        old = timezone.now() - timedelta(days=31)
+        Comment.default_manager.filter(pk=old_comment.pk).update(deleted_at=old)
+        Book.default_manager.filter(pk=self.book.pk).update(deleted_at=old)
+
+        purged = purge_deleted(timedelta(days=30), batch_size=2)
+        self.assertEqual(purged, {'books': 1, 'comments': 6})
+        # Комментарии удалённой книги уже вычтены из сводки при её удалении
+        self.assertEqual(daily_comment_stats(1)[0]['comments'], 0)
+        self.assertEqual(list(Book.default_manager.values_list('id', flat=True)), [other.id])
+        self.assertEqual(list(Comment.default_manager.values_list('id', flat=True)), [recent_comment.id])
+
+    def test_partial_index_used(self):
+        queryset = Comment.active.get_book_comments(book_id=self.book.id).order_by('created_at', 'id')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('comments_book_published_idx', plan)
@@ -0,0 +1,47 @@
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from library.models import Genre
+from library.services.sqlite_services import immediate_atomic
+
+
+class TestSQLitePragmas(TestCase):
+    '''
+    Тестирует настройку соединений SQLite
+    '''
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class TestImmediateAtomic(TransactionTestCase):
+    '''
+    Тестирует транзакции, захватывающие блокировку записи при начале
+    '''
+    def test_begin_immediate(self):
+        with CaptureQueriesContext(connection) as context:
+            with immediate_atomic():
+                Genre.objects.create(title='Жанр')
+                with immediate_atomic():
+                    Genre.objects.create(title='Жанр 2')
+            with transaction.atomic():
+                Genre.objects.exists()
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(statements[0], 'BEGIN IMMEDIATE')
+        self.assertEqual(statements.count('BEGIN IMMEDIATE'), 1)
+        self.assertIn('BEGIN', statements)
+        self.assertEqual(Genre.objects.count(), 2)
+
+    def test_rollback(self):
+        with self.assertRaises(ValueError):
+            with immediate_atomic():
+                Genre.objects.create(title='Жанр')
+                raise ValueError
+        self.assertFalse(Genre.objects.exists())
+        self.assertEqual(connection.begin_mode, '')
@@ -0,0 +1,118 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from backend.base_models import Status
+from library.models import Author, Book, Comment, DailyCommentStats, Genre, GenreStats
+from library.services.counter_services import reconcile_book_counters
+from library.services.purge_services import purge_deleted
+from library.services.stats_services import rebuild_stats, top_commented_books
+
+
+class TestStats(APITestCase):
+    '''
+    Тестирует сводные таблицы статистики и их обновление приращениями
+    '''
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create(username='user1', password='pass1')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.novel = Genre.objects.create(title='Роман')
+        self.poetry = Genre.objects.create(title='Поэзия')
+        self.author = Author.objects.create(full_name='Автор', birthday=1800)
+        self.books = [Book.default_manager.create(owner=self.user, title=f'Книга {i}', author=self.author, genre=genre)
+                      for i, genre in enumerate([self.novel, self.novel, self.poetry, None])]
+
+    def _get(self, url: str, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)['results']
+
+    def _genres(self) -> dict:
+        return {row['title']: row['books'] for row in self._get('/api/v1/stats/genres/')}
+
+    def _assert_rebuild_matches(self) -> None:
+        genres = set(GenreStats.objects.filter(books__gt=0).values_list('genre_key', 'books'))
+        days = set(DailyCommentStats.objects.filter(comments__gt=0).values_list('day', 'comments'))
+        rebuild_stats(batch_size=2)
+        self.assertEqual(set(GenreStats.objects.values_list('genre_key', 'books')), genres)
+        self.assertEqual(set(DailyCommentStats.objects.values_list('day', 'comments')), days)
+
+    def test_genres(self):
+        self.assertEqual(self._genres(), {'Роман': 2, 'Поэзия': 1, None: 1})
+        self.books[0].genre = self.poetry
+        self.books[0].save()
+        self.books[1].set_status(Status.HIDDEN)
+        self.books[2].delete()
+        self.assertEqual(self._genres(), {'Поэзия': 1, None: 1})
+        self.books[1].set_status(Status.PUBLISHED)
+        self.poetry.delete()
+        self.assertEqual(self._genres(), {'Роман': 1, None: 2})
+        self._assert_rebuild_matches()
+
+    def test_bulk_books(self):
+        response = self.client.post('/api/v1/books/bulk/', [{'title': 'Новая', 'author': self.author.id,
+                                                               'genre': self.poetry.id}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.patch('/api/v1/books/bulk/', [{'id': self.books[3].id, 'genre': self.novel.id}],
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete('/api/v1/books/bulk/', [self.books[0].id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._genres(), {'Роман': 2, 'Поэзия': 2})
+        self._assert_rebuild_matches()
+
+    def test_comments(self):
+        book = self.books[0]
+        comments = [Comment.active.create(owner=self.user, book=book, text=str(i)) for i in range(3)]
+        response = self.client.post(f'/api/v1/books/{book.id}/comments/bulk/', [{'text': 'Пакет', 'book': book.id}],
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        comments[0].soft_delete()
+        self.client.delete(f'/api/v1/books/{book.id}/comments/bulk/', [comments[1].id], format='json')
+        old = Comment.active.create(owner=self.user, book=book, text='Старый')
+        old.created_at -= timedelta(days=2)
+        old.save()
+
+        results = self._get('/api/v1/stats/comments/', days=3)
+        today = timezone.localdate()
+        self.assertEqual(results, [{'day': str(today - timedelta(days=offset)), 'comments': count}
+                                   for offset, count in ((2, 1), (1, 0), (0, 2))])
+        self._assert_rebuild_matches()
+
+        # Комментарии удалённой книги вычитаются при физическом удалении
+        book.soft_delete()
+        purge_deleted(timedelta(days=-1))
+        self.assertFalse(Comment.default_manager.filter(pk=old.pk).exists())
+        self.assertEqual(DailyCommentStats.objects.filter(comments__gt=0).count(), 0)
+
+    def test_top_books(self):
+        for book, count in zip(self.books, [1, 3, 2, 0]):
+            for i in range(count):
+                Comment.active.create(owner=self.user, book=book, text=str(i))
+        reconcile_book_counters()
+        results = self._get('/api/v1/stats/books/', limit=2)
+        self.assertEqual([(row['id'], row['comments_count']) for row in results],
+                         [(self.books[1].id, 3), (self.books[2].id, 2)])
+        response = self.client.get('/api/v1/stats/books/', {'limit': 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        sql, params = Book.active.order_by('-comments_count', '-id')[:2].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('books_top_published_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertEqual(len(top_commented_books(10)), 4)
+
+    def test_rebuild_command(self):
+        GenreStats.objects.all().delete()
+        call_command('rebuild_stats', batch_size=3, stdout=open('/dev/null', 'w'))
+        self.assertEqual(self._genres(), {'Роман': 2, 'Поэзия': 1, None: 1})
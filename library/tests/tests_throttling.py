@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from library.models import Author, Book
+from library.tests.base import create_user, set_token
+from library.throttling import BucketStore, bucket_store, load_shedder
+
+
+def throttle_rates(**rates) -> dict:
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'read': None, 'write': None,
+                                                                   'endpoint_write': None, **rates}}
+
+
+class TestBucketStore(SimpleTestCase):
+    '''
+    Тестирует корзины токенов в памяти процесса и в общем кэше
+    '''
+    def test_local(self):
+        store = BucketStore(max_size=2)
+        self.assertEqual([store.take('a', 2, 1) for i in range(2)], [0, 0])
+        self.assertAlmostEqual(store.take('a', 2, 1), 1, places=2)
+        self.assertEqual(store.take('b', 2, 1), 0)
+        # Давно не использованная корзина вытесняется и снова заполнена
+        store.take('c', 2, 1)
+        self.assertEqual(store.take('a', 2, 1), 0)
+
+    def test_shared(self):
+        cache.clear()
+        first = BucketStore(max_size=10, shared_alias='default')
+        second = BucketStore(max_size=10, shared_alias='default')
+        self.assertEqual(first.take('a', 1, 0.5), 0)
+        self.assertAlmostEqual(second.take('a', 1, 0.5), 2, places=2)
+
+
+class TestThrottling(APITestCase):
+    '''
+    Тестирует лимиты клиентов и сброс нагрузки на запись в API книг и комментариев
+    '''
+    def setUp(self) -> None:
+        cache.clear()
+        bucket_store.clear()
+        self.users = [create_user(f'user{i}', 'pass') for i in range(2)]
+        self.tokens = [Token.objects.create(user=user) for user in self.users]
+        self.author = Author.objects.create(full_name='Автор', birthday=1800)
+        self.book = Book.default_manager.create(owner=self.users[0], title='Книга', author=self.author)
+        self._login(0)
+
+    def _login(self, index: int) -> None:
+        set_token(self.client, self.tokens[index])
+
+    def _create_book(self):
+        return self.client.post('/api/v1/books/', {'title': 'Новая', 'author': self.author.id}, format='json')
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(read='2/m', write='1/m'))
+    def test_client_rates(self):
+        for i in range(2):
+            self.assertEqual(self.client.get('/api/v1/books/').status_code, status.HTTP_200_OK)
+        response = self.client.get('/api/v1/books/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Изменения, другие представления и другие клиенты ограничиваются отдельно
+        self.assertEqual(self._create_book().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._create_book().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.get(f'/api/v1/books/{self.book.id}/comments/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._login(1)
+        self.assertEqual(self.client.get('/api/v1/books/').status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(read='2/m'))
+    def test_async_views(self):
+        # Асинхронные представления берут токены из тех же корзин, что и синхронные
+        self.assertEqual(self.client.get('/api/v1/books/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/v1/async/books/').status_code, status.HTTP_200_OK)
+        response = self.client.get(f'/api/v1/async/books/{self.book.id}/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        response = self.client.get(f'/api/v1/async/books/{self.book.id}/comments/events/', {'since': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(endpoint_write='1/m'))
+    def test_endpoint_write_rate(self):
+        self.assertEqual(self._create_book().status_code, status.HTTP_201_CREATED)
+        self._login(1)
+        response = self._create_book()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(self.client.get('/api/v1/books/').status_code, status.HTTP_200_OK)
+        response = self.client.post(f'/api/v1/books/{self.book.id}/comments/', {'text': 'Текст', 'book': self.book.id},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(), THROTTLE_WRITE_QUEUE_TIMEOUT=0)
+    def test_concurrent_writes(self):
+        for i in range(settings.THROTTLE_MAX_CONCURRENT_WRITES):
+            load_shedder.acquire('test')
+        try:
+            response = self._create_book()
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response['Retry-After'], '1')
+        finally:
+            for i in range(settings.THROTTLE_MAX_CONCURRENT_WRITES):
+                load_shedder.release()
+        # Места освобождаются и после ошибок
+        for i in range(settings.THROTTLE_MAX_CONCURRENT_WRITES + 1):
+            self.assertEqual(self.client.post('/api/v1/books/', {}, format='json').status_code,
+                             status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._create_book().status_code, status.HTTP_201_CREATED)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(endpoint_write='1/m'), THROTTLE_WRITE_QUEUE_TIMEOUT=0)
+    def test_rejected_write_keeps_token_and_slot(self):
+        for i in range(settings.THROTTLE_MAX_CONCURRENT_WRITES):
+            load_shedder.acquire(f'other:{i}')
+        try:
+            self.assertEqual(self._create_book().status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        finally:
+            for i in range(settings.THROTTLE_MAX_CONCURRENT_WRITES):
+                load_shedder.release()
+        # Запрос без места не потратил токен, а запрос без токена освобождает место
+        self.assertEqual(self._create_book().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._create_book().status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        for i in range(settings.THROTTLE_MAX_CONCURRENT_WRITES):
+            load_shedder.acquire(f'another:{i}')
+        for i in range(settings.THROTTLE_MAX_CONCURRENT_WRITES):
+            load_shedder.release()
@@ -0,0 +1,156 @@
+'''
+Ограничение частоты запросов по алгоритму token bucket и сброс нагрузки на
+запись. Скорость задаётся в REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] строкой
+«N/период»: корзина вмещает N токенов и пополняется на N токенов за период,
+поэтому допускает всплеск до N запросов подряд. Превышение лимита клиентом —
+ответ 429, перегрузка сервера — 503, оба с заголовком Retry-After
+'''
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class Overloaded(Throttled):
+    '''
+    Сервер перегружен: изменение отклонено, не дожидаясь блокировки базы данных
+    '''
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите запрос позже.'
+    default_code = 'overloaded'
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate: str) -> Tuple[int, float]:
+    '''
+    Ёмкость корзины и скорость её пополнения (токенов в секунду) для скорости «N/период»
+    '''
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def _take(state: Optional[tuple], capacity: int, refill_rate: float, now: float) -> Tuple[tuple, float]:
+    tokens, updated_at = state if state is not None else (capacity, now)
+    tokens = min(capacity, tokens + max(now - updated_at, 0) * refill_rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / refill_rate
+
+
+class BucketStore():
+    '''
+    Состояние корзин: локальный для процесса словарь, из которого вытесняются
+    давно не использованные корзины, или, при заданном THROTTLE_CACHE_ALIAS,
+    общий кэш Django, чтобы лимиты действовали на все процессы сервера.
+    Общий кэш читается и записывается без блокировок, поэтому при
+    одновременных запросах из разных процессов лимит соблюдается приблизительно
+    '''
+    KEY_PREFIX = 'throttle:'
+
+    def __init__(self, max_size: int, shared_alias: Optional[str] = None):
+        if max_size < 1:
+            raise ValueError('max_size должен быть положительным')
+        self.max_size = max_size
+        self.shared_alias = shared_alias
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def take(self, key: str, capacity: int, refill_rate: float) -> float:
+        '''
+        Забирает токен из корзины key. Возвращает 0, если токен взят, иначе
+        время в секундах до появления следующего токена
+        '''
+        if self.shared:
+            cache_key = self.KEY_PREFIX + key
+            state, wait = _take(self.shared.get(cache_key), capacity, refill_rate, time.time())
+            # Полная корзина не отличается от отсутствующей, поэтому запись живёт до полного пополнения
+            self.shared.set(cache_key, state, math.ceil(capacity / refill_rate) + 1)
+            return wait
+        with self._lock:
+            state, wait = _take(self._buckets.pop(key, None), capacity, refill_rate, time.monotonic())
+            self._buckets[key] = state
+            if len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        '''
+        Наполняет все корзины процесса (записи общего кэша не затрагиваются)
+        '''
+        with self._lock:
+            self._buckets.clear()
+
+
+bucket_store = BucketStore(max_size=settings.THROTTLE_STORE_SIZE, shared_alias=settings.THROTTLE_CACHE_ALIAS)
+
+
+def take_token(scope: str, key: str) -> float:
+    '''
+    Забирает токен из корзины key области scope. Возвращает время ожидания в
+    секундах; 0 — токен взят или для области не задана скорость
+    '''
+    rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+    if not rate:
+        return 0
+    return bucket_store.take(f'{scope}:{key}', *parse_rate(rate))
+
+
+class ClientRateThrottle(BaseThrottle):
+    '''
+    Лимит клиента на каждом представлении с отдельными корзинами для чтения
+    (область read) и изменений (область write). Клиент определяется по
+    пользователю токена (у пользователя один токен), анонимный — по IP-адресу
+    '''
+    def allow_request(self, request, view) -> bool:
+        scope = 'read' if request.method in SAFE_METHODS else 'write'
+        ident = request.user.pk if request.user.is_authenticated else self.get_ident(request)
+        self.wait_seconds = take_token(scope, f'{getattr(view, "basename", type(view).__name__)}:{ident}')
+        return not self.wait_seconds
+
+    def wait(self) -> Optional[float]:
+        return self.wait_seconds
+
+
+class LoadShedder():
+    '''
+    Сброс нагрузки на запись. Изменения представления берут токен из общей для
+    всех клиентов корзины (область endpoint_write) и одно из max_concurrent
+    мест одновременно выполняемых изменений процесса. Если корзина пуста или
+    место не освободилось за THROTTLE_WRITE_QUEUE_TIMEOUT секунд, запрос сразу
+    получает 503, а не ждёт блокировку записи SQLite. Сначала занимается
+    место, затем берётся токен: запрос, не дождавшийся места, токен не тратит
+    '''
+    def __init__(self, max_concurrent: int):
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+
+    def acquire(self, endpoint: str) -> None:
+        if self._slots is not None and not self._slots.acquire(timeout=settings.THROTTLE_WRITE_QUEUE_TIMEOUT):
+            raise Overloaded(1)
+        wait = take_token('endpoint_write', endpoint)
+        if wait:
+            self.release()
+            raise Overloaded(wait)
+
+    def release(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+
+load_shedder = LoadShedder(max_concurrent=settings.THROTTLE_MAX_CONCURRENT_WRITES)
@@ -2,15 +2,35 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
 
-from library.versions.v_1_0 import views
+from library.versions.v_1_0 import async_views, views
 
 router = DefaultRouter()
 router.register(r'books', views.BooksAPIViewSet, basename='books')
-router.register(r'books/(?P<book_id>[^/.]+)/comments', views.CommentsAPIViewSet, basename='comments')
+router.register(r'books/(?P<book_id>\d+)/comments', views.CommentsAPIViewSet, basename='comments')
+router.register(r'comments', views.RecentCommentsAPIViewSet, basename='recent-comments')
+router.register(r'libraries', views.LibraryAPIViewSet, basename='libraries')
+router.register(r'libraries/(?P<library_id>\d+)/books', views.LibraryBooksAPIViewSet, basename='library-books')
 router.register(r'genres', views.GenreAPIViewSet, basename='genres')
 router.register(r'authors', views.AuthorsAPIViewSet, basename='authors')
+router.register(r'jobs', views.JobsAPIViewSet, basename='jobs')
+router.register(r'stats', views.StatsAPIViewSet, basename='stats')
+
+async_urlpatterns = [
+    path('books/', async_views.book_list, name='async_books_list'),
+    path('books/<id>/', async_views.book_detail, name='async_books_detail'),
+    path('books/<int:book_id>/comments/', async_views.book_comments, name='async_comments_list'),
+    path('books/<int:book_id>/comments/events/', async_views.book_comment_events, name='async_comment_events'),
+    path('books/<int:book_id>/comments/stream/', async_views.book_comment_stream, name='async_comment_stream'),
+    path('books/<int:book_id>/comments/stream/token/', async_views.book_comment_stream_token,
+         name='async_comment_stream_token'),
+    path('genres/', async_views.genre_list, name='async_genres_list'),
+    path('genres/<id>/', async_views.genre_detail, name='async_genres_detail'),
+    path('authors/', async_views.author_list, name='async_authors_list'),
+]
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/', include(async_urlpatterns)),
+    path(r'search/', views.SearchAPIView.as_view(), name='search'),
     path(r'api-token-auth/', obtain_auth_token, name='token_authentication_url')
 ]
@@ -0,0 +1,247 @@
+'''
+Асинхронные (ASGI) представления v. 1.0 только для чтения. Формат ответов
+совпадает с синхронными представлениями DRF: используются те же
+сериализаторы, пагинация и JSON-рендерер. Обращения к ORM выполняются через
+sync_to_async, поэтому под ASGI запрос не занимает поток во время ожидания
+'''
+import asyncio
+from functools import wraps
+from types import SimpleNamespace
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from library.authentication import CachedTokenAuthentication, StreamTokenAuthentication
+from library.db_routers import replica_reads
+from library.fast_serializers import get_values_plan, values_queryset
+from library.filters import BookFilterBackend
+from library.models import Author, Book, Comment, Genre
+from library.pagination import CommentsKeysetPagination, KeysetPagination, SincePaginationMixin
+from library.renderers import FastJSONRenderer
+from library.services.event_services import broker, comments_channel, OVERFLOW, TooManySubscribers
+from library.throttling import ClientRateThrottle
+from library.versions.v_1_0.mixins import EXPAND_QUERY_PARAM, parse_expand, plan_related
+from library.versions.v_1_0.serializers import AuthorSerializer, BookSerializer, CommentSerializer, GenreSerializer
+
+json_renderer = JSONRenderer()
+fast_json_renderer = FastJSONRenderer()
+authentication = CachedTokenAuthentication()
+throttle_classes = [ClientRateThrottle]
+
+
+def _json_response(data, status_code: int = status.HTTP_200_OK, headers: dict = None) -> HttpResponse:
+    renderer = fast_json_renderer if settings.API_FAST_SERIALIZATION else json_renderer
+    response = HttpResponse(renderer.render(data), status=status_code, content_type=renderer.media_type)
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def async_read_view(basename: str):
+    '''
+    Превращает синхронную функцию построения данных ответа в асинхронное
+    представление с аутентификацией по токену, лимитами клиента и обработкой
+    ошибок как в DRF. basename — имя корзин лимита, общее с синхронным
+    представлением тех же данных
+    '''
+    def decorator(build):
+        @wraps(build)
+        async def view(request, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return _method_not_allowed(request)
+            drf_request = Request(request, authenticators=[authentication])
+            try:
+                data = await sync_to_async(_authenticate_and_build)(build, drf_request, basename, **kwargs)
+            except (Http404, exceptions.APIException) as exc:
+                return _error_response(exc, drf_request)
+            return _json_response(data)
+        return view
+    return decorator
+
+
+def _method_not_allowed(request) -> HttpResponse:
+    return _json_response({'detail': exceptions.MethodNotAllowed(request.method).detail},
+                          status.HTTP_405_METHOD_NOT_ALLOWED, {'Allow': 'GET, HEAD'})
+
+
+def _error_response(exc: Exception, request: Request) -> HttpResponse:
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        return _json_response({'detail': exc.detail}, status.HTTP_401_UNAUTHORIZED,
+                              {'WWW-Authenticate': authentication.authenticate_header(request)})
+    if isinstance(exc, Http404):
+        return _json_response({'detail': exceptions.NotFound().detail}, status.HTTP_404_NOT_FOUND)
+    if getattr(exc, 'wait', None):
+        return _json_response(exc.detail, exc.status_code, {'Retry-After': '%d' % exc.wait})
+    return _json_response(exc.detail, exc.status_code)
+
+
+def _too_many_subscribers() -> HttpResponse:
+    return _json_response({'detail': 'Слишком много подписчиков, повторите запрос позже'},
+                          status.HTTP_503_SERVICE_UNAVAILABLE, {'Retry-After': '1'})
+
+
+def _authenticate_and_build(build, request: Request, throttle_basename: Optional[str] = None, **kwargs):
+    '''
+    Проверяет аутентификацию и, если задано throttle_basename, лимиты
+    клиента, затем строит данные ответа. Повторные выборки в пределах одного
+    запроса (long polling, поток событий) выполняются без проверки лимитов
+    '''
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    if throttle_basename is not None:
+        _check_throttles(request, throttle_basename)
+    with replica_reads(request.user.pk):
+        return build(request, **kwargs)
+
+
+def _check_throttles(request: Request, basename: str) -> None:
+    view = SimpleNamespace(basename=basename)
+    waits = [throttle.wait() for throttle in (throttle_class() for throttle_class in throttle_classes)
+             if not throttle.allow_request(request, view)]
+    if waits:
+        raise exceptions.Throttled(max((wait for wait in waits if wait is not None), default=None))
+
+
+def _paginate(request: Request, queryset, serializer_class, pagination_class=KeysetPagination, expand=()):
+    paginator = pagination_class()
+    incremental = isinstance(paginator, SincePaginationMixin) and paginator.is_incremental(request)
+    paginate = paginator.paginate_since if incremental else paginator.paginate_queryset
+    plan = get_values_plan(serializer_class, expand) if settings.API_FAST_SERIALIZATION else None
+    if plan is None:
+        data = serializer_class(paginate(queryset, request), many=True, context={'expand': expand}).data
+    else:
+        ordering = paginator.since_fields if incremental else paginator.get_ordering(request, queryset, None)
+        data = plan.to_representation_many(paginate(values_queryset(queryset, plan, ordering), request))
+    if incremental:
+        return paginator.get_since_response(data).data
+    return paginator.get_paginated_response(data).data
+
+
+def _expand(request: Request, serializer_class) -> list:
+    return parse_expand(request.query_params.get(EXPAND_QUERY_PARAM, ''), serializer_class.expandable_fields)
+
+
+@async_read_view('books')
+def book_list(request: Request):
+    expand = _expand(request, BookSerializer)
+    books = BookFilterBackend().filter_params(Book.active.all(), request.query_params)
+    return _paginate(request, plan_related(books, expand), BookSerializer, expand=expand)
+
+
+@async_read_view('books')
+def book_detail(request: Request, id):
+    expand = _expand(request, BookSerializer)
+    book = get_object_or_404(plan_related(Book.active.all(), expand), id=id)
+    return BookSerializer(book, context={'expand': expand}).data
+
+
+def _book_comments(request: Request, book_id):
+    if not Book.active.filter(pk=book_id).exists():
+        raise Http404
+    expand = _expand(request, CommentSerializer)
+    comments = plan_related(Comment.active.get_book_comments(book_id=book_id), expand)
+    return _paginate(request, comments, CommentSerializer, CommentsKeysetPagination, expand=expand)
+
+
+book_comments = async_read_view('comments')(_book_comments)
+
+
+def poll_book_comments(request: Request, book_id):
+    '''
+    Новые комментарии книги после курсора ?since= (обязательного) в формате
+    инкрементального опроса
+    '''
+    if CommentsKeysetPagination.since_query_param not in request.query_params:
+        raise ValidationError({CommentsKeysetPagination.since_query_param: 'Обязательный параметр'})
+    return _book_comments(request, book_id)
+
+
+def _poll_timeout(request: Request) -> float:
+    try:
+        timeout = float(request.query_params.get('timeout', settings.EVENTS_LONG_POLL_TIMEOUT))
+    except ValueError:
+        raise ValidationError({'timeout': 'Ожидается число секунд'})
+    return min(max(timeout, 0), settings.EVENTS_LONG_POLL_TIMEOUT)
+
+
+async def book_comment_events(request, book_id: int):
+    '''
+    Long polling новых комментариев книги — запасной вариант для клиентов
+    без Server-Sent Events. Ответ как у ?since=, но если новых комментариев
+    нет, запрос ждёт событие created до ?timeout= секунд (не больше
+    EVENTS_LONG_POLL_TIMEOUT) и повторяет выборку. Подписка оформляется до
+    первой выборки, поэтому комментарий, добавленный между ними, не теряется.
+    События из других процессов не будят запрос, их комментарии придут в
+    ответ на следующий опрос
+    '''
+    if request.method not in ('GET', 'HEAD'):
+        return _method_not_allowed(request)
+    drf_request = Request(request, authenticators=[authentication])
+    build = sync_to_async(_authenticate_and_build)
+    try:
+        subscription = broker.subscribe(comments_channel(book_id))
+    except TooManySubscribers:
+        return _too_many_subscribers()
+    with subscription:
+        try:
+            timeout = _poll_timeout(drf_request)
+            data = await build(poll_book_comments, drf_request, 'comments', book_id=book_id)
+            deadline = asyncio.get_running_loop().time() + timeout
+            while not data['results'] and drf_request.query_params['since']:
+                event = await subscription.get(deadline - asyncio.get_running_loop().time())
+                if event is None:
+                    break
+                if event['type'] == 'created' or event is OVERFLOW:
+                    data = await build(poll_book_comments, drf_request, book_id=book_id)
+        except (Http404, exceptions.APIException) as exc:
+            return _error_response(exc, drf_request)
+    return _json_response(data)
+
+
+def comment_stream_authentication(book_id: int) -> StreamTokenAuthentication:
+    return StreamTokenAuthentication(comments_channel(book_id))
+
+
+@async_read_view('comments')
+def book_comment_stream_token(request: Request, book_id: int):
+    '''
+    Короткоживущий токен для ?token= потока комментариев книги: EventSource
+    не передаёт заголовок Authorization, а постоянный токен в адресе попал
+    бы в журналы доступа
+    '''
+    if not Book.active.filter(pk=book_id).exists():
+        raise Http404
+    return {'token': comment_stream_authentication(book_id).make_token(request.user),
+            'expires_in': settings.EVENTS_STREAM_TOKEN_TTL}
+
+
+async def book_comment_stream(request, book_id: int):
+    '''
+    Поток Server-Sent Events обслуживает ASGI-приложение CommentEventStream
+    (library.versions.v_1_0.event_stream), подключённое в project_config.asgi.
+    Запрос доходит до Django, только если оно не подключено
+    '''
+    return _json_response({'detail': 'Поток событий доступен только через project_config.asgi, '
+                                     'используйте long polling (events/)'}, status.HTTP_501_NOT_IMPLEMENTED)
+
+
+@async_read_view('genres')
+def genre_list(request: Request):
+    return _paginate(request, Genre.objects.all(), GenreSerializer)
+
+
+@async_read_view('genres')
+def genre_detail(request: Request, id):
+    return GenreSerializer(get_object_or_404(Genre.objects.all(), id=id)).data
+
+
+@async_read_view('authors')
+def author_list(request: Request):
+    return _paginate(request, Author.objects.all(), AuthorSerializer)
@@ -0,0 +1,215 @@
+'''
+Поток событий комментариев книги по Server-Sent Events. Django 4.0 не
+отдаёт асинхронные потоковые ответы, поэтому поток обслуживает
+ASGI-приложение CommentEventStream: оно оборачивает приложение Django и
+перехватывает только запросы к представлению book_comment_stream
+'''
+import asyncio
+import io
+import random
+from time import perf_counter
+from typing import Optional
+
+from asgiref.sync import sync_to_async, ThreadSensitiveContext
+from django.conf import settings
+from django.core import signals
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse
+from django.urls import Resolver404, resolve
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from library.middleware import record_request
+from library.pagination import CommentsKeysetPagination
+from library.services.cache_services import get_versions
+from library.services.event_services import broker, comments_channel, OVERFLOW, TooManySubscribers
+from library.services.metrics_services import finish_request, start_request
+from library.versions.v_1_0.async_views import (
+    _authenticate_and_build, _error_response, _too_many_subscribers, authentication, book_comment_stream,
+    comment_stream_authentication, fast_json_renderer, json_renderer, poll_book_comments
+)
+
+HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+HEARTBEAT = b': ping\n\n'
+
+
+def sse_message(event_type: str, data, event_id: str = '') -> bytes:
+    renderer = fast_json_renderer if settings.API_FAST_SERIALIZATION else json_renderer
+    message = f'id: {event_id}\n' if event_id else ''
+    return f'{message}event: {event_type}\ndata: '.encode() + renderer.render(data) + b'\n\n'
+
+
+class CommentEventStream():
+    '''
+    GET /api/v1/async/books/<id>/comments/stream/ — события created,
+    updated и deleted комментариев книги. Аутентификация по заголовку
+    Authorization или по ?token= — короткоживущему токену из
+    stream/token/ (EventSource не передаёт заголовки). Поток начинается с
+    комментариев после курсора из Last-Event-ID или ?since= и события ready
+    с курсором, затем передаются события брокера. id события — курсор
+    ?since=, поэтому браузер после разрыва продолжает с последнего
+    полученного комментария. События брокера приходят только из своего
+    процесса, поэтому при каждом heartbeat (EVENTS_HEARTBEAT) проверяется
+    версия области кэша комментариев книги, и только если она изменилась,
+    новые комментарии догружаются из базы данных. Подписчик, не успевающий
+    читать поток, получает событие overflow, и поток закрывается
+    '''
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            try:
+                match = resolve(scope['path'][len(scope.get('root_path', '')):])
+            except Resolver404:
+                match = None
+            if match is not None and match.func is book_comment_stream:
+                # Как ASGIHandler: синхронный код потока выполняется в собственном потоке соединения, а не в
+                # общем для всех соединений потоке (и соединении с базой данных) процесса
+                async with ThreadSensitiveContext():
+                    return await self.handle(scope, receive, send, match)
+        return await self.app(scope, receive, send)
+
+    async def handle(self, scope, receive, send, match) -> None:
+        '''
+        Обслуживает поток вне обработчика Django, поэтому повторяет его
+        обязанности: сигналы request_started и request_finished закрывают
+        устаревшие соединения с базой данных, а метрики записываются как в
+        MetricsMiddleware (длительность — время жизни потока)
+        '''
+        await sync_to_async(signals.request_started.send, thread_sensitive=True)(sender=type(self), scope=scope)
+        sampled = random.random() < settings.METRICS_SAMPLE_RATE
+        metrics, token = start_request() if sampled else (None, None)
+        if sampled:
+            metrics.view = match.view_name
+        started = perf_counter()
+        status_codes = []
+
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                status_codes.append(message['status'])
+            await send(message)
+
+        try:
+            await self.stream(scope, receive, send_and_record, **match.kwargs)
+        finally:
+            if sampled:
+                finish_request(token)
+            await sync_to_async(signals.request_finished.send, thread_sensitive=True)(sender=type(self))
+        if sampled and status_codes:
+            record_request(scope['method'], scope['path'], status_codes[0], metrics, perf_counter() - started)
+
+    async def stream(self, scope, receive, send, book_id: int) -> None:
+        request = self._request(scope, book_id)
+        try:
+            subscription = broker.subscribe(comments_channel(book_id))
+        except TooManySubscribers:
+            return await self._send_response(send, _too_many_subscribers())
+        with subscription:
+            try:
+                # Версия читается до выборки, чтобы комментарий, добавленный во время неё, не был пропущен
+                version = await self._version(book_id)
+                page = await self._fetch(request, book_id, throttle_basename='comments')
+            except (Http404, exceptions.APIException) as exc:
+                return await self._send_response(send, _error_response(exc, request))
+            await send({'type': 'http.response.start', 'status': 200, 'headers': HEADERS})
+            try:
+                since = await self._send_comments(send, request, book_id, page)
+                await self._send(send, sse_message('ready', {'since': since}, since))
+                await self._stream_events(subscription, receive, send, request, book_id, since, version)
+            except (Http404, exceptions.APIException):
+                # Книга удалена или скрыта либо доступ отозван после начала потока: ответ уже начат, поток
+                # закрывается, а переподключение клиента получит ошибку
+                await self._send(send, b'', more_body=False)
+
+    async def _stream_events(self, subscription, receive, send, request: Request, book_id: int, since: str,
+                             version: float) -> None:
+        disconnect = asyncio.ensure_future(receive())
+        try:
+            while True:
+                event_task = asyncio.ensure_future(subscription.get(settings.EVENTS_HEARTBEAT))
+                await asyncio.wait({event_task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnect.done():
+                    event_task.cancel()
+                    if disconnect.result()['type'] == 'http.disconnect':
+                        return
+                    disconnect = asyncio.ensure_future(receive())
+                    continue
+                event = event_task.result()
+                if event is OVERFLOW:
+                    await self._send(send, sse_message('overflow', {}), more_body=False)
+                    return
+                if event is None:
+                    if subscription.closed:
+                        await self._send(send, b'', more_body=False)
+                        return
+                    # Комментарии, добавленные другими процессами сервера, догружаются из базы данных
+                    current_version = await self._version(book_id)
+                    if current_version != version:
+                        version = current_version
+                        request.query_params[CommentsKeysetPagination.since_query_param] = since
+                        page = await self._fetch(request, book_id)
+                        since = await self._send_comments(send, request, book_id, page)
+                    await self._send(send, HEARTBEAT)
+                elif event['type'] != 'created':
+                    await self._send(send, sse_message(event['type'], event))
+                elif self._newer(event['since'], since):
+                    # Комментарии, уже отправленные из базы данных, пропускаются
+                    since = event['since']
+                    await self._send(send, sse_message('created', event['data'], since))
+        finally:
+            disconnect.cancel()
+
+    @staticmethod
+    def _newer(cursor: str, than: str) -> bool:
+        return CommentsKeysetPagination.decode_since(cursor) > CommentsKeysetPagination.decode_since(than)
+
+    @staticmethod
+    async def _version(book_id: int) -> float:
+        scope = f'comments:{book_id}'
+        return (await sync_to_async(get_versions)([scope]))[scope]
+
+    @staticmethod
+    async def _fetch(request: Request, book_id: int, throttle_basename: Optional[str] = None) -> dict:
+        return await sync_to_async(_authenticate_and_build)(poll_book_comments, request, throttle_basename,
+                                                            book_id=book_id)
+
+    async def _send_comments(self, send, request: Request, book_id: int, page: dict) -> str:
+        '''
+        Отправляет комментарии страницы и следующих страниц, возвращает курсор
+        последнего. id получает последний комментарий пачки: его курсор
+        совпадает с курсором страницы
+        '''
+        while True:
+            event_ids = [''] * (len(page['results']) - 1) + [page['since']]
+            await self._send(send, b''.join(sse_message('created', comment, event_id)
+                                            for comment, event_id in zip(page['results'], event_ids)))
+            if not page['has_more']:
+                return page['since']
+            request.query_params[CommentsKeysetPagination.since_query_param] = page['since']
+            page = await self._fetch(request, book_id)
+
+    @staticmethod
+    def _request(scope, book_id: int) -> Request:
+        request = ASGIRequest(scope, io.BytesIO())
+        request.GET = request.GET.copy()
+        last_event_id = request.headers.get('Last-Event-ID')
+        if last_event_id:
+            request.GET[CommentsKeysetPagination.since_query_param] = last_event_id
+        request.GET.setdefault(CommentsKeysetPagination.since_query_param, '')
+        return Request(request, authenticators=[comment_stream_authentication(book_id), authentication])
+
+    @staticmethod
+    async def _send(send, body: bytes, more_body: bool = True) -> None:
+        if body or not more_body:
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+    @staticmethod
+    async def _send_response(send, response: HttpResponse) -> None:
+        headers = [(name.encode('latin1'), value.encode('latin1')) for name, value in response.items()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': response.content})
@@ -0,0 +1,455 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import QuerySet
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from library.db_routers import current_read_alias, replica_reads, stick_to_primary
+from library.fast_serializers import get_values_plan, values_queryset
+from library.parsers import NDJSONParser
+from library.renderers import FastJSONRenderer
+from library.services.cache_services import get_cache, get_versions, make_response_key
+from library.services.metrics_services import record_cache_lookup
+from library.services.utils import batched, MAX_IN_LIST, values_in
+from library.throttling import load_shedder
+
+
+EXPAND_QUERY_PARAM = 'expand'
+
+
+def parse_expand(raw_value: str, allowed) -> list:
+    '''
+    Разбирает значение параметра ?expand= и проверяет допустимость полей
+    '''
+    field_names = list(dict.fromkeys(name.strip() for name in raw_value.split(',') if name.strip()))
+    unknown = [name for name in field_names if name not in allowed]
+    if unknown:
+        raise ValidationError({
+            EXPAND_QUERY_PARAM: f'Недопустимые поля: {", ".join(unknown)}. Доступные поля: {", ".join(allowed)}'
+        })
+    return field_names
+
+
+def plan_related(queryset: QuerySet, field_names: list) -> QuerySet:
+    '''
+    Подгружает разворачиваемые связи: прямые внешние ключи через JOIN,
+    обратные и многие-ко-многим — отдельным запросом на всю страницу
+    '''
+    select_related, prefetch_related = [], []
+    for field_name in field_names:
+        field = queryset.model._meta.get_field(field_name)
+        if field.many_to_one or field.one_to_one:
+            select_related.append(field_name)
+        else:
+            prefetch_related.append(field_name)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class ReplicaReadMixin():
+    '''
+    Выполняет чтения безопасных запросов (GET, HEAD, OPTIONS) на реплике, а
+    после успешного изменения данных закрепляет клиента за основной базой
+    '''
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self._replica_reads = replica_reads(request.user.pk)
+            self._replica_reads.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica_context = getattr(self, '_replica_reads', None)
+        if replica_context is not None:
+            self._replica_reads = None
+            replica_context.__exit__(None, None, None)
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            stick_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class LoadSheddingMixin():
+    '''
+    Отклоняет изменения ответом 503, когда сервер перегружен
+    (library.throttling.LoadShedder). Проверка выполняется после
+    аутентификации, разрешений и лимитов клиента
+    '''
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS:
+            load_shedder.acquire(self.basename)
+            self._write_slot = True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if getattr(self, '_write_slot', False):
+            self._write_slot = False
+            load_shedder.release()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ExpandMixin():
+    '''
+    Поддержка параметра запроса ?expand=field1,field2. Разворачиваемые поля
+    передаются в контекст сериализатора, а для queryset автоматически
+    планируются select_related/prefetch_related, чтобы число запросов к
+    базе данных не зависело от размера страницы
+    '''
+    def get_expand(self) -> list:
+        if not hasattr(self, '_expand'):
+            self._expand = parse_expand(
+                self.request.query_params.get(EXPAND_QUERY_PARAM, ''),
+                self.get_serializer_class().expandable_fields
+            )
+        return self._expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+    def filter_queryset(self, queryset: QuerySet) -> QuerySet:
+        return plan_related(super().filter_queryset(queryset), self.get_expand())
+
+
+class FastListMixin():
+    '''
+    Быстрый режим list (API_FAST_SERIALIZATION): страница выбирается через
+    .values() и представляется заранее построенным планом полей
+    сериализатора, а ответ кодируется FastJSONRenderer. Ответ побайтно
+    совпадает с обычным режимом. Сериализаторы с полями, которые нельзя
+    построить из .values(), обрабатываются обычным способом
+    '''
+    def list(self, request, *args, **kwargs):
+        expand = self.get_expand() if hasattr(self, 'get_expand') else ()
+        plan = get_values_plan(self.get_serializer_class(), expand) if settings.API_FAST_SERIALIZATION else None
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = ()
+        if self.paginator is not None and hasattr(self.paginator, 'get_ordering'):
+            ordering = self.paginator.get_ordering(request, queryset, self)
+        # Первичный ключ выбирается для подстановки изменчивых полей в кэшированную страницу
+        rows = values_queryset(queryset, plan, (*ordering, 'id'))
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(plan.to_representation_many(rows))
+        return self.get_paginated_response(plan.to_representation_many(page))
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if not settings.API_FAST_SERIALIZATION:
+            return renderers
+        return [FastJSONRenderer() if type(renderer) is JSONRenderer else renderer for renderer in renderers]
+
+
+class IncrementalListMixin():
+    '''
+    Инкрементальный режим list (?since=<курсор>) для пагинации с
+    SincePaginationMixin: только объекты новее курсора и курсор следующего
+    опроса. Используется быстрый план представления, если он доступен
+    '''
+    def list(self, request, *args, **kwargs):
+        if self.paginator is None or not self.paginator.is_incremental(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        expand = self.get_expand() if hasattr(self, 'get_expand') else ()
+        plan = get_values_plan(self.get_serializer_class(), expand) if settings.API_FAST_SERIALIZATION else None
+        if plan is None:
+            page = self.paginator.paginate_since(queryset, request)
+            data = self.get_serializer(page, many=True).data
+        else:
+            page = self.paginator.paginate_since(values_queryset(queryset, plan, self.paginator.since_fields),
+                                                 request)
+            data = plan.to_representation_many(page)
+        return self.paginator.get_since_response(data)
+
+
+class CacheListResponseMixin():
+    '''
+    Кэширует сериализованные данные ответов list. Ключ ответа включает
+    версии областей кэша (cache_list_scopes, cache_object_scopes и области
+    разворачиваемых полей), которые обновляются сигналами при изменении
+    данных. Ответы снабжаются заголовками ETag и Last-Modified, на условные
+    запросы с актуальной версией возвращается 304. Часто меняющиеся поля
+    списка (cache_volatile_fields, например счётчики) подставляются из базы
+    данных после чтения кэша: их изменение обновляет только области
+    cache_volatile_scopes, которые входят в ETag, но не в ключ кэша
+    '''
+    cache_list_scopes = ()
+    cache_object_scopes = ()
+    cache_expand_scopes = {}
+    cache_volatile_fields = ()
+    cache_volatile_scopes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, self.cache_list_scopes, request, *args, **kwargs)
+
+    def get_cache_scopes(self, templates) -> list:
+        scopes = [template.format(**self.kwargs) for template in templates]
+        expand = self.get_expand() if hasattr(self, 'get_expand') else ()
+        for field_name in expand:
+            if field_name in self.cache_expand_scopes:
+                scopes.append(self.cache_expand_scopes[field_name].format(**self.kwargs))
+        return scopes
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.cache_volatile_fields:
+            self._page_ids = [item['id'] if isinstance(item, dict) else item.pk for item in page]
+        return page
+
+    def cached_response(self, handler, templates, request, *args, **kwargs):
+        volatile = bool(self.cache_volatile_fields) and self.action == 'list'
+        versions = get_versions(self.get_cache_scopes(templates))
+        # Ответы из реплик кэшируются отдельно от ответов основной базы: иначе ответ отстающей
+        # реплики под новой версией получил бы и клиент, закреплённый за основной базой после изменения
+        database = current_read_alias()
+        query = list(request.query_params.lists())
+        key = validator = make_response_key(request.path, query, versions, database)
+        if volatile:
+            versions.update(get_versions(self.cache_volatile_scopes))
+            validator = make_response_key(request.path, query, versions, database)
+        etag = f'"{validator.rsplit(":", 1)[-1]}"'
+        last_modified = max(versions.values())
+
+        if self._is_not_modified(request, etag, last_modified):
+            record_cache_lookup('not_modified')
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_cache()
+            data = cache.get(key)
+            record_cache_lookup('miss' if data is None else 'hit')
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                if not volatile:
+                    cache.set(key, response.data, self._cache_timeout(database))
+                elif getattr(self, '_page_ids', None) is not None:
+                    cache.set(key, (response.data, self._page_ids), self._cache_timeout(database))
+            elif volatile:
+                response = Response(self.merge_volatile_fields(*data))
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def merge_volatile_fields(self, data, ids: list):
+        '''
+        Подставляет в кэшированную страницу списка актуальные значения
+        cache_volatile_fields одним запросом по первичным ключам страницы
+        '''
+        fields = self.get_serializer().fields
+        sources = [fields[name].source for name in self.cache_volatile_fields]
+        rows = values_in(self.get_queryset().order_by(), 'pk', ids, 'pk', *sources)
+        values = {pk: row for pk, *row in rows}
+        for item, pk in zip(data['results'] if isinstance(data, dict) else data, ids):
+            for name, value in zip(self.cache_volatile_fields, values.get(pk, ())):
+                item[name] = None if value is None else fields[name].to_representation(value)
+        return data
+
+    @staticmethod
+    def _cache_timeout(database: str) -> float:
+        '''
+        Ответ реплики хранится не дольше допустимой задержки репликации
+        (REPLICA_STICKY_SECONDS), чтобы устаревшие данные не жили до следующего изменения
+        '''
+        if database == DEFAULT_DB_ALIAS:
+            return settings.API_CACHE_TIMEOUT
+        return min(settings.API_CACHE_TIMEOUT, settings.REPLICA_STICKY_SECONDS)
+
+    @staticmethod
+    def _is_not_modified(request, etag: str, last_modified: float) -> bool:
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+            return etag in etags or '*' in etags
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+        # Как в django.utils.cache: клиент повторяет полученный Last-Modified, округлённый до секунды
+        return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+class CacheResponseMixin(CacheListResponseMixin):
+    '''
+    Кэширует сериализованные данные ответов list и retrieve
+    '''
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, self.cache_object_scopes, request, *args, **kwargs)
+
+
+class BulkMixin():
+    '''
+    Пакетные операции над объектами: POST, PATCH и DELETE на <ресурс>/bulk/
+    принимают массив объектов в JSON или NDJSON. Каждый элемент проверяется и
+    авторизуется отдельно, а изменения сохраняются пакетными запросами в одной
+    транзакции. DELETE помечает объекты удалёнными одним UPDATE. Ответ
+    содержит результат для каждого элемента: позицию, статус и данные или ошибки
+    '''
+    max_bulk_items = 1000
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk',
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Ожидается список объектов']})
+        if len(items) > self.max_bulk_items:
+            raise ValidationError({'non_field_errors': [f'Не более {self.max_bulk_items} объектов за запрос']})
+        if request.method == 'PATCH':
+            self._check_unique_ids(items)
+
+        if request.method == 'POST':
+            results, success_status = self.bulk_create(items), status.HTTP_201_CREATED
+        elif request.method == 'PATCH':
+            results, success_status = self.bulk_update(items), status.HTTP_200_OK
+        else:
+            results, success_status = self.bulk_destroy(items), status.HTTP_204_NO_CONTENT
+        if any(result['status'] != success_status for result in results):
+            response_status = status.HTTP_207_MULTI_STATUS
+        elif success_status == status.HTTP_204_NO_CONTENT:
+            response_status = status.HTTP_200_OK
+        else:
+            response_status = success_status
+        return Response({'results': results}, status=response_status)
+
+    def bulk_create(self, items: list) -> list:
+        serializer = self.get_serializer(data=items, many=True)
+        errors = serializer.validate_items()
+        with transaction.atomic():
+            instances = serializer.save(owner=self.request.user)
+            self.after_bulk_create(instances)
+        created = iter(instances)
+        child = serializer.child
+        results = []
+        for index, item_errors in enumerate(errors):
+            if item_errors is not None:
+                results.append({'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': item_errors})
+            else:
+                instance = next(created)
+                results.append({'index': index, 'status': status.HTTP_201_CREATED, 'id': instance.pk,
+                                'data': child.to_representation(instance)})
+        return results
+
+    def bulk_update(self, items: list) -> list:
+        results = [None] * len(items)
+        objects = self._get_bulk_objects(items, results)
+        positions = [index for index, result in enumerate(results) if result is None]
+        instances = [objects[self._get_item_id(items[index])] for index in positions]
+        previous = {instance.pk: instance.__dict__.copy() for instance in instances}
+
+        serializer = self.get_serializer(instances, data=[items[index] for index in positions], many=True,
+                                         partial=True)
+        errors = serializer.validate_items()
+        with transaction.atomic():
+            updated = serializer.save()
+            self.after_bulk_update(updated, previous)
+        updated = iter(updated)
+        for index, item_errors in zip(positions, errors):
+            if item_errors is not None:
+                results[index] = {'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': item_errors}
+            else:
+                instance = next(updated)
+                results[index] = {'index': index, 'status': status.HTTP_200_OK, 'id': instance.pk,
+                                  'data': serializer.child.to_representation(instance)}
+        return results
+
+    def bulk_destroy(self, items: list) -> list:
+        results = [None] * len(items)
+        objects = self._get_bulk_objects(items, results)
+        deleted = {}
+        for index, result in enumerate(results):
+            if result is None:
+                object_id = self._get_item_id(items[index])
+                deleted[object_id] = objects[object_id]
+                results[index] = {'index': index, 'status': status.HTTP_204_NO_CONTENT, 'id': object_id}
+        with transaction.atomic():
+            for ids in batched(list(deleted), MAX_IN_LIST):
+                self.get_write_queryset().filter(pk__in=ids).soft_delete()
+            self.after_bulk_destroy(list(deleted.values()))
+        return results
+
+    def after_bulk_create(self, instances: list) -> None:
+        '''
+        Побочные эффекты пакетного создания (bulk_create не отправляет сигналы)
+        '''
+
+    def after_bulk_update(self, instances: list, previous: dict) -> None:
+        '''
+        Побочные эффекты пакетного изменения (bulk_update не отправляет сигналы).
+        previous содержит прежние значения полей объектов по их id
+        '''
+
+    def after_bulk_destroy(self, instances: list) -> None:
+        '''
+        Побочные эффекты пакетного удаления (soft_delete не отправляет сигналы)
+        '''
+
+    def get_write_queryset(self):
+        '''
+        Объекты, которые пользователь может изменять и удалять: get_queryset,
+        ограниченный разрешениями с методом filter_queryset
+        '''
+        queryset = self.get_queryset()
+        for permission in self.get_permissions():
+            if hasattr(permission, 'filter_queryset'):
+                queryset = permission.filter_queryset(self.request, queryset, self)
+        return queryset
+
+    @staticmethod
+    def _get_item_id(item):
+        return item.get('id') if isinstance(item, dict) else item
+
+    def _check_unique_ids(self, items: list) -> None:
+        '''
+        Один объект нельзя изменить дважды за запрос: изменения сохраняются
+        пакетно, и результат зависел бы от порядка элементов
+        '''
+        ids = Counter(object_id for object_id in map(self._get_item_id, items)
+                      if isinstance(object_id, int) and not isinstance(object_id, bool))
+        duplicates = sorted(object_id for object_id, count in ids.items() if count > 1)
+        if duplicates:
+            raise ValidationError({'non_field_errors': [
+                f'Повторяющиеся id объектов: {", ".join(map(str, duplicates))}'
+            ]})
+
+    def _get_bulk_objects(self, items: list, results: list) -> dict:
+        '''
+        Загружает объекты всех элементов одним запросом и проверяет права на
+        каждый из них. Для отсутствующих и недоступных объектов заполняет results
+        '''
+        ids = set()
+        for index, item in enumerate(items):
+            object_id = self._get_item_id(item)
+            if not isinstance(object_id, int) or isinstance(object_id, bool):
+                results[index] = {'index': index, 'status': status.HTTP_400_BAD_REQUEST,
+                                  'errors': {'id': ['Ожидается целочисленный id объекта']}}
+            else:
+                ids.add(object_id)
+        objects = self.get_queryset().in_bulk(ids)
+        for index, item in enumerate(items):
+            if results[index] is not None:
+                continue
+            obj = objects.get(self._get_item_id(item))
+            if obj is None:
+                results[index] = {'index': index, 'status': status.HTTP_404_NOT_FOUND,
+                                  'errors': {'detail': 'Не найдено.'}}
+                continue
+            try:
+                self.check_object_permissions(self.request, obj)
+            except PermissionDenied as exc:
+                results[index] = {'index': index, 'status': status.HTTP_403_FORBIDDEN,
+                                  'errors': {'detail': exc.detail}}
+        return objects
@@ -1,13 +1,111 @@
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
-from library.models import Book, Genre, Comment, Author
+from library.models import Book, Genre, Comment, Author, Job, Library
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    '''
+    Связанный объект по id. В пакетных операциях BulkListSerializer заранее
+    загружает объекты всех элементов в prefetched, и id ищется среди них
+    '''
+    prefetched = None
 
-    class Meta:
-        model = Book
-        fields = ('title', 'year', 'author', 'genre', 'owner')
+    def to_internal_value(self, data):
+        if self.prefetched is None or self.pk_field is not None:
+            return super().to_internal_value(data)
+        pk = _parse_pk(data)
+        if pk is None:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return self.prefetched[pk]
+
+
+def _parse_pk(data):
+    if isinstance(data, bool):
+        return None
+    try:
+        return int(data)
+    except (TypeError, ValueError):
+        return None
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    '''
+    Список объектов для пакетных операций. Каждый элемент проверяется
+    отдельно, поэтому ошибки одних элементов не мешают сохранению остальных.
+    Связанные объекты загружаются одним запросом на поле для всего пакета,
+    сохранение выполняется одним bulk_create или bulk_update
+    '''
+    def validate_items(self) -> list:
+        '''
+        Проверяет элементы и возвращает список ошибок по их позициям (None для
+        корректных элементов). Для сохранения остаются только корректные элементы
+        '''
+        self._prefetch_related()
+        errors, validated_data, instances = [], [], []
+        for index, item in enumerate(self.initial_data):
+            try:
+                validated_data.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                errors.append(exc.detail)
+            else:
+                errors.append(None)
+                if self.instance is not None:
+                    instances.append(self.instance[index])
+        self._validated_data = validated_data
+        self._errors = []
+        if self.instance is not None:
+            self.instance = instances
+        return errors
+
+    def _prefetch_related(self) -> None:
+        for field in self.child.fields.values():
+            if not isinstance(field, BulkPrimaryKeyRelatedField) or field.read_only:
+                continue
+            pks = {_parse_pk(item.get(field.field_name)) for item in self.initial_data if isinstance(item, dict)}
+            pks.discard(None)
+            field.prefetched = field.get_queryset().in_bulk(pks)
+
+    def create(self, validated_data: list) -> list:
+        model = self.child.Meta.model
+        return model._default_manager.bulk_create([model(**attrs) for attrs in validated_data])
+
+    def update(self, instances: list, validated_data: list) -> list:
+        fields = set()
+        for instance, attrs in zip(instances, validated_data):
+            for field_name, value in attrs.items():
+                setattr(instance, field_name, value)
+                fields.add(field_name)
+        if fields:
+            self.child.Meta.model._default_manager.bulk_update(instances, sorted(fields))
+        return instances
+
+
+class ExpandableFieldsMixin():
+    '''
+    Заменяет id связанных объектов их вложенным представлением для полей,
+    перечисленных в контексте сериализатора под ключом "expand"
+    '''
+    expandable_fields = {}
+
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        for field_name in self.context.get('expand', ()):
+            related = getattr(instance, field_name)
+            if related is None:
+                ret[field_name] = None
+            else:
+                ret[field_name] = self._get_expanded_serializer(field_name).to_representation(related)
+        return ret
+
+    def _get_expanded_serializer(self, field_name: str) -> serializers.Serializer:
+        expanded_serializers = self.__dict__.setdefault('_expanded_serializers', {})
+        if field_name not in expanded_serializers:
+            context = {key: value for key, value in self.context.items() if key != 'expand'}
+            expanded_serializers[field_name] = self.expandable_fields[field_name](context=context)
+        return expanded_serializers[field_name]
 
 
 class GenreSerializer(serializers.ModelSerializer):
@@ -17,15 +115,60 @@ class GenreSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class AuthorSerializer(serializers.ModelSerializer):
 
     class Meta:
-        model = Comment
+        model = Author
         fields = '__all__'
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class LibrarySerializer(serializers.ModelSerializer):
 
     class Meta:
-        model = Author
+        model = Library
         fields = '__all__'
+
+
+class OwnerSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = get_user_model()
+        fields = ('id', 'username')
+
+
+class BookSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
+    expandable_fields = {
+        'author': AuthorSerializer,
+        'genre': GenreSerializer,
+        'library': LibrarySerializer,
+        'owner': OwnerSerializer,
+    }
+
+    class Meta:
+        model = Book
+        fields = ('title', 'year', 'author', 'genre', 'owner', 'comments_count', 'last_comment_at')
+        list_serializer_class = BulkListSerializer
+
+
+class CommentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
+    expandable_fields = {
+        'book': BookSerializer,
+        'owner': OwnerSerializer,
+    }
+
+    class Meta:
+        model = Comment
+        exclude = ('status', 'deleted_at')
+        extra_kwargs = {'book': {'queryset': Book.active.all()}}
+        list_serializer_class = BulkListSerializer
+
+
+class JobSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source='get_status_display')
+
+    class Meta:
+        model = Job
+        fields = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'started_at',
+                  'finished_at')
@@ -1,53 +1,410 @@
-from rest_framework import viewsets, mixins
-from rest_framework.permissions import IsAuthenticated
+from django.db import router, transaction
+from django.urls import reverse
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 
-from library.models import Book, Genre, Comment, Author
+from library.filters import BookFilterBackend, StableOrderingFilter
+from library.models import Book, Genre, Comment, Author, Job, Library
+from library.pagination import CommentsKeysetPagination, RecentCommentsPagination
 from library.permissions import IsOwnerOrReadOnly
-from library.versions.v_1_0.serializers import BookSerializer, GenreSerializer, CommentSerializer, AuthorSerializer
+from library.services.cache_services import invalidate
+from library.services.catalog_services import books_by_author, books_by_genre, books_by_year
+from library.services.counter_services import (
+    register_comment_created, register_comment_deleted, register_comments_created, register_comments_deleted,
+    register_comments_moved
+)
+from library.services.event_services import publish_comment_events
+from library.services.export_services import CONTENT_TYPES, export_catalog, FORMAT_NDJSON
+from library.services.job_services import enqueue
+from library.services.search_services import (
+    book_document, comment_document, KINDS, SearchCursorError, SearchIndex
+)
+from library.services.sqlite_services import immediate_atomic
+from library.services.stats_services import (
+    book_state, comment_state, daily_comment_stats, genre_stats, register_book_comments, register_books,
+    register_comments, top_commented_books
+)
+from library.throttling import ClientRateThrottle
+from library.versions.v_1_0.mixins import (
+    BulkMixin, CacheListResponseMixin, CacheResponseMixin, ExpandMixin, FastListMixin, IncrementalListMixin,
+    LoadSheddingMixin, ReplicaReadMixin
+)
+from library.versions.v_1_0.serializers import (
+    AuthorSerializer, BookSerializer, CommentSerializer, GenreSerializer, JobSerializer, LibrarySerializer
+)
 
 
-class BooksAPIViewSet(viewsets.ModelViewSet):
+def int_query_param(request, name: str, default: int, maximum: int) -> int:
+    '''
+    Целочисленный параметр запроса от 1 до maximum
+    '''
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: 'Ожидается целое число'})
+    if not 1 <= value <= maximum:
+        raise ValidationError({name: f'Ожидается число от 1 до {maximum}'})
+    return value
+
+
+def accepted_response(request, job: Job) -> Response:
+    '''
+    Ответ 202 Accepted на запрос, обработка которого поставлена в очередь:
+    состояние задачи и ссылка на него в заголовке Location
+    '''
+    location = reverse(f'{request.resolver_match.namespace}:jobs-detail', kwargs={'id': job.pk})
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': request.build_absolute_uri(location)})
+
+
+class BooksAPIViewSet(ReplicaReadMixin, LoadSheddingMixin, BulkMixin, CacheResponseMixin, FastListMixin, ExpandMixin,
+                      viewsets.ModelViewSet):
     '''
     Представление (v. 1.0) для модели книг
     '''
+    cache_list_scopes = ('books', 'nullified-relations')
+    cache_object_scopes = ('book:{id}', 'nullified-relations')
+    cache_expand_scopes = {
+        'author': 'authors',
+        'genre': 'genres',
+        'library': 'libraries',
+        'owner': 'users',
+    }
+    # Счётчики комментариев меняются с каждым комментарием и не должны сбрасывать кэш всего списка
+    cache_volatile_fields = ('comments_count', 'last_comment_at')
+    cache_volatile_scopes = ('book-counters',)
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
-    queryset = Book.default_manager.all()
+    throttle_classes = [ClientRateThrottle]
+    queryset = Book.active.all()
+    filter_backends = [BookFilterBackend, StableOrderingFilter]
+    ordering_fields = ('id', 'title', 'year')
+    ordering = ('id',)
     lookup_field = 'id'
 
+    @immediate_atomic()
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    def perform_destroy(self, instance):
+        instance.soft_delete()
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request, *args, **kwargs):
+        '''
+        Потоковая выгрузка книг с комментариями в NDJSON (по умолчанию) или
+        CSV (?export_format=csv), при ?compress=gzip — сжатая на лету.
+        Поддерживает те же фильтры, что и список книг
+        '''
+        fmt = request.query_params.get('export_format', FORMAT_NDJSON)
+        if fmt not in CONTENT_TYPES:
+            raise ValidationError({'export_format': f'Допустимые значения: {", ".join(CONTENT_TYPES)}'})
+        compress = request.query_params.get('compress')
+        if compress not in (None, 'gzip'):
+            raise ValidationError({'compress': 'Допустимое значение: gzip'})
+        books = BookFilterBackend().filter_params(self.get_queryset(), request.query_params)
+        filename = f'books.{fmt}'
+        if compress:
+            response = StreamingHttpResponse(export_catalog(fmt, books, gzip=True), content_type='application/gzip')
+            filename += '.gz'
+        else:
+            response = StreamingHttpResponse(export_catalog(fmt, books),
+                                             content_type=f'{CONTENT_TYPES[fmt]}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
-class GenreAPIViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    def after_bulk_create(self, instances):
+        self._sync_books(instances)
+        register_books(after=[book_state(book) for book in instances])
+
+    def after_bulk_update(self, instances, previous):
+        self._sync_books(instances)
+        register_books(before=[(previous[book.pk]['genre_id'], previous[book.pk]['status']) for book in instances],
+                       after=[book_state(book) for book in instances])
+
+    def after_bulk_destroy(self, instances):
+        book_ids = [book.pk for book in instances]
+        SearchIndex().remove_many('book', book_ids)
+        SearchIndex().sync_book_comments(book_ids, published=False)
+        invalidate('books', *self._book_scopes(instances), *[f'comments:{book_id}' for book_id in book_ids])
+        register_books(before=[book_state(book) for book in instances])
+        register_book_comments(book_ids, published=False)
+
+    def _sync_books(self, books):
+        SearchIndex().update(book_document(book) for book in books)
+        invalidate('books', *self._book_scopes(books))
+
+    @staticmethod
+    def _book_scopes(books) -> list:
+        scopes = [f'book:{book.pk}' for book in books]
+        return scopes + [f'library:{library_id}' for library_id in {book.library_id for book in books} if library_id]
+
+
+class GenreAPIViewSet(ReplicaReadMixin, CacheResponseMixin, FastListMixin, mixins.ListModelMixin,
+                      mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     '''
     Представление (v. 1.0) для модели жанров
     '''
+    cache_list_scopes = ('genres',)
+    cache_object_scopes = ('genres',)
     serializer_class = GenreSerializer
     permission_classes = [IsAuthenticated]
     queryset = Genre.objects.all()
     lookup_field = 'id'
 
 
-class CommentsAPIViewSet(viewsets.ModelViewSet):
+class LibraryAPIViewSet(ReplicaReadMixin, CacheResponseMixin, FastListMixin, mixins.ListModelMixin,
+                        mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    '''
+    Представление (v. 1.0) для модели библиотек со сводками по фонду:
+    genres/, authors/ (?limit=) и years/ (?bucket= — длина интервала в годах).
+    Сводки кэшируются до изменения книг библиотеки (область library:<id>)
+    '''
+    cache_list_scopes = ('libraries',)
+    cache_object_scopes = ('libraries',)
+    summary_scopes = ('libraries', 'library:{id}')
+    serializer_class = LibrarySerializer
+    permission_classes = [IsAuthenticated]
+    queryset = Library.objects.all()
+    lookup_field = 'id'
+    default_year_bucket = 10
+    default_authors_limit = 100
+    max_authors_limit = 1000
+
+    @action(detail=True, methods=['get'])
+    def genres(self, request, *args, **kwargs):
+        return self.cached_response(self._summary, (*self.summary_scopes, 'genres', 'nullified-relations'), request,
+                                    books_by_genre)
+
+    @action(detail=True, methods=['get'])
+    def authors(self, request, *args, **kwargs):
+        limit = int_query_param(request, 'limit', self.default_authors_limit, self.max_authors_limit)
+        return self.cached_response(self._summary, (*self.summary_scopes, 'authors'), request, books_by_author,
+                                    limit)
+
+    @action(detail=True, methods=['get'])
+    def years(self, request, *args, **kwargs):
+        bucket = int_query_param(request, 'bucket', self.default_year_bucket, 1000)
+        return self.cached_response(self._summary, self.summary_scopes, request, books_by_year, bucket)
+
+    def _summary(self, request, summary, *args):
+        library = self.get_object()
+        return Response({'library': library.pk, 'results': summary(library.pk, *args)})
+
+
+class LibraryBooksAPIViewSet(ReplicaReadMixin, CacheListResponseMixin, FastListMixin, ExpandMixin,
+                             mixins.ListModelMixin, viewsets.GenericViewSet):
     '''
-    Представление (v. 1.0) для модели комментариев
+    Представление (v. 1.0) каталога библиотеки: опубликованные книги с
+    фильтрами и сортировкой как у списка книг. Кэшируется в общей области
+    книг, а счётчики комментариев подставляются так же, как в списке книг
     '''
+    cache_list_scopes = BooksAPIViewSet.cache_list_scopes
+    cache_expand_scopes = BooksAPIViewSet.cache_expand_scopes
+    cache_volatile_fields = BooksAPIViewSet.cache_volatile_fields
+    cache_volatile_scopes = BooksAPIViewSet.cache_volatile_scopes
+    serializer_class = BookSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [BookFilterBackend, StableOrderingFilter]
+    ordering_fields = BooksAPIViewSet.ordering_fields
+    ordering = ('id',)
+
+    def get_queryset(self):
+        return Book.active.filter(library_id=self.kwargs['library_id'])
+
+
+class CommentsAPIViewSet(ReplicaReadMixin, LoadSheddingMixin, BulkMixin, CacheResponseMixin, IncrementalListMixin,
+                         FastListMixin, ExpandMixin, viewsets.ModelViewSet):
+    '''
+    Представление (v. 1.0) для модели комментариев. ?since=<курсор> —
+    только комментарии, добавленные после курсора
+    '''
+    cache_list_scopes = ('comments:{book_id}', 'nullified-relations')
+    cache_object_scopes = ('comments:{book_id}', 'nullified-relations')
+    cache_expand_scopes = {
+        'book': 'book:{book_id}',
+        'owner': 'users',
+    }
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    throttle_classes = [ClientRateThrottle]
+    pagination_class = CommentsKeysetPagination
     lookup_field = 'id'
 
     def get_queryset(self):
+        # Комментарии скрытой или удалённой книги недоступны, как и сама книга
+        if not Book.active.filter(pk=self.kwargs['book_id']).exists():
+            raise Http404
         return Comment.active.get_book_comments(book_id=self.kwargs['book_id'])
 
+    @immediate_atomic()
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        comment = serializer.save(owner=self.request.user)
+        register_comment_created(comment)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_book_id = serializer.instance.book_id
+        comment = serializer.save()
+        if comment.book_id != old_book_id:
+            register_comment_deleted(old_book_id)
+            register_comment_created(comment)
 
-class AuthorsAPIViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.soft_delete()
+        register_comment_deleted(instance.book_id)
+
+    def after_bulk_create(self, instances):
+        SearchIndex().update(comment_document(comment) for comment in instances)
+        for book_id, comments in self._group_by_book(instances).items():
+            register_comments_created(book_id, len(comments), max(comment.created_at for comment in comments))
+            invalidate(f'comments:{book_id}')
+        register_comments(after=[comment_state(comment) for comment in instances])
+        publish_comment_events('created', instances)
+
+    def after_bulk_update(self, instances, previous):
+        SearchIndex().update(comment_document(comment) for comment in instances)
+        previous_book_ids = {pk: values['book_id'] for pk, values in previous.items()}
+        register_comments_moved(instances, previous_book_ids)
+        register_comments(before=[(previous[comment.pk]['created_at'], previous[comment.pk]['status'])
+                                  for comment in instances],
+                          after=[comment_state(comment) for comment in instances])
+        invalidate(*{f'comments:{book_id}' for book_id in [*previous_book_ids.values(),
+                                                           *(comment.book_id for comment in instances)]})
+        moved = [comment for comment in instances if comment.book_id != previous_book_ids[comment.pk]]
+        publish_comment_events('deleted', [Comment(pk=comment.pk, book_id=previous_book_ids[comment.pk])
+                                           for comment in moved])
+        publish_comment_events('updated', instances)
+
+    def after_bulk_destroy(self, instances):
+        SearchIndex().remove_many('comment', [comment.pk for comment in instances])
+        for book_id, comments in self._group_by_book(instances).items():
+            register_comments_deleted(book_id, len(comments))
+            invalidate(f'comments:{book_id}')
+        register_comments(before=[comment_state(comment) for comment in instances])
+        publish_comment_events('deleted', instances)
+
+    @staticmethod
+    def _group_by_book(comments) -> dict:
+        groups = {}
+        for comment in comments:
+            groups.setdefault(comment.book_id, []).append(comment)
+        return groups
+
+
+class RecentCommentsAPIViewSet(ReplicaReadMixin, IncrementalListMixin, FastListMixin, ExpandMixin,
+                               mixins.ListModelMixin, viewsets.GenericViewSet):
     '''
-    Представление (v. 1.0) для модели авторов
+    Представление (v. 1.0) ленты последних комментариев ко всем книгам:
+    сначала новые, ?since=<курсор> — только добавленные после курсора
     '''
+    serializer_class = CommentSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = RecentCommentsPagination
+    queryset = Comment.active.all()
+
+
+class AuthorsAPIViewSet(ReplicaReadMixin, CacheListResponseMixin, FastListMixin, mixins.ListModelMixin,
+                        viewsets.GenericViewSet):
+    '''
+    Представление (v. 1.0) для модели авторов. Удаление автора вместе с его
+    книгами и комментариями выполняется в фоне, ответ — 202 Accepted
+    '''
+    cache_list_scopes = ('authors',)
     serializer_class = AuthorSerializer
     permission_classes = [IsAuthenticated]
     queryset = Author.objects.all()
+    lookup_field = 'id'
+
+    def get_permissions(self):
+        if self.action == 'destroy':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def destroy(self, request, *args, **kwargs):
+        author = self.get_object()
+        job = enqueue('delete_author', {'author_id': author.pk}, idempotency_key=f'delete_author:{author.pk}')
+        return accepted_response(request, job)
+
+
+class StatsAPIViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    '''
+    Представление (v. 1.0) статистики по всему фонду: genres/ — число
+    опубликованных книг по жанрам, comments/ — число комментариев по дням
+    (?days=), books/ — самые комментируемые книги (?limit=). Жанры и дни
+    читаются из сводных таблиц, книги — по частичному индексу счётчика комментариев
+    '''
+    permission_classes = [IsAuthenticated]
+    default_days = 30
+    max_days = 366
+    default_books_limit = 10
+    max_books_limit = 100
+
+    @action(detail=False, methods=['get'])
+    def genres(self, request, *args, **kwargs):
+        return Response({'results': genre_stats()})
+
+    @action(detail=False, methods=['get'])
+    def comments(self, request, *args, **kwargs):
+        days = int_query_param(request, 'days', self.default_days, self.max_days)
+        return Response({'results': daily_comment_stats(days)})
+
+    @action(detail=False, methods=['get'])
+    def books(self, request, *args, **kwargs):
+        limit = int_query_param(request, 'limit', self.default_books_limit, self.max_books_limit)
+        return Response({'results': top_commented_books(limit)})
+
+
+class JobsAPIViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    '''
+    Представление (v. 1.0) состояния фоновых задач
+    '''
+    serializer_class = JobSerializer
+    permission_classes = [IsAdminUser]
+    queryset = Job.objects.all()
+    lookup_field = 'id'
+
+
+class SearchAPIView(ReplicaReadMixin, APIView):
+    '''
+    Представление (v. 1.0) полнотекстового поиска по названиям книг, авторам и
+    комментариям. Параметры: q — запрос, type — типы объектов через запятую,
+    page_size — размер страницы, cursor — курсор следующей страницы
+    '''
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request):
+        search_index = SearchIndex(using=router.db_for_read(Book))
+        if not search_index.is_available():
+            return Response({'detail': 'Полнотекстовый поиск доступен только для SQLite'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'Обязательный параметр'})
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in KINDS]
+        if unknown:
+            raise ValidationError({'type': f'Допустимые значения: {", ".join(KINDS)}'})
+        try:
+            page_size = min(int(request.query_params.get('page_size', self.page_size)), self.max_page_size)
+        except ValueError:
+            raise ValidationError({'page_size': 'Ожидается целое число'})
+        if page_size < 1:
+            raise ValidationError({'page_size': 'Ожидается положительное число'})
+        try:
+            results, next_cursor = search_index.search(query, kinds, request.query_params.get('cursor'), page_size)
+        except SearchCursorError as e:
+            raise ValidationError({'cursor': str(e)})
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+        return Response({'next': next_url, 'results': results})
@@ -1,3 +1,35 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from library.authentication import token_cache
+from library.services.metrics_services import render_prometheus
+
+
+def _token_cache_metrics() -> list:
+    stats = token_cache.stats()
+    return [
+        ('token_cache_lookups_total', 'counter', 'Lookups of the token authentication cache',
+         [((('result', result),), stats[key]) for key, result in (('hits', 'hit'), ('shared_hits', 'shared_hit'),
+                                                                   ('misses', 'miss'))]),
+        ('token_cache_revocations_total', 'counter', 'Revocations of the token authentication cache',
+         [((), stats['revocations'])]),
+        ('token_cache_size', 'gauge', 'Number of entries in the local token authentication cache',
+         [((), stats['size'])]),
+    ]
+
+
+@require_GET
+def metrics(request):
+    '''
+    Метрики процесса в формате Prometheus. Если задан METRICS_TOKEN,
+    требуется заголовок Authorization: Bearer <METRICS_TOKEN>, иначе метрики
+    доступны только персоналу, вошедшему в админку (или всем при METRICS_PUBLIC)
+    '''
+    if settings.METRICS_TOKEN:
+        if not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {settings.METRICS_TOKEN}'):
+            return HttpResponse(status=401)
+    elif not settings.METRICS_PUBLIC and not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(render_prometheus(_token_cache_metrics()), content_type='text/plain; version=0.0.4')
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project_config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Server-Sent Events are streamed by an ASGI application in front of Django (Django 4.0 cannot stream async responses)
+from library.versions.v_1_0.event_stream import CommentEventStream  # noqa: E402
+
+application = CommentEventStream(django_application)
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,11 +87,84 @@ WSGI_APPLICATION = 'project_config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite backend supporting BEGIN IMMEDIATE transactions (library.services.sqlite_services)
+        'ENGINE': 'library.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Lifetime of persistent connections in seconds, 0 closes the connection after each request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
     }
 }
 
+# Read replicas: comma-separated database files (for SQLite stand-ins see ./manage.py sync_replicas).
+# In tests the replicas mirror the default database
+for index, name in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'NAME': name.strip(), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['library.db_routers.PrimaryReplicaRouter']
+
+# Time (in seconds) the reads of a client go to the default database after it changed data
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+# SQLite connection tuning applied to every new connection: WAL journal for concurrent reads
+# and writes, fsync only at checkpoints, 64 MB page cache, 256 MB memory-mapped I/O and
+# waiting up to busy_timeout milliseconds for a lock instead of failing
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'normal'),
+    'cache_size': -64000,
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'temp_store': 'memory',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Cache used for the API responses and the time (in seconds) a response is kept
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', 300))
+
+# Token authentication cache: in-process size and TTL (in seconds) and an optional
+# shared cache alias used to share lookups and revocations between processes; without
+# a shared (not in-memory) cache every cached token is still checked in the database
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_ALIAS = os.environ.get('TOKEN_CACHE_ALIAS') or None
+
+
+# Request metrics exposed at /metrics: share of sampled requests, number of database queries
+# per request above which a warning is logged and access to the endpoint: a bearer token for the
+# scraper, otherwise only staff users signed in to the admin, or anyone with METRICS_PUBLIC=1
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1))
+METRICS_QUERY_BUDGET = int(os.environ.get('METRICS_QUERY_BUDGET', 20))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '0') == '1'
+
+# Background jobs (library.services.job_services) are executed by ./manage.py run_jobs; with
+# JOBS_EAGER=1 they run in the web process right after the enqueuing transaction commits
+JOBS_EAGER = os.environ.get('JOBS_EAGER', '0') == '1'
+# Interval (in seconds) at which a running job renews its lease; a job without a heartbeat for the
+# worker --timeout is considered abandoned and requeued
+JOBS_HEARTBEAT_INTERVAL = float(os.environ.get('JOBS_HEARTBEAT_INTERVAL', 30))
+
+# Comment events pushed to SSE and long-poll subscribers (library.services.event_services): per-subscriber
+# buffer size, subscribers per process, SSE heartbeat interval and the longest long-poll wait (in seconds)
+EVENTS_BUFFER_SIZE = int(os.environ.get('EVENTS_BUFFER_SIZE', 100))
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', 10000))
+EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+EVENTS_LONG_POLL_TIMEOUT = float(os.environ.get('EVENTS_LONG_POLL_TIMEOUT', 25))
+# Lifetime (in seconds) of the signed ?token= accepted by the SSE stream; API tokens are not accepted in URLs
+EVENTS_STREAM_TOKEN_TTL = float(os.environ.get('EVENTS_STREAM_TOKEN_TTL', 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -133,6 +207,27 @@ STATIC_URL = '/static/'
 # REST API settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ]
+        'library.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'library.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 100)),
+    # Token-bucket rates 'N/period' (library.throttling), an empty value disables the limit: read and write
+    # are budgets of a client per endpoint, endpoint_write is the write budget shared by all clients of an endpoint
+    'DEFAULT_THROTTLE_RATES': {
+        'read': os.environ.get('THROTTLE_READ_RATE', '1200/m'),
+        'write': os.environ.get('THROTTLE_WRITE_RATE', '120/m'),
+        'endpoint_write': os.environ.get('THROTTLE_ENDPOINT_WRITE_RATE', '3000/m'),
+    },
 }
+
+# Throttling buckets: in-process store size and an optional shared cache alias used to apply the limits across
+# processes; load shedding: writes executed at once per process and the time (in seconds) a write waits for a
+# free slot before it is rejected with 503
+THROTTLE_STORE_SIZE = int(os.environ.get('THROTTLE_STORE_SIZE', 100000))
+THROTTLE_CACHE_ALIAS = os.environ.get('THROTTLE_CACHE_ALIAS') or None
+THROTTLE_MAX_CONCURRENT_WRITES = int(os.environ.get('THROTTLE_MAX_CONCURRENT_WRITES', 4))
+THROTTLE_WRITE_QUEUE_TIMEOUT = float(os.environ.get('THROTTLE_WRITE_QUEUE_TIMEOUT', 0.5))
+
+# Fast list serialization straight from .values() rows (library.fast_serializers); responses are
+# encoded with orjson when it is installed
+API_FAST_SERIALIZATION = os.environ.get('API_FAST_SERIALIZATION', '1') == '1'